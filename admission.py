@@ -0,0 +1,159 @@
+"""
+Admission control for /ws/game.
+
+Every player in clients makes each tick and each broadcast bigger, so new
+connections are only let in while the server is under its player caps:
+one for the whole process and one per room (the game currently runs a
+single room, ROOM). Over the cap, a connection waits in a bounded FIFO
+queue for a free slot, or is turned away with a retry hint (and a
+redirect URL when one is configured). Each IP also has a connect-rate
+token bucket, so a tab stuck in a reconnect loop cannot churn the room.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+
+from ingest import TokenBucket
+
+ROOM = "main"
+MAX_PLAYERS = int(os.getenv("MAX_PLAYERS", "200"))
+MAX_PLAYERS_PER_ROOM = int(os.getenv("MAX_PLAYERS_PER_ROOM", str(MAX_PLAYERS)))
+# Connects per second per IP, with a burst for a few tabs opened at once
+CONNECT_RATE_PER_IP = float(os.getenv("CONNECT_RATE_PER_IP", "0.5"))
+CONNECT_BURST_PER_IP = float(os.getenv("CONNECT_BURST_PER_IP", "5"))
+MAX_TRACKED_IPS = 10000
+QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "50"))
+QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "60"))
+# Sent to players turned away when the server is full, e.g. another game server
+REDIRECT_URL = os.getenv("ADMISSION_REDIRECT_URL") or None
+RETRY_AFTER_SECONDS = 15
+
+
+class AdmissionController:
+    def __init__(self, max_players: int = MAX_PLAYERS, max_per_room: int = MAX_PLAYERS_PER_ROOM,
+                 connect_rate: float = CONNECT_RATE_PER_IP, connect_burst: float = CONNECT_BURST_PER_IP,
+                 queue_size: int = QUEUE_SIZE, queue_timeout: float = QUEUE_TIMEOUT_SECONDS):
+        self.max_players = max_players
+        self.max_per_room = max_per_room
+        self.connect_rate = connect_rate
+        self.connect_burst = connect_burst
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.players = 0
+        self.rooms = {}           # room -> admitted players
+        self.waiting = deque()    # (room, future) in arrival order
+        self.ip_buckets = OrderedDict()  # ip -> TokenBucket, least recently used first
+        self.peak_players = 0
+        self.counters = {"admitted": 0, "admitted_from_queue": 0, "queued": 0, "queue_timeouts": 0,
+                         "queue_abandoned": 0, "rejected_full": 0, "rejected_rate": 0}
+
+    def allow_connect(self, ip: str) -> bool:
+        """Takes a token from the IP's connect bucket; False means the IP is reconnecting too fast."""
+        bucket = self.ip_buckets.get(ip)
+        if bucket is None:
+            bucket = self.ip_buckets[ip] = TokenBucket(self.connect_rate, self.connect_burst)
+            if len(self.ip_buckets) > MAX_TRACKED_IPS:
+                self.ip_buckets.popitem(last=False)  # the IP idle for longest, its bucket is full anyway
+        else:
+            self.ip_buckets.move_to_end(ip)
+        if bucket.consume():
+            return True
+        self.counters["rejected_rate"] += 1
+        return False
+
+    def _has_slot(self, room: str) -> bool:
+        return self.players < self.max_players and self.rooms.get(room, 0) < self.max_per_room
+
+    def _take_slot(self, room: str):
+        self.players += 1
+        self.rooms[room] = self.rooms.get(room, 0) + 1
+        self.peak_players = max(self.peak_players, self.players)
+
+    def try_admit(self, room: str = ROOM) -> bool:
+        """Takes a slot if one is free and nobody is queued ahead for it."""
+        if self._has_slot(room) and not any(r == room for r, _ in self.waiting):
+            self._take_slot(room)
+            self.counters["admitted"] += 1
+            return True
+        return False
+
+    async def admit(self, room: str = ROOM, on_wait=None) -> bool:
+        """
+        Takes a slot, waiting in the queue for up to queue_timeout seconds if
+        the server is full. on_wait(position) is awaited while queued so the
+        caller can keep the client informed; if it raises (the client left),
+        the wait is abandoned. False means the client should be turned away.
+        """
+        if self.try_admit(room):
+            return True
+        if len(self.waiting) >= self.queue_size:
+            self.counters["rejected_full"] += 1
+            return False
+        future = asyncio.get_running_loop().create_future()
+        entry = (room, future)
+        self.waiting.append(entry)
+        self.counters["queued"] += 1
+        deadline = time.monotonic() + self.queue_timeout
+        try:
+            while not future.done():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.counters["queue_timeouts"] += 1
+                    return False
+                if on_wait is not None:
+                    await on_wait(self.waiting.index(entry) + 1)
+                try:
+                    await asyncio.wait_for(asyncio.shield(future), min(remaining, 5))
+                except asyncio.TimeoutError:
+                    pass
+            return True
+        except BaseException:
+            if not future.done():
+                self.counters["queue_abandoned"] += 1
+            elif not future.cancelled():
+                self.release(room)  # got a slot just as the client left
+            raise
+        finally:
+            if not future.done():
+                future.cancel()
+            if entry in self.waiting:
+                self.waiting.remove(entry)
+
+    def release(self, room: str = ROOM):
+        """Frees an admitted player's slot and hands it to the first queued client that fits."""
+        self.players -= 1
+        self.rooms[room] -= 1
+        for entry in list(self.waiting):
+            waiting_room, future = entry
+            if future.done():
+                continue
+            if self._has_slot(waiting_room):
+                self.waiting.remove(entry)
+                self._take_slot(waiting_room)
+                self.counters["admitted_from_queue"] += 1
+                future.set_result(True)
+                break
+
+    def rejection(self, reason: str) -> dict:
+        """Message sent to a client that was not let in."""
+        message = {"type": "server_full" if reason == "full" else "error",
+                   "message": "Server is full, please try again shortly." if reason == "full"
+                   else "Too many connection attempts, please wait a moment.",
+                   "retry_after": RETRY_AFTER_SECONDS}
+        if reason == "full" and REDIRECT_URL:
+            message["redirect"] = REDIRECT_URL
+        return message
+
+    def stats(self) -> dict:
+        return {
+            "players": self.players,
+            "peak_players": self.peak_players,
+            "max_players": self.max_players,
+            "max_players_per_room": self.max_per_room,
+            "rooms": dict(self.rooms),
+            "waiting": sum(1 for _, future in self.waiting if not future.done()),
+            "queue_size": self.queue_size,
+            "tracked_ips": len(self.ip_buckets),
+            **self.counters,
+        }
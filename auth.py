@@ -1,4 +1,3 @@
-from passlib.context import CryptContext
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status, Cookie
 from fastapi.security import OAuth2PasswordBearer
@@ -8,8 +7,13 @@ from datetime import datetime, timedelta, timezone
 import secrets
 import hashlib
 import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from database import sessions_collection # Import database collection for session validation
+from metrics import BCRYPT_QUEUE_WAIT_SECONDS, BCRYPT_SECONDS
+from tracing import span, traced
 
 # Load environment variables from .env file
 load_dotenv()
@@ -21,8 +25,15 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256" # Algorithm for JWT encoding
 ACCESS_TOKEN_EXPIRE_MINUTES = 30 * 24 * 60  # Token validity: 30 days
 
-# Password Hashing Context using bcrypt
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password Hashing Context using bcrypt, created on first use so importing auth stays cheap
+_pwd_context = None
+
+def get_pwd_context():
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
 
 # Pydantic model for user data (example, not directly used in this file)
 class User(BaseModel):
@@ -37,15 +48,42 @@ class TokenData(BaseModel):
 # Verifies a plain text password against a stored hash.
 def verify_password(plain_password: str, salt: str, hashed_password: str) -> bool:
     """Verify a password by prepending the salt and matching against the stored hash."""
-    return pwd_context.verify(salt + plain_password, hashed_password)
+    return get_pwd_context().verify(salt + plain_password, hashed_password)
 
 # Hashes a plain text password using the configured context.
 def get_password_hash(password: str) -> tuple[str, str]:
     """Generate a unique salt and hash the password with it, returning (salt, hashed_password)."""
     salt = secrets.token_hex(16)
-    hashed = pwd_context.hash(salt + password)
+    hashed = get_pwd_context().hash(salt + password)
     return salt, hashed
 
+# bcrypt is deliberately slow, so it runs on a small thread pool instead of blocking the event loop.
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", "2"))
+_bcrypt_executor = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+
+async def _run_bcrypt(func, *args):
+    """Runs func on the bcrypt pool, recording how long it queued and how long it ran."""
+    queued_at = time.perf_counter()
+
+    def job():
+        started_at = time.perf_counter()
+        BCRYPT_QUEUE_WAIT_SECONDS.observe(started_at - queued_at)
+        try:
+            return func(*args)
+        finally:
+            BCRYPT_SECONDS.observe(time.perf_counter() - started_at)
+
+    with span("bcrypt"):
+        return await asyncio.get_running_loop().run_in_executor(_bcrypt_executor, job)
+
+async def verify_password_async(plain_password: str, salt: str, hashed_password: str) -> bool:
+    """verify_password on the bcrypt thread pool."""
+    return await _run_bcrypt(verify_password, plain_password, salt, hashed_password)
+
+async def get_password_hash_async(password: str) -> tuple[str, str]:
+    """get_password_hash on the bcrypt thread pool."""
+    return await _run_bcrypt(get_password_hash, password)
+
 # Creates a JWT access token.
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -67,6 +105,7 @@ def verify_token_hash(token: str, stored_hash: str) -> bool:
     return hash_token(token) == stored_hash
 
 # Dependency function to get the current user based on the session token cookie.
+@traced("session")
 async def get_current_user(session_token: Optional[str] = Cookie(None)):
     # If no session token cookie is present, user is not logged in.
     if not session_token:
@@ -101,4 +140,15 @@ async def get_current_user(session_token: Optional[str] = Cookie(None)):
         return None # Token is invalid (expired, wrong signature, etc.)
 
     # Return the username if token and session are valid.
-    return token_data.username 
\ No newline at end of file
+    return token_data.username 
+
+# Comma separated list of usernames allowed to use the /api/admin endpoints.
+ADMIN_USERS = {name.strip() for name in os.getenv("ADMIN_USERS", "").split(",") if name.strip()}
+
+# Dependency for operator-only endpoints: requires a logged-in user listed in ADMIN_USERS.
+async def get_admin_user(username: Optional[str] = Depends(get_current_user)):
+    if not username:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+    if username not in ADMIN_USERS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return username
@@ -1,23 +1,77 @@
 from pymongo import MongoClient
+import pymongo
 import os
+import threading
+from metrics import MongoCommandMetrics
+from tracing import TraceCommandListener
+from db_profiler import db_profiler
 
-mongo_url = os.environ["MONGO_URL"]
-print(f"Connecting to MongoDB at: {mongo_url}")
-try:
-    client = MongoClient(mongo_url)
-    client.admin.command('ismaster')
-    print("MongoDB connection successful.")
-except Exception as e:
-    print(f"ERROR: Could not connect to MongoDB at {mongo_url}")
-    print(e)
-    raise
-
-db = client.app_database
-users_collection = db.users
-sessions_collection = db.sessions
-leaderboard_stats_collection = db.leaderboard_stats
-skin_collection = db.skin
-playerStats_collection = db.stats
-
-
-print("Database collections initialized.")
\ No newline at end of file
+# Nothing connects at import time: the client is created on first use and
+# pymongo connects in the background, so importing this module (and main)
+# is fast and works without a running MongoDB. Use ping()/readiness for health.
+mongo_url = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+DATABASE_NAME = "app_database"
+READY_TIMEOUT_SECONDS = float(os.getenv("MONGO_READY_TIMEOUT", "2"))
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> MongoClient:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                print(f"Connecting to MongoDB at: {mongo_url}")
+                # Command listeners feed per-collection latency into /metrics, request traces and /api/admin/db
+                _client = MongoClient(mongo_url, connect=False, event_listeners=[MongoCommandMetrics(), TraceCommandListener(), db_profiler])
+    return _client
+
+
+def get_db():
+    return get_client()[DATABASE_NAME]
+
+
+def ping(timeout: float = READY_TIMEOUT_SECONDS) -> bool:
+    """Readiness check: True if MongoDB answers a ping within timeout seconds. Blocking."""
+    try:
+        with pymongo.timeout(timeout):
+            get_client().admin.command("ping")
+        return True
+    except Exception as e:
+        print(f"ERROR: Could not reach MongoDB at {mongo_url}: {e}")
+        return False
+
+
+def close():
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+class LazyCollection:
+    """Stands in for a pymongo Collection and resolves it on first use."""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._collection = None
+
+    def __getattr__(self, attr):
+        collection = self._collection
+        if collection is None or collection.database.client is not _client:
+            collection = self._collection = get_db()[self._name]
+        return getattr(collection, attr)
+
+    def __repr__(self):
+        return f"LazyCollection({DATABASE_NAME}.{self._name})"
+
+
+users_collection = LazyCollection("users")
+sessions_collection = LazyCollection("sessions")
+leaderboard_stats_collection = LazyCollection("leaderboard_stats")
+skin_collection = LazyCollection("skin")
+playerStats_collection = LazyCollection("stats")
+round_results_collection = LazyCollection("round_results")
+leaderboard_buckets_collection = LazyCollection("leaderboard_buckets")
@@ -0,0 +1,256 @@
+"""
+MongoDB command profiler.
+
+A pymongo command listener that records, per collection and command, how
+many commands ran, how long they took and how much they returned, and
+attributes each one to the operation that caused it: the HTTP route, a
+game_ws event (connect, input, round end, disconnect) or a broadcast tick.
+
+The operation lives in a context variable, so work the operation starts
+(asyncio.to_thread calls, background tasks) is still charged to it. That
+includes work it defers to a later tick: the tick scheduler runs each job
+in the context it was deferred from, not in the broadcast loop's. Within one operation, the same query (collection, command and
+filter) repeating NPLUS1_THRESHOLD times is flagged as an N+1 pattern,
+and any command slower than DB_SLOW_OP_MS goes to the slow-op log. All of
+it is served at /api/admin/db.
+"""
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+
+import bson
+from pymongo import monitoring
+
+from metrics import registry
+
+DB_PROFILER_ENABLED = os.getenv("DB_PROFILER", "true").lower() == "true"
+SLOW_OP_SECONDS = float(os.getenv("DB_SLOW_OP_MS", "100")) / 1000
+NPLUS1_THRESHOLD = int(os.getenv("NPLUS1_THRESHOLD", "3"))
+MAX_ORIGINS = 500   # distinct operation names kept; the rest are counted under "other"
+MAX_FINDINGS = 500
+SLOW_LOG_SIZE = 200
+SHAPE_PREVIEW = 200  # characters of a query shown in reports
+
+MONGO_RETURNED_BYTES = registry.counter("mongo_returned_bytes_total", "Bytes of MongoDB replies",
+                                        ("collection", "command"))
+MONGO_REPEATED_QUERIES = registry.counter("mongo_repeated_queries_total",
+                                          "Operations that repeated an identical query NPLUS1_THRESHOLD times",
+                                          ("collection", "command"))
+MONGO_SLOW_COMMANDS = registry.counter("mongo_slow_commands_total", "MongoDB commands slower than DB_SLOW_OP_MS",
+                                       ("collection", "command"))
+
+# Commands whose repeats are not a query pattern (driver housekeeping, writes of new documents)
+NOT_QUERIES = {"insert", "hello", "ismaster", "isMaster", "ping", "endSessions", "createIndexes", "getMore",
+               "killCursors", "buildInfo"}
+
+
+class Operation:
+    """One request, game event or tick; every DB command run on its behalf counts against it."""
+
+    __slots__ = ("kind", "label", "scope", "queries")
+
+    def __init__(self, kind: str, label: str = "", scope: dict = None):
+        self.kind = kind
+        self.label = label
+        self.scope = scope  # ASGI scope of an HTTP request: named after its route once routing ran
+        self.queries = {}   # query shape -> times run
+
+    @property
+    def name(self) -> str:
+        if self.scope is not None:
+            route = self.scope.get("route")
+            path = getattr(route, "path", None) or self.scope["path"]
+            return f"{self.scope['method']} {path}"
+        return f"{self.kind}:{self.label}" if self.label else self.kind
+
+
+_operation = contextvars.ContextVar("db_operation", default=None)
+
+
+def begin(kind: str, label: str = ""):
+    """
+    Starts a new operation in the current context. A task that handles one
+    event after another (game_ws, the broadcast loop) calls this for each
+    event; the previous one ends there.
+    """
+    _operation.set(Operation(kind, label))
+
+
+def _query_shape(command_name: str, command) -> str:
+    """The part of a command that makes two queries "identical"; None for commands that are not queries."""
+    if command_name in NOT_QUERIES:
+        return None
+    if command_name == "find":
+        return repr((command.get("filter"), command.get("projection"), command.get("sort"), command.get("limit")))
+    if command_name in ("update", "delete"):
+        statements = command.get("updates" if command_name == "update" else "deletes") or []
+        return repr([(s.get("q"), s.get("u")) for s in statements])
+    if command_name == "aggregate":
+        return repr(command.get("pipeline"))
+    if command_name in ("findAndModify", "count", "distinct"):
+        return repr((command.get("query"), command.get("update"), command.get("key")))
+    return None
+
+
+def _reply_documents(reply) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch") or cursor.get("nextBatch") or ())
+    if "value" in reply:  # findAndModify
+        return 1 if reply["value"] is not None else 0
+    return 0
+
+
+class DbProfiler(monitoring.CommandListener):
+    def __init__(self, enabled: bool = DB_PROFILER_ENABLED):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._pending = {}  # request_id -> (collection, shape, operation)
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            # "collection.command" -> [count, seconds, max seconds, documents returned, bytes returned, failures]
+            self.commands = {}
+            # operation name -> {"collection.command": [count, seconds]}
+            self.origins = {}
+            # (operation, "collection.command", shape) -> {"operations": n, "max_repeats": n}
+            self.findings = {}
+            self.slow_ops = deque(maxlen=SLOW_LOG_SIZE)
+            self.since = time.time()
+
+    # --- Listener callbacks (run in the thread that issued the command) ---
+
+    def started(self, event):
+        if not self.enabled:
+            return
+        command_name = event.command_name
+        collection = event.command.get(command_name)
+        collection = collection if isinstance(collection, str) else ""
+        operation = _operation.get()
+        shape = _query_shape(command_name, event.command) if operation is not None else None
+        self._pending[event.request_id] = (collection, shape, operation)
+
+    def succeeded(self, event):
+        pending = self._pending.pop(event.request_id, None)
+        if pending is not None:
+            self._record(event, pending, event.reply, failed=False)
+
+    def failed(self, event):
+        pending = self._pending.pop(event.request_id, None)
+        if pending is not None:
+            self._record(event, pending, None, failed=True)
+
+    def _record(self, event, pending, reply, failed: bool):
+        collection, shape, operation = pending
+        command_name = event.command_name
+        key = f"{collection}.{command_name}" if collection else command_name
+        seconds = event.duration_micros / 1e6
+        documents = size = 0
+        if reply is not None:
+            documents = _reply_documents(reply)
+            if documents:
+                size = len(bson.encode(reply))
+                MONGO_RETURNED_BYTES.inc(size, collection, command_name)
+        origin = operation.name if operation is not None else "background"
+        repeats = 0
+        with self._lock:
+            entry = self.commands.get(key)
+            if entry is None:
+                entry = self.commands[key] = [0, 0.0, 0.0, 0, 0, 0]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+            entry[3] += documents
+            entry[4] += size
+            entry[5] += failed
+
+            per_origin = self.origins.get(origin)
+            if per_origin is None:
+                if len(self.origins) >= MAX_ORIGINS:
+                    origin = "other"
+                per_origin = self.origins.setdefault(origin, {})
+            counts = per_origin.get(key)
+            if counts is None:
+                counts = per_origin[key] = [0, 0.0]
+            counts[0] += 1
+            counts[1] += seconds
+
+            if shape is not None:
+                repeats = operation.queries.get(shape, 0) + 1
+                operation.queries[shape] = repeats
+                if repeats >= NPLUS1_THRESHOLD:
+                    finding_key = (origin, key, shape)
+                    finding = self.findings.get(finding_key)
+                    if finding is None and len(self.findings) < MAX_FINDINGS:
+                        finding = self.findings[finding_key] = {"operations": 0, "max_repeats": 0}
+                    if finding is not None:
+                        if repeats == NPLUS1_THRESHOLD:
+                            finding["operations"] += 1
+                        finding["max_repeats"] = max(finding["max_repeats"], repeats)
+
+            if seconds >= SLOW_OP_SECONDS:
+                self.slow_ops.append({"time": time.time(), "origin": origin, "command": key,
+                                      "ms": round(seconds * 1000, 2), "documents": documents, "bytes": size,
+                                      "failed": failed, "query": (shape or "")[:SHAPE_PREVIEW]})
+
+        if repeats == NPLUS1_THRESHOLD:
+            MONGO_REPEATED_QUERIES.inc(1, collection, command_name)
+            print(f"Repeated query: {origin} ran {key} {repeats} times with {shape[:SHAPE_PREVIEW]}")
+        if seconds >= SLOW_OP_SECONDS:
+            MONGO_SLOW_COMMANDS.inc(1, collection, command_name)
+            print(f"Slow MongoDB command: {key} from {origin} took {seconds * 1000:.1f} ms")
+
+    # --- Reports ---
+
+    def stats(self, top: int = 20) -> dict:
+        with self._lock:
+            commands = {
+                key: {"count": count, "total_ms": round(seconds * 1000, 2),
+                      "avg_ms": round(seconds * 1000 / count, 3), "max_ms": round(slowest * 1000, 2),
+                      "documents": documents, "bytes": size, "failures": failures}
+                for key, (count, seconds, slowest, documents, size, failures) in self.commands.items()
+            }
+            origins = []
+            for origin, per_command in self.origins.items():
+                count = sum(c for c, _ in per_command.values())
+                seconds = sum(s for _, s in per_command.values())
+                origins.append({"origin": origin, "count": count, "total_ms": round(seconds * 1000, 2),
+                                "commands": {key: {"count": c, "total_ms": round(s * 1000, 2)}
+                                             for key, (c, s) in per_command.items()}})
+            findings = [{"origin": origin, "command": key, "query": shape[:SHAPE_PREVIEW], **finding}
+                        for (origin, key, shape), finding in self.findings.items()]
+            slow_ops = list(self.slow_ops)
+        origins.sort(key=lambda o: o["total_ms"], reverse=True)
+        findings.sort(key=lambda f: (f["operations"], f["max_repeats"]), reverse=True)
+        return {
+            "enabled": self.enabled,
+            "since": self.since,
+            "slow_op_ms": SLOW_OP_SECONDS * 1000,
+            "nplus1_threshold": NPLUS1_THRESHOLD,
+            "commands": dict(sorted(commands.items(), key=lambda item: item[1]["total_ms"], reverse=True)),
+            "origins": origins[:top],
+            "repeated_queries": findings[:top],
+            "slow_ops": slow_ops[-top:][::-1],
+        }
+
+
+db_profiler = DbProfiler()
+
+
+class DbProfilerMiddleware:
+    """Makes every HTTP request an operation, named after its route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not db_profiler.enabled:
+            return await self.app(scope, receive, send)
+        token = _operation.set(Operation("http", scope=scope))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _operation.reset(token)
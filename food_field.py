@@ -0,0 +1,182 @@
+import random
+from array import array
+
+
+class FoodField:
+    """
+    Fixed-capacity pellet storage backed by contiguous arrays.
+
+    Pellet ids are slot indexes into the arrays. Eaten pellets return their
+    slot to a free-list and the next spawn reuses it, so after start-up no
+    per-pellet objects are allocated and ids stay small integers on the wire.
+    Live pellets are also bucketed into a coarse grid so pickups only look
+    at the cells around the player instead of the whole field.
+
+    Every slot remembers the stamp (main.py uses the snapshot tick) of its
+    last change, so a reconnecting client can be sent only what changed
+    since its last snapshot (changes_since).
+    """
+
+    def __init__(self, capacity: int, target: int, respawn_per_second: float,
+                 width: int, height: int, rng: random.Random = None, cell_size: int = 128):
+        self.capacity = capacity
+        self.target = min(target, capacity)
+        self.respawn_per_second = respawn_per_second
+        self.width = width
+        self.height = height
+        self.rng = rng or random.Random()
+
+        self.xs = array('i', [0]) * capacity
+        self.ys = array('i', [0]) * capacity
+        self.alive = bytearray(capacity)
+        # Stack of free slots, lowest ids handed out first
+        self.free = list(range(capacity - 1, -1, -1))
+        self.count = 0
+        self._spawn_budget = 0.0
+        self.cell_size = cell_size
+        self.cells = {}  # (cell x, cell y) -> set of pellet ids
+        self.stamp = 0   # set by the caller; recorded on every slot that changes
+        self.changed = array('q', [0]) * capacity
+        self.reset_stamp = 0  # stamp of the last reset; older clients need the full list
+
+    def _cell(self, food_id: int):
+        return self.xs[food_id] // self.cell_size, self.ys[food_id] // self.cell_size
+
+    def spawn(self, n: int) -> list:
+        """Spawns up to n pellets at random positions and returns their ids."""
+        spawned = []
+        free = self.free
+        randint = self.rng.randint
+        for _ in range(min(n, len(free))):
+            food_id = free.pop()
+            self.xs[food_id] = randint(0, self.width)
+            self.ys[food_id] = randint(0, self.height)
+            self.alive[food_id] = 1
+            self.changed[food_id] = self.stamp
+            self.cells.setdefault(self._cell(food_id), set()).add(food_id)
+            spawned.append(food_id)
+        self.count += len(spawned)
+        return spawned
+
+    def remove(self, food_id: int) -> bool:
+        if not 0 <= food_id < self.capacity or not self.alive[food_id]:
+            return False
+        self.alive[food_id] = 0
+        self.changed[food_id] = self.stamp
+        self.free.append(food_id)
+        self._uncell(food_id)
+        self.count -= 1
+        return True
+
+    def _uncell(self, food_id: int):
+        cell = self.cells.get(self._cell(food_id))
+        if cell is not None:
+            cell.discard(food_id)
+            if not cell:
+                del self.cells[self._cell(food_id)]
+
+    def reset(self):
+        """Clears the field and fills it back up to the target density (used at round start)."""
+        self.alive[:] = bytes(self.capacity)
+        self.free = list(range(self.capacity - 1, -1, -1))
+        self.cells = {}
+        self.count = 0
+        self._spawn_budget = 0.0
+        self.reset_stamp = self.stamp
+        self.spawn(self.target)
+
+    def place(self, flat, reset: bool = False):
+        """
+        Puts pellets at exact slots from flat [id, x, y, ...] triples (match
+        replays, the simulation process). Only the given slots are touched;
+        with reset, everything else is cleared first.
+        """
+        if reset:
+            self.alive[:] = bytes(self.capacity)
+            self.reset_stamp = self.stamp
+            self.cells = {}
+            self.count = 0
+        for i in range(0, len(flat), 3):
+            food_id = flat[i]
+            if not 0 <= food_id < self.capacity:
+                continue
+            if self.alive[food_id]:
+                self._uncell(food_id)  # moved
+            else:
+                if not reset:
+                    self.free.remove(food_id)
+                self.alive[food_id] = 1
+                self.count += 1
+            self.xs[food_id] = flat[i + 1]
+            self.ys[food_id] = flat[i + 2]
+            self.changed[food_id] = self.stamp
+            self.cells.setdefault(self._cell(food_id), set()).add(food_id)
+        if reset:
+            self.free = [food_id for food_id in range(self.capacity - 1, -1, -1) if not self.alive[food_id]]
+
+    def replenish(self, dt: float) -> list:
+        """Respawns pellets at respawn_per_second, never above the target. Returns new ids."""
+        missing = self.target - self.count
+        if missing <= 0:
+            self._spawn_budget = 0.0
+            return []
+        self._spawn_budget += self.respawn_per_second * dt
+        n = min(int(self._spawn_budget), missing)
+        if n <= 0:
+            return []
+        self._spawn_budget -= n
+        return self.spawn(n)
+
+    def collect_near(self, x: float, y: float, radius: float) -> list:
+        """Removes and returns the ids of all pellets within radius of (x, y)."""
+        xs, ys, cells = self.xs, self.ys, self.cells
+        radius_sq = radius * radius
+        size = self.cell_size
+        collected = []
+        for cx in range(int((x - radius) // size), int((x + radius) // size) + 1):
+            for cy in range(int((y - radius) // size), int((y + radius) // size) + 1):
+                for food_id in cells.get((cx, cy), ()):
+                    dx = x - xs[food_id]
+                    dy = y - ys[food_id]
+                    if dx * dx + dy * dy < radius_sq:
+                        collected.append(food_id)
+        collected.sort()  # same order as a scan over the whole field
+        for food_id in collected:
+            self.remove(food_id)
+        return collected
+
+    def to_list(self) -> list:
+        """Full pellet list in the {"id", "x", "y"} format used for initial sync."""
+        xs, ys = self.xs, self.ys
+        return [
+            {"id": food_id, "x": xs[food_id], "y": ys[food_id]}
+            for food_id in range(self.capacity)
+            if self.alive[food_id]
+        ]
+
+    def encode_spawns(self, food_ids: list) -> list:
+        """Flat [id, x, y, id, x, y, ...] array for batched spawn events."""
+        xs, ys = self.xs, self.ys
+        flat = []
+        for food_id in food_ids:
+            flat.extend((food_id, xs[food_id], ys[food_id]))
+        return flat
+
+    def changes_since(self, stamp: int):
+        """
+        Pellets changed after stamp, as (removed ids, flat [id, x, y, ...] of
+        live ones), or None when the field was reset since then and the
+        whole list has to be sent instead.
+        """
+        if stamp <= self.reset_stamp:
+            return None
+        changed, alive, xs, ys = self.changed, self.alive, self.xs, self.ys
+        removed = []
+        spawned = []
+        for food_id in range(self.capacity):
+            if changed[food_id] > stamp:
+                if alive[food_id]:
+                    spawned.extend((food_id, xs[food_id], ys[food_id]))
+                else:
+                    removed.append(food_id)
+        return removed, spawned
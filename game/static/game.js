@@ -28,6 +28,10 @@ const config = {
 
 const game = new Phaser.Game(config);
 
+// /play?spectate watches the game through /ws/spectate without joining it
+const spectating = new URLSearchParams(window.location.search).has('spectate');
+const SPECTATOR_CAMERA_SPEED = 1200; // px/s when panning with WASD
+
 let player;
 let cursors;
 
@@ -55,14 +59,36 @@ let playerVisible = true; // To handle hiding player when "eaten"
 let playerInputDisabled = false; // To disable input when "eaten"
 // --- End New State Variables ---
 
+// --- Snapshot Interpolation ---
+const INTERPOLATION_DELAY_MS = 150; // Draw other players this far in the past (a bit over 2 snapshots at 15 Hz)
+const MAX_SNAPSHOT_SAMPLES = 10;
+let lastSnapshotTick = -1;     // Highest server tick received, older snapshots are ignored
+let serverTimeOffset = null;   // Estimated server clock minus local clock (ms)
+let inputSeq = 0;              // Sequence number of the last position sent
+let pendingInputs = [];        // Sent positions not yet acknowledged by the server
+let roundTripMs = 0;           // Time until the server acknowledged our last input
+// --- End Snapshot Interpolation ---
+
+// --- Session Resume ---
+// After a dropped connection the server keeps our player for a few seconds; reconnecting
+// with this token gets it back along with only the pellets that changed meanwhile
+let resumeToken = null;
+let resumeAttempts = 0;
+const MAX_RESUME_ATTEMPTS = 5;
+const RESUME_RETRY_MS = 1000; // times the attempt number
+// --- End Session Resume ---
+
 // --- Minimap Configuration ---
 const MINIMAP_WIDTH = 200;
-const MINIMAP_HEIGHT = 150;
+const MINIMAP_HEIGHT = Math.round(MINIMAP_WIDTH * worldHeight / worldWidth); // Whole world, same aspect
 const MINIMAP_X = 10;
 const MINIMAP_Y = 10;
-const MINIMAP_ZOOM = 0.05; // Zoom out more
 const MINIMAP_BORDER_COLOR = 0xffffff; // White border
 const MINIMAP_BORDER_THICKNESS = 2;
+const MINIMAP_CELL_COLOR = 0x3399ff;   // Cells with players, more opaque the more power they hold
+const MINIMAP_MARKER_COLOR = 0xffd700; // Top players
+let minimapGraphics = null;
+let minimapSelfMarker = null;
 // --- End Minimap Configuration ---
 
 // Function to setup WebSocket listeners
@@ -101,67 +127,53 @@ function handleSocketMessage(event) {
     return; // Stop processing this message further
   }
 
+  // Server is at its player cap: we wait in line, or are turned away and retry later
+  if (data.type === "queued") {
+    showQueueStatus(`Server full - you are #${data.position} in line`);
+    return;
+  }
+  if (data.type === "server_full") {
+    if (data.redirect) {
+      window.location.href = data.redirect;
+      return;
+    }
+    showQueueStatus(`${data.message}\nRetrying in ${data.retry_after} seconds...`);
+    setTimeout(() => window.location.reload(), data.retry_after * 1000);
+    return;
+  }
+
   if (data.type === "players") {
+    // Snapshots can arrive out of order, only the newest one counts
+    if (data.tick <= lastSnapshotTick) {
+      return;
+    }
+    lastSnapshotTick = data.tick;
+    updateServerClock(data.server_time);
+
     // Update timer
     const minutes = Math.floor(data.time_remaining / 60);
     const seconds = Math.floor(data.time_remaining % 60);
     timerText.setText(`${minutes}:${seconds.toString().padStart(2, '0')}`);
 
-    // Update food positions
-    if (data.food) {
-      // Remove food that's no longer in the list
-      for (const foodId in foodInstances) {
-        if (!data.food.some(f => f.id === foodId)) {
-          foodInstances[foodId].destroy();
-          delete foodInstances[foodId];
-        }
-      }
-      
-      // Add new food
-      for (const food of data.food) {
-        if (!foodInstances[food.id]) {
-          const foodSprite = scene.add.sprite(food.x, food.y, 'food').setScale(0.1);
-          foodSprite.setDepth(1);
-          foodInstances[food.id] = foodSprite;
-        }
-      }
-    }
-
-    // --- Leaderboard Update --- 
-    const allPlayers = [];
-    // Add local player
-    allPlayers.push({ 
-        username: localUsernameText ? localUsernameText.text : 'Me', // Use current username text or default
-        power: playerPower 
-    });
-    // Add other players
-    for (const id in otherPlayers) {
-        allPlayers.push({ 
-            username: otherPlayers[id].usernameText.text,
-            power: otherPlayers[id].power
-        });
+    // --- Leaderboard Update ---
+    // The server ranks everyone and only includes the top players when they changed
+    if (data.leaderboard) {
+      renderLeaderboard(data.leaderboard);
     }
+    // --- End Leaderboard Update ---
 
-    // Sort players by power (descending)
-    allPlayers.sort((a, b) => b.power - a.power);
-
-    // Get top 10 players
-    const topPlayers = allPlayers.slice(0, 10);
-
-    // Format leaderboard string
-    let leaderboardString = "Leaderboard:\n";
-    topPlayers.forEach((p, index) => {
-        leaderboardString += `${index + 1}. ${p.username}: ${p.power}\n`;
-    });
-
-    // Update leaderboard text object
-    if (leaderboardText) {
-        leaderboardText.setText(leaderboardString);
+    // Spectators get no "remove" messages; every snapshot lists all players, so anyone missing left
+    if (spectating) {
+      for (const id of Object.keys(otherPlayers)) {
+        if (!(id in data.players)) {
+          removeOtherPlayer(id);
+        }
+      }
     }
-    // --- End Leaderboard Update ---
 
     for (const [id, info] of Object.entries(data.players)) {
       if (id === socket.id) {
+        acknowledgeInputs(info.ack);
         // Update local player's power
         playerPower = info.power;
         playerPowerText.setText(playerPower.toString());
@@ -241,7 +253,8 @@ function handleSocketMessage(event) {
           sprite: other, 
           powerText: powerText, 
           usernameText: usernameText,
-          power: info.power 
+          power: info.power,
+          samples: [{ t: data.server_time, x: info.x, y: info.y }] // Positions are interpolated in update()
         };
       } else {
         const otherPlayer = otherPlayers[id];
@@ -270,45 +283,90 @@ function handleSocketMessage(event) {
         }
         // --- End State-Based Visibility --- 
 
-        otherPlayers[id].sprite.x = info.x;
-        otherPlayers[id].sprite.y = info.y;
+        pushSnapshotSample(otherPlayers[id], data.server_time, info.x, info.y);
         otherPlayers[id].power = info.power;
         // Scale other player based on power
         const otherScale = playerInitialSize + info.power * 0.005; // Adjust scaling factor as needed
         otherPlayers[id].sprite.setScale(otherScale);
 
-        // Update power text
+        // Update power text (positions follow the interpolated sprite)
         otherPlayers[id].powerText.setText(info.power);
-        otherPlayers[id].powerText.setPosition(info.x, info.y);
         
         // Update username text
         otherPlayers[id].usernameText.setText(info.username || 'Guest');
-        otherPlayers[id].usernameText.setPosition(info.x, info.y - 30);
       }
     }
   } else if (data.type === "id") {
+    hideQueueStatus(); // Admitted
     socket.id = data.id;
+    resumeToken = data.resume_token;
+    resumeAttempts = 0;
+    updateServerClock(data.server_time);
+    if (data.leaderboard) {
+      renderLeaderboard(data.leaderboard);
+    }
     // Update initial timer
     const minutes = Math.floor(data.time_remaining / 60);
     const seconds = Math.floor(data.time_remaining % 60);
     timerText.setText(`${minutes}:${seconds.toString().padStart(2, '0')}`);
 
-    // Create initial food
+    // Create initial food (replacing any left from a connection that could not be resumed)
     if (data.food) {
-      for (const food of data.food) {
-        const foodSprite = scene.add.sprite(food.x, food.y, 'food').setScale(0.1);
-        foodSprite.setDepth(1);
-        foodInstances[food.id] = foodSprite;
+      syncFood(scene, flattenFood(data.food));
+    }
+  } else if (data.type === "resumed") {
+    // Same player as before the connection dropped; only what changed while we were away
+    resumeToken = data.resume_token;
+    resumeAttempts = 0;
+    socket.id = data.id;
+    updateServerClock(data.server_time);
+    if (data.leaderboard) {
+      renderLeaderboard(data.leaderboard);
+    }
+    const minutes = Math.floor(data.time_remaining / 60);
+    const seconds = Math.floor(data.time_remaining % 60);
+    timerText.setText(`${minutes}:${seconds.toString().padStart(2, '0')}`);
+    if (player && !data.is_respawning) {
+      player.setPosition(data.x, data.y);
+    }
+    playerPower = data.power;
+    playerPowerText.setText(playerPower.toString());
+    pendingInputs = [];
+    // Players who left while we were away
+    const present = new Set(data.players);
+    for (const id of Object.keys(otherPlayers)) {
+      if (!present.has(id)) {
+        removeOtherPlayer(id);
       }
     }
+    if (data.food) {
+      syncFood(scene, flattenFood(data.food)); // A new round started meanwhile
+    } else {
+      removeFood(data.food_removed);
+      spawnFood(scene, data.food_spawned);
+    }
+    if (scene.input) scene.input.enabled = true;
+  } else if (data.type === "spectate") {
+    // Spectator equivalent of "id": current round state, then a low-rate snapshot stream
+    updateServerClock(data.server_time);
+    if (data.leaderboard) {
+      renderLeaderboard(data.leaderboard);
+    }
+    const minutes = Math.floor(data.time_remaining / 60);
+    const seconds = Math.floor(data.time_remaining % 60);
+    timerText.setText(`${minutes}:${seconds.toString().padStart(2, '0')}`);
+    syncFood(scene, flattenFood(data.food || []));
+  } else if (data.type === "food_sync") {
+    // Spectators get the whole pellet list every few seconds instead of every pickup
+    syncFood(scene, data.food);
+  } else if (data.type === "minimap") {
+    drawMinimap(data);
   } else if (data.type === "food_update") {
     // Remove collected food
-    for (const foodId of data.removed_food) {
-      if (foodInstances[foodId]) {
-        foodInstances[foodId].destroy();
-        delete foodInstances[foodId];
-      }
-    }
+    removeFood(data.removed_food);
+  } else if (data.type === "food_spawn") {
+    // Batched respawns as flat [id, x, y, id, x, y, ...]; ids are recycled by the server
+    spawnFood(scene, data.food);
   } else if (data.type === "pre_reset_timer") {
     showNewGameTimer(data.duration);
     
@@ -399,12 +457,7 @@ function handleSocketMessage(event) {
     startInvulnerability(10);
 
   } else if (data.type === "remove") {
-    if (otherPlayers[data.id]) {
-      otherPlayers[data.id].sprite.destroy();
-      if (otherPlayers[data.id].powerText) otherPlayers[data.id].powerText.destroy();
-      if (otherPlayers[data.id].usernameText) otherPlayers[data.id].usernameText.destroy();
-      delete otherPlayers[data.id];
-    }
+    removeOtherPlayer(data.id);
   } else if (data.type === "eaten") {
     // Player was eaten
     fetch('/api/addDeaths', {
@@ -478,6 +531,78 @@ function handleSocketMessage(event) {
   }
 }
 
+function removeOtherPlayer(id) {
+  if (otherPlayers[id]) {
+    otherPlayers[id].sprite.destroy();
+    if (otherPlayers[id].powerText) otherPlayers[id].powerText.destroy();
+    if (otherPlayers[id].usernameText) otherPlayers[id].usernameText.destroy();
+    delete otherPlayers[id];
+  }
+}
+
+function removeFood(foodIds) {
+  for (const foodId of foodIds) {
+    if (foodInstances[foodId]) {
+      foodInstances[foodId].destroy();
+      delete foodInstances[foodId];
+    }
+  }
+}
+
+// flat is [id, x, y, id, x, y, ...]; a recycled id replaces the pellet it had before
+function spawnFood(scene, flat) {
+  for (let i = 0; i + 2 < flat.length; i += 3) {
+    const foodId = flat[i];
+    if (foodInstances[foodId]) {
+      foodInstances[foodId].destroy();
+    }
+    const foodSprite = scene.add.sprite(flat[i + 1], flat[i + 2], 'food').setScale(0.1);
+    foodSprite.setDepth(1);
+    foodInstances[foodId] = foodSprite;
+  }
+}
+
+function flattenFood(foodList) {
+  const flat = [];
+  for (const food of foodList) {
+    flat.push(food.id, food.x, food.y);
+  }
+  return flat;
+}
+
+function gameSocketUrl() {
+  const protocol = window.location.protocol === 'https:' ? 'wss://' : 'ws://';
+  // After a dropped connection, ask for the same player back instead of joining as a new one
+  const query = resumeToken ? `?resume=${encodeURIComponent(resumeToken)}&tick=${lastSnapshotTick}` : '';
+  return `${protocol}${location.host}/ws/game${query}`;
+}
+
+function handleGameSocketClose(scene, event) {
+  console.log("Disconnected from server. Code:", event.code, "Reason:", event.reason);
+  if (event.code === 1008 && event.reason === "User already connected") {
+    console.error("Attempted to connect again while already connected.");
+    if (scene.input) scene.input.enabled = false;
+  } else if (!event.wasClean || event.code === 1001 || event.code === 1012) {
+    if (resumeToken && resumeAttempts < MAX_RESUME_ATTEMPTS) {
+      resumeAttempts++;
+      console.warn(`Lost connection to the server, resuming (attempt ${resumeAttempts})...`);
+      setTimeout(() => resumeGameSocket(scene), RESUME_RETRY_MS * resumeAttempts);
+      return;
+    }
+    console.warn("Lost connection to the server.");
+    if (scene.input) scene.input.enabled = false;
+  }
+}
+
+function resumeGameSocket(scene) {
+  socket = new WebSocket(gameSocketUrl());
+  socket.addEventListener("close", (event) => handleGameSocketClose(scene, event));
+  socket.addEventListener("error", (error) => {
+    console.error("WebSocket error:", error);
+  });
+  socket.addEventListener("message", handleSocketMessage);
+}
+
 function preload() {
   // Fetch and load the player's custom skin
   this.load.image('background', '/game/static/assets/Background.png');
@@ -517,9 +642,13 @@ function create() {
 
   this.physics.world.setBounds(0, 0, worldWidth, worldHeight);
 
+  if (spectating) {
+    startSpectating(this);
+    return;
+  }
+
   // --- WebSocket Connection First ---
-  const protocol = window.location.protocol === 'https:' ? 'wss://' : 'ws://';
-  socket = new WebSocket(`${protocol}${location.host}/ws/game`);
+  socket = new WebSocket(gameSocketUrl());
   
   // Store 'this' context for use inside listeners
   const scene = this; 
@@ -598,27 +727,16 @@ function create() {
     scene.cameras.main.startFollow(player, true, 0.08, 0.08);
     scene.cameras.main.setName('main'); // Good practice to name cameras
 
-    // --- Minimap Camera Setup ---
-    const minimap = scene.cameras.add(MINIMAP_X, MINIMAP_Y, MINIMAP_WIDTH, MINIMAP_HEIGHT).setZoom(MINIMAP_ZOOM);
-    minimap.setBounds(0, 0, worldWidth, worldHeight);
-    minimap.startFollow(player, true, 0.08, 0.08);
-    minimap.setBackgroundColor(0x000000); // Black background for minimap
-    minimap.setName('minimap');
-
-    // --- Minimap Border ---
-    const minimapBorder = scene.add.graphics();
-    minimapBorder.lineStyle(MINIMAP_BORDER_THICKNESS, MINIMAP_BORDER_COLOR, 1);
-    minimapBorder.strokeRect(MINIMAP_X, MINIMAP_Y, MINIMAP_WIDTH, MINIMAP_HEIGHT);
-    minimapBorder.setScrollFactor(0); // Keep border fixed on screen
-    minimapBorder.setDepth(150); // Ensure border is above minimap but below main UI if needed
-
-    // --- Ignore Fixed UI on Minimap ---
-    // Make sure elements with scrollFactor(0) are not drawn by the minimap
-    minimap.ignore([leaderboardText, minimapBorder]);
-    // Note: Player-attached text (power, username, invuln) will correctly appear on both cameras
-    // If respawnMessageText exists at creation, ignore it too (it's centered)
+    // --- Minimap ---
+    // Drawn from the server's coarse "minimap" grid (2 Hz) instead of a second camera rendering every sprite
+    minimapGraphics = scene.add.graphics();
+    minimapGraphics.setScrollFactor(0); // Keep fixed on screen
+    minimapGraphics.setDepth(150);
+    minimapSelfMarker = scene.add.graphics();
+    minimapSelfMarker.setScrollFactor(0);
+    minimapSelfMarker.setDepth(151);
+    drawMinimap(null);
     if (respawnMessageText) {
-      minimap.ignore(respawnMessageText);
       respawnMessageText.setScrollFactor(0); // Ensure it stays centered
     }
 
@@ -628,10 +746,14 @@ function create() {
       loop: true,
       callback: () => {
         if (socket.readyState === WebSocket.OPEN && player) { // Check if player exists
+          inputSeq++;
           socket.send(JSON.stringify({
             x: player.x,
-            y: player.y
+            y: player.y,
+            seq: inputSeq // Echoed back as "ack" in snapshots
           }));
+          pendingInputs.push({ seq: inputSeq, time: performance.now() });
+          if (pendingInputs.length > 100) pendingInputs.shift();
         }
       }
     });
@@ -642,16 +764,7 @@ function create() {
 
   });
 
-  socket.addEventListener("close", (event) => {
-    console.log("Disconnected from server. Code:", event.code, "Reason:", event.reason);
-    if (event.code === 1008 && event.reason === "User already connected") {
-      console.error("Attempted to connect again while already connected.");
-      if (scene.input) scene.input.enabled = false; 
-    } else if (!event.wasClean) {
-        console.warn("Lost connection to the server.");
-        if (scene.input) scene.input.enabled = false;
-    }
-  });
+  socket.addEventListener("close", (event) => handleGameSocketClose(scene, event));
 
   socket.addEventListener("error", (error) => {
     console.error("WebSocket error:", error);
@@ -662,6 +775,192 @@ function create() {
 
 }
 
+// --- Spectator Mode ---
+function startSpectating(scene) {
+  const protocol = window.location.protocol === 'https:' ? 'wss://' : 'ws://';
+  socket = new WebSocket(`${protocol}${location.host}/ws/spectate`);
+  socket.binaryType = 'arraybuffer'; // Snapshots arrive as shared binary frames holding JSON
+  const decoder = new TextDecoder();
+
+  leaderboardText = scene.add.text(containerWidth - 10, 10, 'Leaderboard:', {
+    fontSize: '12px',
+    color: '#ffffff',
+    align: 'right',
+    backgroundColor: 'rgba(0, 0, 0, 0.5)',
+    padding: { x: 10, y: 5 }
+  });
+  leaderboardText.setOrigin(1, 0);
+  leaderboardText.setScrollFactor(0);
+  leaderboardText.setDepth(100);
+
+  timerText = scene.add.text(10, 10, '5:00', {
+    fontSize: '14px',
+    color: '#ffffff',
+    backgroundColor: 'rgba(0, 0, 0, 0.5)',
+    padding: { x: 10, y: 5 }
+  });
+  timerText.setScrollFactor(0);
+  timerText.setDepth(100);
+
+  cursors = scene.input.keyboard.addKeys('W,A,S,D');
+  scene.cameras.main.setBounds(0, 0, worldWidth, worldHeight);
+  scene.cameras.main.centerOn(worldWidth / 2, worldHeight / 2);
+
+  socket.addEventListener("message", (event) => {
+    const text = typeof event.data === 'string' ? event.data : decoder.decode(event.data);
+    handleSocketMessage({ data: text });
+  });
+  socket.addEventListener("close", (event) => {
+    console.log("Spectator stream closed. Code:", event.code, "Reason:", event.reason);
+  });
+}
+
+function moveSpectatorCamera(delta) {
+  if (!cursors) return;
+  const cam = game.scene.scenes[0].cameras.main;
+  const step = SPECTATOR_CAMERA_SPEED * delta / 1000;
+  if (cursors.A.isDown) cam.scrollX -= step;
+  else if (cursors.D.isDown) cam.scrollX += step;
+  if (cursors.W.isDown) cam.scrollY -= step;
+  else if (cursors.S.isDown) cam.scrollY += step;
+}
+
+// Replaces the local pellets with a flat [id, x, y, ...] list, keeping sprites that did not move
+function syncFood(scene, flat) {
+  const seen = new Set();
+  for (let i = 0; i + 2 < flat.length; i += 3) {
+    const foodId = flat[i];
+    seen.add(foodId);
+    const existing = foodInstances[foodId];
+    if (existing && existing.x === flat[i + 1] && existing.y === flat[i + 2]) {
+      continue;
+    }
+    if (existing) {
+      existing.destroy();
+    }
+    const foodSprite = scene.add.sprite(flat[i + 1], flat[i + 2], 'food').setScale(0.1);
+    foodSprite.setDepth(1);
+    foodInstances[foodId] = foodSprite;
+  }
+  for (const foodId of Object.keys(foodInstances)) {
+    if (!seen.has(Number(foodId))) {
+      foodInstances[foodId].destroy();
+      delete foodInstances[foodId];
+    }
+  }
+}
+// --- End Spectator Mode ---
+
+// --- Minimap Functions ---
+// data.cells is flat [cell, count, power, ...] over a columns x rows grid, data.top is flat [x, y, power, ...]
+function drawMinimap(data) {
+  if (!minimapGraphics) return;
+  const g = minimapGraphics;
+  g.clear();
+  g.fillStyle(0x000000, 0.6);
+  g.fillRect(MINIMAP_X, MINIMAP_Y, MINIMAP_WIDTH, MINIMAP_HEIGHT);
+
+  if (data) {
+    const cellWidth = MINIMAP_WIDTH / data.columns;
+    const cellHeight = MINIMAP_HEIGHT / data.rows;
+    let maxPower = 1;
+    for (let i = 0; i + 2 < data.cells.length; i += 3) {
+      maxPower = Math.max(maxPower, data.cells[i + 2]);
+    }
+    for (let i = 0; i + 2 < data.cells.length; i += 3) {
+      const cell = data.cells[i];
+      const column = cell % data.columns;
+      const row = Math.floor(cell / data.columns);
+      g.fillStyle(MINIMAP_CELL_COLOR, 0.25 + 0.75 * data.cells[i + 2] / maxPower);
+      g.fillRect(MINIMAP_X + column * cellWidth, MINIMAP_Y + row * cellHeight, cellWidth, cellHeight);
+    }
+    g.fillStyle(MINIMAP_MARKER_COLOR, 1);
+    for (let i = 0; i + 2 < data.top.length; i += 3) {
+      g.fillCircle(MINIMAP_X + data.top[i] * MINIMAP_WIDTH / worldWidth,
+                   MINIMAP_Y + data.top[i + 1] * MINIMAP_HEIGHT / worldHeight, 3);
+    }
+  }
+
+  g.lineStyle(MINIMAP_BORDER_THICKNESS, MINIMAP_BORDER_COLOR, 1);
+  g.strokeRect(MINIMAP_X, MINIMAP_Y, MINIMAP_WIDTH, MINIMAP_HEIGHT);
+}
+
+// Our own position is known locally, so it moves every frame rather than at the grid's 2 Hz
+function drawMinimapSelf() {
+  if (!minimapSelfMarker || !player) return;
+  minimapSelfMarker.clear();
+  minimapSelfMarker.fillStyle(0xffffff, 1);
+  minimapSelfMarker.fillCircle(MINIMAP_X + player.x * MINIMAP_WIDTH / worldWidth,
+                               MINIMAP_Y + player.y * MINIMAP_HEIGHT / worldHeight, 2);
+}
+// --- End Minimap Functions ---
+
+// --- Leaderboard Functions ---
+function renderLeaderboard(topPlayers) {
+  if (!leaderboardText) return;
+  let leaderboardString = "Leaderboard:\n";
+  topPlayers.forEach((p, index) => {
+    leaderboardString += `${index + 1}. ${p.username || 'Guest'}: ${p.power}\n`;
+  });
+  leaderboardText.setText(leaderboardString);
+}
+// --- End Leaderboard Functions ---
+
+// --- Snapshot Interpolation Functions ---
+function updateServerClock(serverTime) {
+  if (serverTime === undefined) return;
+  const offset = serverTime - Date.now();
+  // The smallest offset had the least network delay; follow larger ones slowly to track drift
+  if (serverTimeOffset === null || offset < serverTimeOffset) {
+    serverTimeOffset = offset;
+  } else {
+    serverTimeOffset += (offset - serverTimeOffset) * 0.01;
+  }
+}
+
+function pushSnapshotSample(other, serverTime, x, y) {
+  other.samples.push({ t: serverTime, x: x, y: y });
+  if (other.samples.length > MAX_SNAPSHOT_SAMPLES) other.samples.shift();
+}
+
+function acknowledgeInputs(ack) {
+  // Drop inputs the server has applied; the newest acknowledged one gives the round trip time
+  while (pendingInputs.length > 0 && pendingInputs[0].seq <= ack) {
+    const input = pendingInputs.shift();
+    if (input.seq === ack) roundTripMs = performance.now() - input.time;
+  }
+}
+
+function interpolateOtherPlayers() {
+  if (serverTimeOffset === null) return;
+  const renderTime = Date.now() + serverTimeOffset - INTERPOLATION_DELAY_MS;
+
+  for (const id in otherPlayers) {
+    const other = otherPlayers[id];
+    const samples = other.samples;
+    if (!samples || samples.length === 0) continue;
+
+    // Keep only the sample just before renderTime and everything after it
+    while (samples.length >= 2 && samples[1].t <= renderTime) samples.shift();
+
+    let x = samples[0].x;
+    let y = samples[0].y;
+    if (samples.length >= 2 && samples[0].t <= renderTime) {
+      const a = samples[0];
+      const b = samples[1];
+      const f = (renderTime - a.t) / Math.max(1, b.t - a.t);
+      x = a.x + (b.x - a.x) * f;
+      y = a.y + (b.y - a.y) * f;
+    }
+    // With no newer snapshot yet, hold the last known position instead of guessing
+
+    other.sprite.setPosition(x, y);
+    other.powerText.setPosition(x, y);
+    other.usernameText.setPosition(x, y - 30);
+  }
+}
+// --- End Snapshot Interpolation Functions ---
+
 // --- New Invulnerability Functions ---
 function startInvulnerability(durationSeconds) {
   const scene = game.scene.scenes[0];
@@ -833,6 +1132,37 @@ function hideNewGameTimer() {
     }
     newGameEndTime = 0; // Always reset end time
 }
+
+let queueStatusText = null;
+
+function showQueueStatus(message) {
+    const scene = game.scene.scenes[0];
+    if (!scene || !scene.cameras || !scene.cameras.main) {
+        console.log(message);
+        return;
+    }
+    if (!queueStatusText) {
+        const cam = scene.cameras.main;
+        queueStatusText = scene.add.text(cam.width / 2, cam.height / 2, '', {
+            fontSize: '28px',
+            color: '#FFD700',
+            align: 'center',
+            backgroundColor: 'rgba(0,0,0,0.6)',
+            padding: { x: 20, y: 15 }
+        });
+        queueStatusText.setOrigin(0.5);
+        queueStatusText.setScrollFactor(0); // Keep fixed on screen
+        queueStatusText.setDepth(550);
+    }
+    queueStatusText.setText(message);
+}
+
+function hideQueueStatus() {
+    if (queueStatusText) {
+        queueStatusText.destroy();
+        queueStatusText = null;
+    }
+}
 // --- End Helper Functions ---
 
 // Function to reset player speed after debuff duration
@@ -848,6 +1178,14 @@ function resetSlowness() {
 }
 
 function update(time, delta) {
+  // Move other players between the last snapshots we received
+  interpolateOtherPlayers();
+
+  if (spectating) {
+    moveSpectatorCamera(delta);
+    return;
+  }
+
   // Check if player and cursors are initialized before using them
   if (!player || !cursors || !player.body || !player.active) {
     return; // Don't run update logic if game setup hasn't completed or player inactive
@@ -931,6 +1269,8 @@ function update(time, delta) {
       player.setVisible(playerVisible);
   }
 
+  drawMinimapSelf();
+
   // Update local player's power text and timer position
   playerPowerText.setPosition(player.x, player.y);
   timerText.setPosition(player.x, player.y + 30);
@@ -0,0 +1,178 @@
+import asyncio
+import json
+import math
+import time
+from typing import Optional
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from simulation import WORLD_WIDTH, WORLD_HEIGHT
+
+# Clients send a position every 50 ms (20 Hz). Allow some headroom for jitter
+# before a connection starts losing messages to the rate limit.
+INPUT_RATE_PER_SECOND = 30
+INPUT_BURST = 10
+# How often buffered input is applied to the game (matches broadcast_loop)
+INPUT_TICK_SECONDS = 1 / 30
+# A connection that has this many messages dropped inside FLOOD_WINDOW_SECONDS gets flagged
+FLOOD_DROP_THRESHOLD = 60
+FLOOD_WINDOW_SECONDS = 5
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def consume(self, amount: float = 1.0) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return True
+        return False
+
+
+class InputIngestor:
+    """
+    Per-connection ingestion stage for game input.
+
+    A reader task drains the socket as fast as messages arrive, rate limits them
+    with a token bucket and keeps only the newest position. The game loop calls
+    next_input(), which hands back at most one input per tick, so a client that
+    bursts messages cannot make the server run the game logic more often.
+    """
+
+    def __init__(self, websocket: WebSocket, rate: float = INPUT_RATE_PER_SECOND,
+                 burst: float = INPUT_BURST, tick: float = INPUT_TICK_SECONDS,
+                 width: float = WORLD_WIDTH, height: float = WORLD_HEIGHT):
+        self.websocket = websocket
+        self.width = width    # positions are clamped to the world
+        self.height = height
+        self.bucket = TokenBucket(rate, burst)
+        self.tick = tick
+        self.latest: Optional[dict] = None
+        self.closed_error: Optional[BaseException] = None
+        self.available = asyncio.Event()
+        self.last_delivery = 0.0
+        self.reader_task: Optional[asyncio.Task] = None
+
+        # Ingress counters, reported through /api/admin/ingest
+        self.received = 0
+        self.bytes_received = 0
+        self.accepted = 0
+        self.coalesced = 0
+        self.rate_limited = 0
+        self.malformed = 0
+        self.applied = 0
+        self.flagged = False
+        self._window_start = time.monotonic()
+        self._window_drops = 0
+
+    def start(self):
+        if self.reader_task is None:
+            self.reader_task = asyncio.create_task(self._reader())
+
+    def stop(self):
+        if self.reader_task is not None and not self.reader_task.done():
+            self.reader_task.cancel()
+
+    async def _reader(self):
+        try:
+            while True:
+                text = await self.websocket.receive_text()
+                self._offer(text)
+        except asyncio.CancelledError:
+            raise
+        except WebSocketDisconnect as e:
+            # The game loop re-raises this once the last buffered input has been applied
+            self.closed_error = e
+            self.available.set()
+        except Exception as e:
+            # Treat a broken socket (e.g. a binary frame or a receive after close) as a disconnect
+            print(f"[Ingest] Closing connection after receive error: {e}")
+            self.closed_error = WebSocketDisconnect(code=1011)
+            self.available.set()
+
+    def _offer(self, text: str):
+        self.received += 1
+        self.bytes_received += len(text)
+
+        if not self.bucket.consume():
+            self.rate_limited += 1
+            self._record_drop()
+            return
+
+        try:
+            data = json.loads(text)
+            x = float(data["x"])
+            y = float(data["y"])
+            seq = int(data["seq"]) if "seq" in data else None
+        except (ValueError, TypeError, KeyError, OverflowError):
+            self.malformed += 1
+            return
+        if not (math.isfinite(x) and math.isfinite(y)):
+            # json.loads accepts NaN and Infinity; neither is a position the game can use
+            self.malformed += 1
+            return
+
+        data["x"] = min(max(x, 0.0), self.width)
+        data["y"] = min(max(y, 0.0), self.height)
+        if seq is not None:
+            data["seq"] = seq
+        self.accepted += 1
+        if self.latest is not None:
+            # A newer position replaces one the game loop has not applied yet
+            self.coalesced += 1
+        self.latest = data
+        self.available.set()
+
+    def _record_drop(self):
+        now = time.monotonic()
+        if now - self._window_start > FLOOD_WINDOW_SECONDS:
+            self._window_start = now
+            self._window_drops = 0
+        self._window_drops += 1
+        if not self.flagged and self._window_drops >= FLOOD_DROP_THRESHOLD:
+            self.flagged = True
+            print(f"[Ingest] Flagging flooding connection: {self._window_drops} messages dropped "
+                  f"in {FLOOD_WINDOW_SECONDS}s")
+
+    async def next_input(self) -> dict:
+        """Waits for the newest buffered input, delivering at most one per tick."""
+        while True:
+            await self.available.wait()
+            if self.latest is None and self.closed_error is not None:
+                raise self.closed_error
+
+            wait = self.last_delivery + self.tick - time.monotonic()
+            if wait > 0:
+                # Let more input pile up; only the newest one will be applied
+                await asyncio.sleep(wait)
+
+            data = self.latest
+            self.latest = None
+            if self.closed_error is None:
+                self.available.clear()
+            if data is None:
+                continue
+            self.last_delivery = time.monotonic()
+            self.applied += 1
+            return data
+
+    def stats(self) -> dict:
+        return {
+            "received": self.received,
+            "bytes_received": self.bytes_received,
+            "accepted": self.accepted,
+            "coalesced": self.coalesced,
+            "rate_limited": self.rate_limited,
+            "malformed": self.malformed,
+            "applied": self.applied,
+            "flagged": self.flagged,
+        }
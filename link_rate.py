@@ -0,0 +1,130 @@
+"""
+Adaptive per-client snapshot rate.
+
+Each connection gets a ClientLink that sends snapshots on its own task and
+measures how long every send takes to complete. Clients whose sends are
+slow, or that still have the previous frame in flight when the next one is
+due, are stepped down to a lower snapshot rate (15 -> 10 -> 6 -> 5 Hz with
+the defaults); once their sends are fast again for a while they are
+stepped back up.
+"""
+import asyncio
+import os
+import time
+
+from fastapi import WebSocketDisconnect
+
+from messaging import send_encoded
+
+TICK_HZ = 30
+RATE_TIERS = (30, 15, 10, 6, 5)  # must divide TICK_HZ
+# Snapshot rate for a healthy link. Snapshots carry tick/server_time and clients
+# interpolate between them, so this can be well below the 30 Hz tick rate.
+SNAPSHOT_HZ = int(os.getenv("SNAPSHOT_HZ", "15"))
+# Lowest snapshot rate a client can be stepped down to
+MIN_SNAPSHOT_HZ = int(os.getenv("MIN_SNAPSHOT_HZ", "5"))
+# A send slower than this (smoothed) counts as a congested link: half a 30 Hz frame
+SLOW_SEND_SECONDS = 0.015
+# Sends faster than this count towards stepping the rate back up
+FAST_SEND_SECONDS = 0.004
+# Consecutive fast sends needed before stepping up one tier
+RECOVERY_FRAMES = 45
+# Frames to wait after a rate change before stepping down again, so one slow burst costs one tier
+STEP_DOWN_COOLDOWN_FRAMES = 10
+EWMA_WEIGHT = 0.2
+
+
+class ClientLink:
+    def __init__(self, max_hz: int = SNAPSHOT_HZ, min_hz: int = MIN_SNAPSHOT_HZ):
+        self.tiers = [hz for hz in RATE_TIERS if min_hz <= hz <= max_hz] or [RATE_TIERS[0]]
+        self.tier = 0
+        self.send_seconds = 0.0  # EWMA of send completion time
+        self.last_send_seconds = 0.0
+        self.in_flight_bytes = 0  # size of the frame being sent (at most one per client), 0 when idle
+        self.send_task = None
+        self.failed = False
+        self.fast_streak = 0
+        self.frames_since_change = STEP_DOWN_COOLDOWN_FRAMES
+
+        self.frames_sent = 0
+        self.frames_skipped = 0  # previous frame still in flight when this one was due
+        self.step_downs = 0
+        self.step_ups = 0
+
+    @property
+    def hz(self) -> int:
+        return self.tiers[self.tier]
+
+    @property
+    def busy(self) -> bool:
+        return self.send_task is not None and not self.send_task.done()
+
+    def due(self, tick: int) -> bool:
+        return tick % (TICK_HZ // self.hz) == 0
+
+    def offer(self, tick: int, ws, kind: str, encoded: str) -> bool:
+        """Starts sending the frame if this client is due for one. Returns True if a send started."""
+        if self.failed or not self.due(tick):
+            return False
+        if self.busy:
+            # The link cannot keep up with the current rate: drop this frame instead of queueing it
+            self.frames_skipped += 1
+            self.frames_since_change += 1
+            self.fast_streak = 0
+            self._step_down()
+            return False
+        self.in_flight_bytes = len(encoded)
+        self.send_task = asyncio.create_task(self._send(ws, kind, encoded))
+        return True
+
+    async def _send(self, ws, kind: str, encoded: str):
+        start = time.perf_counter()
+        try:
+            await send_encoded(ws, kind, encoded)
+        except (WebSocketDisconnect, RuntimeError) as e:
+            print(f"Snapshot send failed, dropping client link: {e}")
+            self.failed = True
+            return
+        finally:
+            self.in_flight_bytes = 0
+        self._record(time.perf_counter() - start)
+
+    def _record(self, seconds: float):
+        self.frames_sent += 1
+        self.frames_since_change += 1
+        self.last_send_seconds = seconds
+        self.send_seconds += EWMA_WEIGHT * (seconds - self.send_seconds)
+        if self.send_seconds > SLOW_SEND_SECONDS:
+            self.fast_streak = 0
+            self._step_down()
+        elif seconds < FAST_SEND_SECONDS:
+            self.fast_streak += 1
+            if self.fast_streak >= RECOVERY_FRAMES and self.tier > 0:
+                self.tier -= 1
+                self.step_ups += 1
+                self.fast_streak = 0
+                self.frames_since_change = 0
+        else:
+            self.fast_streak = 0
+
+    def _step_down(self):
+        if self.tier < len(self.tiers) - 1 and self.frames_since_change >= STEP_DOWN_COOLDOWN_FRAMES:
+            self.tier += 1
+            self.step_downs += 1
+            self.frames_since_change = 0
+
+    def cancel(self):
+        if self.busy:
+            self.send_task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "hz": self.hz,
+            "send_ms": self.send_seconds * 1000,
+            "last_send_ms": self.last_send_seconds * 1000,
+            "in_flight_bytes": self.in_flight_bytes,
+            "frames_sent": self.frames_sent,
+            "frames_skipped": self.frames_skipped,
+            "step_downs": self.step_downs,
+            "step_ups": self.step_ups,
+        }
@@ -1,22 +1,43 @@
 import hashlib
+import functools
 import traceback
-import uvicorn
 import asyncio
 import json
 from fastapi import FastAPI, Request, Depends, HTTPException, status, Response, Cookie, Body, WebSocket, WebSocketDisconnect, UploadFile
-from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse, JSONResponse, StreamingResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse, JSONResponse, StreamingResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
+import database
 from database import users_collection, sessions_collection, leaderboard_stats_collection, skin_collection, \
     playerStats_collection
 from typing import Optional
+from pymongo import UpdateOne
 from logger_help import RequestResponseLogger
 import os
 import string
-from auth import get_password_hash, verify_password, create_access_token, hash_token, get_current_user
+from auth import get_password_hash_async, verify_password_async, create_access_token, hash_token, get_current_user, get_admin_user
+from ingest import InputIngestor
+from admission import AdmissionController, ROOM
+from rate_limit import RateLimits, RateLimitMiddleware
+import db_profiler
+from tracing import TracingMiddleware, SpanMiddleware, TracedRoute, trace_buffer
+from spectators import SpectatorHub
+from task_supervisor import task_supervisor
+from tick_scheduler import tick_scheduler
+from resume import ResumeRegistry, RESUME_SLACK_TICKS
+from food_field import FoodField
+from simulation import Simulation
+from sim_process import SimulationProcess, SIMULATION_PROCESS, RESPAWNING, INVULNERABLE
+import round_results
+import profile_summary
+from messaging import encode_message, send_encoded, send_message
+from metrics import registry, TICK_SECONDS, BROADCAST_SECONDS, pending_sends
+from memory_diag import memory_diagnostics
+import sys
+from stall_watchdog import StallWatchdog
+from link_rate import ClientLink
+from match_recorder import MatchRecorder
 from pydantic import BaseModel # Added for request bodies
-from datetime import datetime
-import random
+from datetime import datetime, timezone
 import time
 import asyncio
 import logging
@@ -24,24 +45,56 @@ from zoneinfo import ZoneInfo
 from uuid import uuid4
 from random import choice
 from pathlib import Path
+from contextlib import asynccontextmanager
 from typing import Optional
-from PIL import Image, ImageDraw, ImageChops
 import uuid
 from io import BytesIO
 from starlette.responses import StreamingResponse
+from starlette.websockets import WebSocketState
 import traceback
 
 #from traceback import extract_stack, format_list
-app = FastAPI(title='Merge Conflict Game', description='Authentication and Game API', version='1.0')
+
+# Importing this module has no side effects beyond building the app: log files,
+# the database connection and background monitors are all set up in lifespan.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_logging()
+    stall_watchdog.start()
+    # Connect in the background so a slow or missing database does not hold up startup; see /readyz
+    asyncio.create_task(check_database_ready())
+    yield
+    stop_broadcast_loop()
+    await tick_scheduler.drain()  # stats and scores still waiting for a tick
+    task_supervisor.cancel_all()
+    match_recorder.stop()
+    stall_watchdog.stop()
+    database.close()
+
+app = FastAPI(title='Merge Conflict Game', description='Authentication and Game API', version='1.0', lifespan=lifespan)
+# Traced requests get "route" and "handler" spans (see tracing.py); set before any route is declared
+app.router.route_class = TracedRoute
+app.add_middleware(SpanMiddleware, name="router")
 app.add_middleware(RequestResponseLogger)
+app.add_middleware(SpanMiddleware, name="mw_request_logger")
+
+BASE_DIR = Path(__file__).resolve().parent
 
 # Mount 'public/pictures' directory to serve images under '/pictures' path
-app.mount("/pictures", StaticFiles(directory="public/pictures"), name="pictures")
+app.mount("/pictures", StaticFiles(directory=BASE_DIR / "public/pictures"), name="pictures")
 
 # Mount 'game/static' directory to serve game logic
-app.mount("/game/static", StaticFiles(directory="game/static"), name="game-static")
+app.mount("/game/static", StaticFiles(directory=BASE_DIR / "game/static"), name="game-static")
 
-templates = Jinja2Templates(directory="game/templates")
+# Jinja2 is only needed for /play, so it is imported on first use
+_templates = None
+
+def get_templates():
+    global _templates
+    if _templates is None:
+        from fastapi.templating import Jinja2Templates
+        _templates = Jinja2Templates(directory=BASE_DIR / "game/templates")
+    return _templates
 
 # --- Pydantic Models for Request Bodies ---
 class UserCredentials(BaseModel):
@@ -67,7 +120,6 @@ active_usernames = set()
 # Add these at the top with other global variables
 game_start_time = None
 game_duration = 300   # 5 minutes in seconds
-food_instances = []  # List to store food positions
 
 # World dimensions based on 9x9 grid of 1920x1080 background
 bgWidth = 1920
@@ -75,15 +127,100 @@ bgHeight = 1080
 worldWidth = bgWidth * 9
 worldHeight = bgHeight * 9
 
-def generate_food():
-    global food_instances
-    food_instances = []
-    for _ in range(1000):  # Decreased from 3000 to 1500 food items
-        food_instances.append({
-            "x": random.randint(0, worldWidth),
-            "y": random.randint(0, worldHeight),
-            "id": str(uuid4())
-        })
+# Food field: pellets are kept at FOOD_TARGET and eaten ones respawn at FOOD_RESPAWN_PER_SECOND
+FOOD_CAPACITY = int(os.getenv("FOOD_CAPACITY", "2000"))
+FOOD_TARGET = int(os.getenv("FOOD_TARGET", "1000"))
+FOOD_RESPAWN_PER_SECOND = float(os.getenv("FOOD_RESPAWN_PER_SECOND", "5"))
+# Game rules (pickups, collisions, respawn timers) live in simulation.py and work on clients directly
+simulation = Simulation(worldWidth, worldHeight,
+                        FoodField(FOOD_CAPACITY, FOOD_TARGET, FOOD_RESPAWN_PER_SECOND, worldWidth, worldHeight),
+                        players=clients)
+# SIMULATION_PROCESS=true runs the rules in a child process instead (see sim_process.py); simulation
+# then only mirrors its state for snapshots, the leaderboard and the minimap
+simulation_process = SimulationProcess(worldWidth, worldHeight, FOOD_CAPACITY, FOOD_TARGET,
+                                       FOOD_RESPAWN_PER_SECOND) if SIMULATION_PROCESS else None
+
+async def reset_world():
+    """New pellets, and every player back to power 1 at a random spot (Simulation.reset_players)."""
+    if simulation_process is not None:
+        await simulation_process.reset_round()
+    else:
+        simulation.food.reset()
+        simulation.reset_players()
+    if match_recorder.active:
+        match_recorder.food_reset(simulation.food)
+
+# --- Match Recording ---
+# Set RECORD_MATCHES=true to write every round to RECORDINGS_DIR; replay with tools/replay.py
+RECORD_MATCHES = os.getenv("RECORD_MATCHES", "false").lower() == "true"
+RECORDINGS_DIR = os.getenv("RECORDINGS_DIR", "/app/host_mount/recordings")
+match_recorder = MatchRecorder()
+
+def recording_path() -> str:
+    return os.path.join(RECORDINGS_DIR, f"match-{datetime.now().strftime('%Y%m%d-%H%M%S')}.mcrec")
+
+def start_round_recording():
+    if RECORD_MATCHES:
+        match_recorder.start(recording_path(), clients, simulation.food)
+
+# --- Deferred Work ---
+# Stats writes and achievement checks run in the time a tick leaves over (see tick_scheduler.py)
+pending_stats = {}  # username -> {field: increment} not yet written
+flushing_stats = set()  # flush_stats runs still writing (they can outlast their tick)
+
+def defer_task(category: str, factory, owner=None, key=None):
+    """
+    A supervised background task, started by the tick scheduler instead of
+    right away. Only per-connection work gets an owner: achievement checks
+    write to the database and must outlive the player's socket.
+    """
+    tick_scheduler.defer(category, functools.partial(task_supervisor.spawn, category, factory, owner=owner, key=key),
+                         key=key)
+
+def add_stats(username: str, **increments):
+    """Counts towards a player's pellets / kills (playerStats) or players_eaten_lifetime (users)."""
+    counts = pending_stats.setdefault(username, {})
+    for field, amount in increments.items():
+        counts[field] = counts.get(field, 0) + amount
+    tick_scheduler.defer("stats", flush_stats, key="flush")
+
+async def flush_stats():
+    """Writes the increments gathered since the last flush: one bulk write per collection, off the event loop."""
+    global pending_stats
+    batch, pending_stats = pending_stats, {}
+    player_stats = []
+    user_stats = []
+    for username, counts in batch.items():
+        increments = {field: counts[field] for field in ("pellets", "kills") if field in counts}
+        if increments:
+            player_stats.append(UpdateOne({"username": username}, {"$inc": increments}, upsert=True))
+        if "players_eaten_lifetime" in counts:
+            user_stats.append(UpdateOne({"username": username},
+                                        {"$inc": {"players_eaten_lifetime": counts["players_eaten_lifetime"]}}))
+    unwritten = ("pellets", "kills", "players_eaten_lifetime")
+    flushing_stats.add(asyncio.current_task())
+    try:
+        if player_stats:
+            await asyncio.to_thread(playerStats_collection.bulk_write, player_stats, ordered=False)
+        unwritten = ("players_eaten_lifetime",)
+        if user_stats:
+            await asyncio.to_thread(users_collection.bulk_write, user_stats, ordered=False)
+        unwritten = ()
+    finally:
+        # Put back what was not written; the flush queued by the next add_stats retries it
+        for username, counts in batch.items():
+            for field in unwritten:
+                if field in counts:
+                    merged = pending_stats.setdefault(username, {})
+                    merged[field] = merged.get(field, 0) + counts[field]
+        if batch:
+            profile_summary.invalidate(*batch)
+        flushing_stats.discard(asyncio.current_task())
+
+async def stats_flushed():
+    """Waits for stats writes still in flight, so an achievement check reads what they wrote."""
+    if flushing_stats:
+        await asyncio.wait(set(flushing_stats))
 
 # --- Helper Function to update persistent score ---
 async def update_total_score(username: str, score_increase: int):
@@ -92,59 +229,53 @@ async def update_total_score(username: str, score_increase: int):
     if score_increase <= 0: # Don't record zero or negative score changes
         return
     try:
-        leaderboard_stats_collection.update_one(
+        # Off the event loop: this runs as a deferred job inside a tick's budget
+        await asyncio.to_thread(
+            leaderboard_stats_collection.update_one,
             {"username": username},
             {"$inc": {"total_score": score_increase}},
             upsert=True
         )
         print(f"Updated total score for {username} by {score_increase}")
         # --- Update lifetime score and check achievements ---
-        users_collection.update_one(
+        await asyncio.to_thread(
+            users_collection.update_one,
             {"username": username},
             {"$inc": {"total_score_lifetime": score_increase}},
             # No upsert needed here, user must exist if we are updating score
         )
+        profile_summary.invalidate(username)
         # Check for achievements after score update
-        asyncio.create_task(check_and_grant_achievements(username))
+        defer_task("achievements", functools.partial(check_and_grant_achievements, username), key=username)
         # --- End Achievement Check ---
     except Exception as e:
         print(f"Error updating total score for {username}: {e}")
 
-# --- Helper Function for Delayed Respawn ---
-async def schedule_respawn(loser_id: str):
-    """Waits respawn_delay seconds, calculates new position, updates state, and sends respawn message."""
-    respawn_delay = 10 # Increased respawn delay
-    await asyncio.sleep(respawn_delay)
-    if loser_id in clients: # Check if client still connected
-        new_x = random.randint(0, worldWidth)  # Respawn randomly
-        new_y = random.randint(0, worldHeight)
-        clients[loser_id]["x"] = new_x
-        clients[loser_id]["y"] = new_y
-        # Note: Power was already reset to 1 earlier
-
-        loser_ws = clients[loser_id]["ws"]
-        try:
-            await loser_ws.send_json({
-                "type": "respawn",
-                "x": new_x,
-                "y": new_y
-            })
-            # Clear the respawning flag now that they have respawned
-            clients[loser_id]["is_respawning"] = False
+# --- Helper Function to record a finished round ---
+async def record_round_results(round_scores: list, winner_username: str, started: float):
+    """Stores the round and adds it to the hourly/daily/weekly leaderboard buckets (see round_results.py)."""
+    try:
+        await asyncio.to_thread(
+            round_results.record_round, round_scores, winner_username,
+            datetime.fromtimestamp(started, timezone.utc), datetime.now(timezone.utc)
+        )
+    except Exception as e:
+        print(f"Error recording round results: {e}")
 
-            # Make player invulnerable after respawn
-            clients[loser_id]["isInvulnerable"] = True
-            invulnerability_duration = 10 # Match client-side setting
-            asyncio.create_task(end_invulnerability(loser_id, invulnerability_duration))
-        except Exception as e:
-            print(f"Error sending respawn message to {loser_id}: {e}")
+# --- Helper Function for Respawns ---
+def send_respawns():
+    """Tells players whose respawn delay ran out (see Simulation.update_timers) where they are."""
+    for player_id in simulation.update_timers():
+        handle_respawn(player_id)
 
-# --- Helper Function to End Invulnerability ---
-async def end_invulnerability(player_id: str, duration: int):
-    """Waits for the duration and sets the player's invulnerability flag to False."""
-    await asyncio.sleep(duration)
-    if player_id in clients:
-        clients[player_id]["isInvulnerable"] = False
+def handle_respawn(player_id: str):
+    player = clients[player_id]
+    if "ws" in player:
+        task_supervisor.spawn("messages", functools.partial(send_message, player["ws"], {
+            "type": "respawn",
+            "x": player["x"],
+            "y": player["y"]
+        }), owner=player_id)
 
 
 OFFSET_SECONDS = -4 * 3600
@@ -157,21 +288,11 @@ def adjusted_localtime_converter(timestamp):
     return time.localtime(adjusted_timestamp)
 
 LOG_FILE = Path("/app/host_mount/request_logs.log") # Path in container
-LOG_FILE.parent.mkdir(exist_ok=True, parents=True)
 
 # Get the specific logger instance
 request_logger = logging.getLogger("request_logger")
 request_logger.setLevel(logging.INFO)
 
-# Prevent adding multiple handlers
-if not request_logger.handlers:
-    file_handler = logging.FileHandler(LOG_FILE)
-    log_format = '%(asctime)s - %(client_ip)s - %(method)s - %(path)s - %(message)s'
-    formatter = logging.Formatter(log_format)
-    # Uncomment the next line if using the custom time converter
-    # formatter.converter = adjusted_localtime_converter
-    file_handler.setFormatter(formatter)
-    request_logger.addHandler(file_handler)
 
 SENSITIVE_PATHS = ["/api/login", "/api/register"]
 MAX_BODY_LOG_SIZE = 2048
@@ -221,16 +342,40 @@ error_logger = logging.getLogger("error_logger")
 error_logger.setLevel(logging.ERROR)
 loginReg_logger = logging.getLogger("login_reg_logger")
 loginReg_logger.setLevel(logging.INFO)
-if not error_logger.handlers:#honestly not sure if this line is needed but the other one has it and I should try to be consistent
-    error_handler = logging.FileHandler(ERROR_FILE)
-    error_handler.setLevel(logging.ERROR)
-    error_handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s\n"))
-    error_logger.addHandler(error_handler)
-if not loginReg_logger.handlers:
-    login_handler = logging.FileHandler(REG_LOGIN_FILE)
-    login_handler.setLevel(logging.INFO)
-    login_handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s\n"))
-    loginReg_logger.addHandler(login_handler)
+
+STALL_FILE = Path("/app/host_mount/stall_logs.log")
+stall_logger = logging.getLogger("stall_logger")
+stall_logger.setLevel(logging.WARNING)
+
+def configure_logging():
+    """Creates the log directory and attaches the file handlers (called from lifespan, not at import)."""
+    LOG_FILE.parent.mkdir(exist_ok=True, parents=True)
+    # Prevent adding multiple handlers
+    if not request_logger.handlers:
+        file_handler = logging.FileHandler(LOG_FILE)
+        log_format = '%(asctime)s - %(client_ip)s - %(method)s - %(path)s - %(message)s'
+        formatter = logging.Formatter(log_format)
+        # Uncomment the next line if using the custom time converter
+        # formatter.converter = adjusted_localtime_converter
+        file_handler.setFormatter(formatter)
+        request_logger.addHandler(file_handler)
+    if not error_logger.handlers:
+        error_handler = logging.FileHandler(ERROR_FILE)
+        error_handler.setLevel(logging.ERROR)
+        error_handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s\n"))
+        error_logger.addHandler(error_handler)
+    if not loginReg_logger.handlers:
+        login_handler = logging.FileHandler(REG_LOGIN_FILE)
+        login_handler.setLevel(logging.INFO)
+        login_handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s\n"))
+        loginReg_logger.addHandler(login_handler)
+    if not stall_logger.handlers:
+        stall_handler = logging.FileHandler(STALL_FILE)
+        stall_handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s\n"))
+        stall_logger.addHandler(stall_handler)
+
+# Reports any callback that keeps the event loop busy for longer than STALL_THRESHOLD_MS
+stall_watchdog = StallWatchdog(threshold=float(os.getenv("STALL_THRESHOLD_MS", "100")) / 1000, logger=stall_logger)
 
 @app.middleware("http")
 async def log_requests_and_responses(request: Request, call_next):
@@ -346,76 +491,185 @@ async def log_requests_and_responses(request: Request, call_next):
         combo = err_s + "\n" + tbs
         error_logger.error(combo)
 
+# Added after the logging middleware so it runs before it: over-limit requests get a 429
+# before the session lookup above, the route's database work or bcrypt (see rate_limit.py)
+app.add_middleware(SpanMiddleware, name="mw_log_requests")
+rate_limits = RateLimits()
+app.add_middleware(RateLimitMiddleware, limits=rate_limits)
+# Charges each request's MongoDB commands to its route (see db_profiler.py)
+app.add_middleware(db_profiler.DbProfilerMiddleware)
+# Outermost: samples requests for tracing and adds the Server-Timing header
+app.add_middleware(TracingMiddleware)
+
 
 broadcast_task = None
 broadcast_stop_event = asyncio.Event()
+MINIMAP_HZ = 2
+MINIMAP_EVERY_TICKS = 30 // MINIMAP_HZ
 time_remaining = 0
+snapshot_tick = 0  # Incremented every broadcast_state call
 
 
 def start_broadcast_loop():
     global broadcast_task, broadcast_stop_event
     if broadcast_task is None or broadcast_task.done():
         broadcast_stop_event.clear()
+        if simulation_process is not None:
+            simulation_process.start(admission.max_per_room)  # detached players keep their slot too
         broadcast_task = asyncio.create_task(broadcast_loop())
 
 def stop_broadcast_loop():
     broadcast_stop_event.set()
+    if simulation_process is not None:
+        simulation_process.stop()
+
+async def broadcast_food_spawn(spawned_food: list):
+    """One batched event per tick: flat [id, x, y, ...] triples."""
+    if match_recorder.active:
+        match_recorder.food(spawned_food)
+    await broadcast_message({
+        "type": "food_spawn",
+        "food": spawned_food
+    })
+
+async def apply_simulation_frames(frames: list):
+    """
+    Mirrors the simulation process into clients and simulation.food and
+    handles the events of every frame. Player state only comes from the
+    newest frame: the process has only two banks, so an older frame's bank
+    may already hold a later tick.
+    """
+    newest = frames[-1]
+    # Read the whole bank before awaiting anything: the process overwrites it two ticks later
+    players = simulation_process.read_players(newest["bank"], newest["tick"])
+    for player_id, x, y, power, kills, flags in players or ():  # None: fell behind, the next frame catches up
+        player = clients.get(player_id)
+        if player is None:
+            continue
+        player["x"] = x
+        player["y"] = y
+        player["round_kills"] = kills
+        player["is_respawning"] = bool(flags & RESPAWNING)
+        player["isInvulnerable"] = bool(flags & INVULNERABLE)
+        if player["power"] != power:
+            simulation.set_power(player_id, power)
+    for frame in frames:
+        await apply_simulation_frame(frame)
+
+async def apply_simulation_frame(frame: dict):
+    """Applies the pellet changes and events of one tick of the simulation process."""
+    food = simulation.food
+    if "food_reset" in frame:
+        food.place(frame["food_reset"], reset=True)
+        simulation_process.reset_applied()
+
+    for slot, food_ids in frame["collected"]:
+        for food_id in food_ids:
+            food.remove(food_id)
+        player_id = simulation_process.player(slot)
+        if player_id in clients:
+            check_pickup_achievements(player_id)
+            await handle_pickup(player_id, food_ids)
+    if "spawned" in frame:
+        food.place(frame["spawned"])
+        await broadcast_food_spawn(frame["spawned"])
+    for winner_slot, loser_slot in frame["kills"]:
+        winner_id = simulation_process.player(winner_slot)
+        loser_id = simulation_process.player(loser_slot)
+        if winner_id in clients and loser_id in clients:
+            handle_kill(winner_id, loser_id)
+    for slot in frame["respawned"]:
+        player_id = simulation_process.player(slot)
+        if player_id in clients:
+            handle_respawn(player_id)
 
 async def broadcast_loop():
     try:
+        last_tick = time.monotonic()
         while not broadcast_stop_event.is_set():
-            await broadcast_state()
-            await asyncio.sleep(1 / 30)  # 30 times per second
+            if simulation_process is not None:
+                # Paced by the simulation process: wait for its next tick
+                frames = await simulation_process.next_frames()
+                if not frames:
+                    break # Stopped
+            db_profiler.begin("tick")
+            now = time.monotonic()
+            with TICK_SECONDS.time():
+                if simulation_process is not None:
+                    await apply_simulation_frames(frames) # More than one if this loop fell behind
+                else:
+                    send_respawns()
+                    spawned = simulation.food.replenish(now - last_tick)
+                    last_tick = now
+                    if spawned:
+                        await broadcast_food_spawn(simulation.food.encode_spawns(spawned))
+                with BROADCAST_SECONDS.time():
+                    await broadcast_state()
+                if snapshot_tick % MINIMAP_EVERY_TICKS == 0:
+                    # Same small grid for everyone, however many players there are
+                    await broadcast_message(simulation.build_minimap())
+                if match_recorder.active:
+                    match_recorder.tick(snapshot_tick, time_remaining, clients)
+                if snapshot_tick % 30 == 0:
+                    # Players not resumed within the grace period leave for good
+                    for player_id in resume_registry.expired():
+                        await finalize_player(player_id)
+            # Deferred work (stats writes, achievement checks) gets what is left of the tick's budget
+            await tick_scheduler.run(now)
+            if simulation_process is None:
+                # 30 times per second, counted from the start of the tick
+                await asyncio.sleep(max(0.0, now + 1 / 30 - time.monotonic()))
     except asyncio.CancelledError:
         pass  # Task was cancelled
 
+def build_state(current_clients_items: list) -> dict:
+    """Builds the "players" snapshot sent to every client each tick."""
+    return simulation.build_state(current_clients_items, snapshot_tick, time_remaining, round(time.time() * 1000))
+
 async def broadcast_state():
     # --- Your original broadcast logic ---
-    global time_remaining, game_start_time, food_instances, active_usernames
+    global time_remaining, game_start_time, active_usernames, snapshot_tick
+    snapshot_tick += 1
+    simulation.food.stamp = snapshot_tick  # Pellet changes from now on are resent to clients resuming from here
     current_clients_items = list(clients.items())  # Copy items to prevent modification issues
-    state = {
-        "type": "players",
-        "players": {
-            pid: {
-                "x": info["x"],
-                "y": info["y"],
-                "power": info["power"],
-                "username": info["username"],
-                "is_respawning": info.get("is_respawning", False),
-                "isInvulnerable": info.get("isInvulnerable", False)
-            }
-            for pid, info in current_clients_items
-            if "ws" in info
-        },
-        "time_remaining": time_remaining,
-        "food": food_instances
-    }
+    encoded_state = None
 
     clients_to_remove = []
     for pid, client in current_clients_items:
-        try:
-            if "ws" in client:
-                await client["ws"].send_json(state)
-        except (WebSocketDisconnect, RuntimeError) as e:
-            print(f"Client {pid} disconnected during broadcast or send error: {e}")
-            clients_to_remove.append(pid)
-
-    for pid in clients_to_remove:
-        if pid in clients:
-            disconnected_client = clients.pop(pid)
-            disconnected_username = disconnected_client.get("username")
-            disconnected_score = disconnected_client.get("power", 0)
-            if disconnected_username:
-                active_usernames.discard(disconnected_username)
-                await update_total_score(disconnected_username, disconnected_score)
+        link = client.get("link")
+        if link is None or "ws" not in client:
+            continue
+        if link.failed:
+            # A previous snapshot send failed, the client is gone
+            clients_to_remove.append((pid, client["ws"]))
+            continue
+        if not link.due(snapshot_tick):
+            continue  # Client is on a lower snapshot rate
+        if encoded_state is None:
+            encoded_state = encode_message(build_state(current_clients_items))  # Encode once, not once per client
+        # Sends run on the link's own task, so one slow client does not hold up the others
+        link.offer(snapshot_tick, client["ws"], "players", encoded_state)
+
+    # Spectators share one copy of the same snapshot at a lower rate
+    if spectator_hub.snapshot_due(snapshot_tick):
+        if encoded_state is None:
+            encoded_state = encode_message(build_state(current_clients_items))
+        spectator_hub.publish("players", encoded_state)
+    elif spectator_hub.food_due(snapshot_tick):
+        spectator_hub.publish_food(simulation.food)
+
+    for pid, ws in clients_to_remove:
+        await drop_connection(pid, ws)
 
 async def broadcast_message(message: dict):
     """Sends a JSON message to all currently connected clients."""
     # Create a copy of client websockets to iterate over, avoiding modification issues
     current_websockets = [info["ws"] for info in clients.values() if "ws" in info]
+    kind = message.get("type", "")
+    encoded = encode_message(message)
     for ws in current_websockets:
         try:
-            await ws.send_json(message)
+            await send_encoded(ws, kind, encoded)
         except (WebSocketDisconnect, RuntimeError) as e:
             # Handle potential errors silently during broadcast, main loop handles cleanup
             print(f"Error during broadcast to a client: {e}")
@@ -436,56 +690,356 @@ class PlayerStatsResponse(BaseModel):
     #    pellets=stats["pellets"],
 
 
+def collect_food(player_id: str) -> list:
+    """Picks up every pellet within reach of the player, adding power. Returns the collected ids."""
+    food_to_remove = simulation.collect_food(player_id)
+    if food_to_remove:
+        check_pickup_achievements(player_id)
+    return food_to_remove
+
+def check_pickup_achievements(player_id: str):
+    # --- Check score achievements after power increase ---
+    current_username = clients[player_id].get("username")
+    if current_username:
+        defer_task("score_achievements", functools.partial(
+            check_in_game_score_achievements, current_username, clients[player_id]["power"]),
+            key=current_username)
+    # --- End Achievement Check --
+
+async def handle_pickup(player_id: str, food_to_remove: list):
+    """Pellets a player just collected: their stats and a food_update to everyone."""
+    current_username = clients[player_id].get("username")
+    if current_username:
+        add_stats(current_username, pellets=1)  # One per pickup, however many pellets it took
+
+    # Send food update to all clients
+    await broadcast_message({
+        "type": "food_update",
+        "removed_food": food_to_remove
+    })
+
+def resolve_collisions():
+    """Runs a collision pass and handles what follows from each kill: messages, stats and achievements."""
+    for winner_id, loser_id in simulation.resolve_collisions():
+        handle_kill(winner_id, loser_id)
+
+def handle_kill(winner_id: str, loser_id: str):
+    winner = clients[winner_id]
+    loser = clients[loser_id]
+
+    # Send "eaten" message to loser; Simulation.update_timers respawns them after the delay
+    try:
+        loser_ws = loser["ws"]
+        task_supervisor.spawn("messages", functools.partial(send_message, loser_ws, {"type": "eaten"}),
+                              owner=loser_id)
+    except Exception as e:
+        print(f"Error sending 'eaten' message to {loser_id}: {e}")
+
+    # --- Check winner's score achievements after power increase ---
+    winner_username = winner.get("username")
+    if not winner_username:
+        return # Guests have no stats
+
+    defer_task("score_achievements", functools.partial(
+        check_in_game_score_achievements, winner_username, winner["power"]),
+        key=winner_username)
+    # --- End Score Achievement Check ---
+
+    # --- Update winner's kills and eaten count & check achievements ---
+    add_stats(winner_username, kills=1, players_eaten_lifetime=1)
+    defer_task("achievements", functools.partial(check_and_grant_achievements, winner_username),
+               key=winner_username)
+    # --- End Eaten Count Update ---
+
+
+# --- Admission Control ---
+# Player caps, a wait queue when full and a per-IP connect rate limit for /ws/game (see admission.py)
+admission = AdmissionController()
+
+async def reject_connection(websocket: WebSocket, reason: str):
+    """Tells a client it was not let in (full or connecting too fast) and closes the socket."""
+    try:
+        if websocket.client_state == WebSocketState.CONNECTING:
+            await websocket.accept() # Accept briefly to send the message
+        await send_message(websocket, admission.rejection(reason))
+        await websocket.close(code=1013 if reason == "full" else status.WS_1008_POLICY_VIOLATION,
+                              reason="Server full" if reason == "full" else "Too many connection attempts")
+    except Exception:
+        pass # Client already gone
+
+# --- Spectators ---
+# Watchers get a shared, pre-encoded low-rate snapshot stream and are not players (see spectators.py)
+spectator_hub = SpectatorHub()
+
+@app.websocket("/ws/spectate")
+async def spectate_ws(websocket: WebSocket):
+    client_ip = websocket.headers.get("x-real-ip", websocket.client.host if websocket.client else "unknown")
+    if not admission.allow_connect(client_ip):
+        await reject_connection(websocket, "rate")
+        return
+    if not spectator_hub.join():
+        await reject_connection(websocket, "full")
+        return
+    stream_task = None
+    try:
+        await websocket.accept()
+        time_remaining = max(0, game_duration - (time.time() - game_start_time)) if game_start_time else game_duration
+        await send_message(websocket, {
+            "type": "spectate",
+            "time_remaining": time_remaining,
+            "food": simulation.food.to_list(),
+            "leaderboard": simulation.leaderboard(),
+            "tick": snapshot_tick,
+            "server_time": round(time.time() * 1000)
+        })
+        stream_task = asyncio.create_task(spectator_hub.stream(websocket))
+        # Spectators send nothing that matters; reading only tells us when they leave
+        receiver = asyncio.create_task(websocket.receive())
+        while True:
+            done, _ = await asyncio.wait({stream_task, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if stream_task in done:
+                break # Send failed, the socket is gone
+            if receiver.result()["type"] == "websocket.disconnect":
+                break
+            receiver = asyncio.create_task(websocket.receive())
+        receiver.cancel()
+    except Exception as e:
+        print(f"Spectator connection error: {e}")
+    finally:
+        if stream_task is not None:
+            stream_task.cancel()
+        spectator_hub.leave()
+
+# --- Session Resume ---
+# A dropped player is kept (hidden, out of collisions) for RESUME_GRACE_SECONDS; see resume.py
+resume_registry = ResumeRegistry()
+
+async def drop_connection(player_id: str, websocket: WebSocket, resumable: bool = True):
+    """A player's socket closed: keep them for a resume, or remove them if they are not coming back."""
+    client = clients.get(player_id)
+    if client is None or client.get("ws") is not websocket:
+        return # Already dropped, or resumed on a newer socket
+    if not resumable or resume_registry.grace <= 0 or player_id not in resume_registry.tokens:
+        await finalize_player(player_id)
+        return
+    for key in ("ws", "ingest", "link"):
+        client.pop(key, None)
+    simulation.detach(player_id)
+    if simulation_process is not None:
+        simulation_process.set_detached(player_id, True)
+    resume_registry.detach(player_id)
+    print(f"Player {player_id} disconnected, keeping their slot for {resume_registry.grace:g} seconds.")
+    # Hidden from snapshots while away; snapshots bring them back if they resume
+    await broadcast_message({"type": "remove", "id": player_id})
+
+async def finalize_player(player_id: str):
+    """Removes a player for good: frees their slot, saves their score and tells everyone else."""
+    resume_registry.discard(player_id)
+    task_supervisor.cancel_owner(player_id)
+    disconnected_client = simulation.remove_player(player_id)
+    if disconnected_client is None:
+        return
+    release = functools.partial(admission.release, ROOM) if disconnected_client.get("holds_slot") else None
+    if simulation_process is not None:
+        # Nobody is let in until the process has freed the player's slot for them
+        simulation_process.leave(player_id, on_freed=release)
+    elif release is not None:
+        release()
+    if match_recorder.active:
+        match_recorder.leave(player_id)
+    disconnected_username = disconnected_client.get("username")
+    if disconnected_username:
+        active_usernames.discard(disconnected_username)
+        # --- Update score on disconnect (when the tick scheduler has time) ---
+        tick_scheduler.defer("scores", functools.partial(
+            update_total_score, disconnected_username, disconnected_client.get("power", 0)))
+        # --- End score update ---
+    print(f"Player {player_id} disconnected.")
+    # Broadcast remove message to all remaining clients
+    await broadcast_message({
+        "type": "remove",
+        "id": player_id
+    })
+
+async def drop_detached_player(username: str) -> bool:
+    """A user connecting afresh (e.g. after a reload) replaces their own dropped player. False if none."""
+    for player_id, info in list(clients.items()):
+        if info.get("detached") and info.get("username") == username:
+            await finalize_player(player_id)
+            return True
+    return False
+
+def build_resume_message(player_id: str, last_tick) -> dict:
+    """The "resumed" message: the player's own state, who is here, and pellets changed since last_tick."""
+    player = clients[player_id]
+    message = {
+        "type": "resumed",
+        "id": player_id,
+        "resume_token": resume_registry.issue(player_id),
+        "time_remaining": time_remaining,
+        "leaderboard": simulation.leaderboard(),
+        "tick": snapshot_tick,
+        "server_time": round(time.time() * 1000),
+        "x": player["x"],
+        "y": player["y"],
+        "power": player["power"],
+        "is_respawning": player.get("is_respawning", False),
+        "players": [pid for pid, info in clients.items() if "ws" in info and pid != player_id],
+    }
+    try:
+        since = int(last_tick) - RESUME_SLACK_TICKS
+    except (TypeError, ValueError):
+        since = -1
+    changes = simulation.food.changes_since(since) if 0 <= since <= snapshot_tick else None
+    if changes is None:
+        message["food"] = simulation.food.to_list() # Round changed meanwhile: full list, as in "id"
+    else:
+        message["food_removed"], message["food_spawned"] = changes
+    return message
+
+# --- Memory diagnostics ---
+# What the server keeps around, with estimated sizes (see memory_diag.py and /api/admin/memory)
+memory_diagnostics.account("players", lambda: (len(clients), clients))
+memory_diagnostics.account("active_usernames", lambda: (len(active_usernames), active_usernames))
+memory_diagnostics.account("pellets", lambda: (simulation.food.count, simulation.food))
+memory_diagnostics.account("asyncio_tasks", lambda: (
+    len(asyncio.all_tasks()), sum(sys.getsizeof(task) for task in asyncio.all_tasks())))
+# Sends in progress and the frames they carry; clients share one snapshot string, so the bytes are an upper bound
+memory_diagnostics.account("sends_in_flight", lambda: (
+    sum(pending_sends.values()), sum(info["link"].in_flight_bytes for info in list(clients.values()) if "link" in info)))
+memory_diagnostics.account("profile_cache", lambda: (profile_summary.stats()["size"], profile_summary._cache))
+memory_diagnostics.account("rate_limit_keys", lambda: (
+    sum(len(limiter.entries) for limiters in rate_limits.limiters.values() for limiter in limiters.values()),
+    rate_limits))
+memory_diagnostics.account("admission_ips", lambda: (len(admission.ip_buckets), admission.ip_buckets))
+memory_diagnostics.account("traces", lambda: (len(trace_buffer.traces), trace_buffer.traces))
+memory_diagnostics.account("db_profile", lambda: (
+    len(db_profiler.db_profiler.commands) + len(db_profiler.db_profiler.origins) + len(db_profiler.db_profiler.findings),
+    [db_profiler.db_profiler.commands, db_profiler.db_profiler.origins, db_profiler.db_profiler.findings,
+     db_profiler.db_profiler.slow_ops]))
+memory_diagnostics.account("spectator_frame", lambda: (spectator_hub.spectators, spectator_hub.frame))
+memory_diagnostics.account("background_tasks", lambda: (
+    task_supervisor.live() + sum(len(group.queue) for group in task_supervisor.categories.values()),
+    [list(group.queue) for group in task_supervisor.categories.values()]))
+memory_diagnostics.account("deferred_jobs", lambda: (
+    len(tick_scheduler.heap), [tick_scheduler.heap, pending_stats]))
+memory_diagnostics.account("resume_tokens", lambda: (
+    len(resume_registry.detached), [resume_registry.tokens, resume_registry.detached]))
+memory_diagnostics.account("stall_sites", lambda: (len(stall_watchdog.sites), stall_watchdog.sites))
+
 @app.websocket("/ws/game")
 async def game_ws(websocket: WebSocket):
+    admitted = False
+    player_id = None
+    close_code = None
+    db_profiler.begin("ws", "connect")  # DB work below is charged to the game event that caused it
     try:
-        global game_start_time, food_instances, active_usernames, time_remaining
-
-        # --- Check for existing connection for logged-in users ---
-        session_token = websocket.cookies.get("session_token")
-        username = None
-        if session_token:
-            username = await get_current_user(session_token)
-            if username in active_usernames:
-                # User is already connected, reject this new connection
-                await websocket.accept() # Accept briefly to send the message
-                await websocket.send_json({"type": "error", "message": "Already connected in another tab."})
-                await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="User already connected")
-                print(f"Rejected connection for user {username}: already connected.")
-                return # Stop further execution for this connection
-        # --- End check ---
-
-        # Start the game timer if this is the first connection
-        if game_start_time is None and len(clients) == 0:
-            game_start_time = time.time()
-            generate_food()  # Generate initial food
-            start_broadcast_loop()
-        await websocket.accept()
-        player_id = str(uuid4())
-        if username:
-            active_usernames.add(username)
-        clients[player_id] = {
-            "ws": websocket,
-            "x": worldWidth / 2,  # Spawn in center
-            "y": worldHeight / 2,  # Spawn in center
-            "power": 1,
-            "username": username,
-            "is_respawning": False,
-            "isInvulnerable": True # Player starts invulnerable
-        }
-
-        # Start invulnerability timer for new player
-        invulnerability_duration = 10 # Match client-side setting
-        asyncio.create_task(end_invulnerability(player_id, invulnerability_duration))
+        global game_start_time, active_usernames, time_remaining
+
+        # --- Per-IP connect rate limit, before any database work ---
+        client_ip = websocket.headers.get("x-real-ip", websocket.client.host if websocket.client else "unknown")
+        if not admission.allow_connect(client_ip):
+            print(f"Rejected connection from {client_ip}: connecting too fast.")
+            await reject_connection(websocket, "rate")
+            return
+
+        # --- Resume a player whose connection dropped moments ago (see resume.py) ---
+        player_id = None
+        resume_token = websocket.query_params.get("resume")
+        if resume_token:
+            player_id = resume_registry.take(resume_token)
+            if player_id is not None and not clients.get(player_id, {}).get("detached"):
+                player_id = None # Removed in the meantime
+        resumed = player_id is not None
+        if resumed:
+            # No session lookup and no admission: the player kept their slot
+            username = clients[player_id]["username"]
+            await websocket.accept()
+            clients[player_id]["ws"] = websocket
+            simulation.attach(player_id)
+            if simulation_process is not None:
+                simulation_process.set_detached(player_id, False)
+        else:
+            # --- Check for existing connection for logged-in users ---
+            session_token = websocket.cookies.get("session_token")
+            username = None
+            if session_token:
+                username = await get_current_user(session_token)
+                if username in active_usernames and not await drop_detached_player(username):
+                    # User is already connected, reject this new connection
+                    await websocket.accept() # Accept briefly to send the message
+                    await send_message(websocket, {"type": "error", "message": "Already connected in another tab."})
+                    await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="User already connected")
+                    print(f"Rejected connection for user {username}: already connected.")
+                    return # Stop further execution for this connection
+            # --- End check ---
+
+            # --- Wait for a free player slot, or turn the client away ---
+            if not admission.try_admit(ROOM):
+                await websocket.accept()
+
+                async def send_queue_position(position: int):
+                    await send_message(websocket, {"type": "queued", "position": position})
+
+                if not await admission.admit(ROOM, send_queue_position):
+                    print(f"Rejected connection from {client_ip}: server full.")
+                    await reject_connection(websocket, "full")
+                    return
+            admitted = True
+
+            # Start the game timer if this is the first connection
+            if game_start_time is None and len(clients) == 0:
+                game_start_time = time.time()
+                start_broadcast_loop()
+                await reset_world()  # Generate initial food
+                start_round_recording()
+            if websocket.client_state == WebSocketState.CONNECTING: # Queued clients were accepted already
+                await websocket.accept()
+            player_id = str(uuid4())
+            if username:
+                active_usernames.add(username)
+            clients[player_id] = {
+                "ws": websocket,
+                "x": worldWidth / 2,  # Spawn in center
+                "y": worldHeight / 2,  # Spawn in center
+                "power": 1,
+                "username": username,
+                "is_respawning": False,
+                "isInvulnerable": True, # Player starts invulnerable
+                "holds_slot": True # Admission slot is released when the player is removed (finalize_player)
+            }
+            admitted = False
+            if match_recorder.active:
+                match_recorder.join(player_id, clients[player_id])
+
+            # Rank the new player and start their invulnerability timer
+            simulation.join(player_id)
+            if simulation_process is not None:
+                simulation_process.join(player_id)
+
+        # Inputs are read by a separate task, rate limited and coalesced to one per tick
+        ingestor = InputIngestor(websocket, width=worldWidth, height=worldHeight)
+        clients[player_id]["ingest"] = ingestor
+        # Snapshot rate adapts to how fast this client's sends complete
+        link = ClientLink()
+        clients[player_id]["link"] = link
 
         # Send back the ID, game time remaining, and initial food positions
         time_remaining = max(0, game_duration - (time.time() - game_start_time)) if game_start_time else game_duration
-        await websocket.send_json({
-            "type": "id",
-            "id": player_id,
-            "time_remaining": time_remaining,
-            "food": food_instances
-        })
+        if resumed:
+            await send_message(websocket, build_resume_message(player_id, websocket.query_params.get("tick")))
+        else:
+            await send_message(websocket, {
+                "type": "id",
+                "id": player_id,
+                "time_remaining": time_remaining,
+                "food": simulation.food.to_list(),
+                "leaderboard": simulation.leaderboard(),
+                "tick": snapshot_tick,
+                "server_time": round(time.time() * 1000),
+                "resume_token": resume_registry.issue(player_id)
+            })
+        ingestor.start()
 
         try:
             while True:
@@ -494,10 +1048,14 @@ async def game_ws(websocket: WebSocket):
                 time_remaining = max(0, game_duration - (current_time - game_start_time)) if game_start_time else game_duration
 
                 if time_remaining <= 0 and game_start_time is not None:
+                    db_profiler.begin("ws", "round_end")
                     # Game over - determine winner
                     winner_username = "Guest"
-                    if clients: # Check if any clients are left to determine a winner
-                        winner = max(clients.items(), key=lambda x: x[1]["power"])
+                    # Players whose socket dropped (waiting for a resume) cannot win: they are hidden from
+                    # everyone, would not see the result and have no loop of their own to record the win
+                    connected = [item for item in clients.items() if item[1].get("ws") is not None]
+                    if connected: # Check if any clients are left to determine a winner
+                        winner = max(connected, key=lambda x: x[1]["power"])
                         winner_username = winner[1].get("username") or "Guest"
 
                         if winner_username == username:
@@ -509,14 +1067,18 @@ async def game_ws(websocket: WebSocket):
                                 {"$set": {"gamesWon": stats["gamesWon"] + 1}},  # Update the selected field
                                 upsert=True  # Create a new document if none exists
                             )
+                            profile_summary.invalidate(winner_username)
 
                     winner_display_duration = 5 # How long to show winner name
                     reset_countdown_duration = 10 # How long the "New game starting" countdown lasts
 
                     # Send game over message to all clients
-                    for client in clients.values():
+                    for client in list(clients.values()):
+                        ws = client.get("ws")
+                        if ws is None:
+                            continue # Detached; a resume sends them the current round
                         try:
-                            await client["ws"].send_json({
+                            await send_message(ws, {
                                 "type": "game_over",
                                 "winner": winner_username
                             })
@@ -529,6 +1091,8 @@ async def game_ws(websocket: WebSocket):
                         if pid in clients: # Check they didn't disconnect right now
                             clients[pid]["isInvulnerable"] = True
                             clients[pid]["is_respawning"] = False # Ensure this is false too
+                    if simulation_process is not None:
+                        simulation_process.protect_all() # The mirror above is overwritten every tick
                     # --- End Invulnerability Set ---
 
                     # Wait briefly for winner display
@@ -547,6 +1111,7 @@ async def game_ws(websocket: WebSocket):
                     # --- Update persistent scores for all remaining players ---
                     update_tasks = []
                     games_played_updates = [] # Track users whose games_played needs update
+                    round_scores = [] # (username, score, kills) for the windowed leaderboards
                     for client_id, client_info in list(clients.items()): # Iterate over a copy
                         if client_id in clients: # Check if still connected
                             username = client_info.get("username")
@@ -554,204 +1119,302 @@ async def game_ws(websocket: WebSocket):
                             if username:
                                 update_tasks.append(update_total_score(username, score))
                                 games_played_updates.append(username)
+                                round_scores.append((username, score, client_info.get("round_kills", 0)))
                     if update_tasks:
                         await asyncio.gather(*update_tasks)
+                    if round_scores:
+                        await record_round_results(round_scores, winner_username, game_start_time)
                     # --- Update games played count & check achievements ---
                     if games_played_updates:
                         users_collection.update_many(
                             {"username": {"$in": games_played_updates}},
                             {"$inc": {"games_played": 1}}
                         )
+                        profile_summary.invalidate(*games_played_updates)
                         # Check achievements for all players who finished the game
                         achievement_check_tasks = [check_and_grant_achievements(uname) for uname in games_played_updates]
                         await asyncio.gather(*achievement_check_tasks)
                     # --- End Games Played Update ---
                     # Reset game state
                     game_start_time = time.time()  # Reset timer
-                    generate_food()  # Generate new food
-                    invulnerability_duration = 10 # Duration for post-reset invulnerability
-                    for client_id in clients:
-                        clients[client_id]["power"] = 1  # Reset all powers to 1
-                        clients[client_id]["x"] = random.randint(0, worldWidth)  # Random respawn
-                        clients[client_id]["y"] = random.randint(0, worldHeight)
-                        clients[client_id]["is_respawning"] = False # Ensure respawn flag is clear
-                        clients[client_id]["isInvulnerable"] = True # Grant invulnerability
-                        # Start timer to end invulnerability
-                        asyncio.create_task(end_invulnerability(client_id, invulnerability_duration))
+                    # Generate new food; reset all powers to 1, random respawn, invulnerable for a while
+                    await reset_world()
+                    start_round_recording()
 
                     # Send reset message to all clients
-                    for client in clients.values():
+                    for client in list(clients.values()):
+                        ws = client.get("ws")
+                        if ws is None:
+                            continue # Detached; a resume sends them the current round
                         try:
-                            await client["ws"].send_json({
+                            await send_message(ws, {
                                 "type": "game_reset",
                                 "time_remaining": game_duration,
-                                "food": food_instances
+                                "food": simulation.food.to_list()
                             })
                         except:
                             pass
 
-                data = await websocket.receive_json()
+                data = await ingestor.next_input()
+                if clients.get(player_id, {}).get("ws") is not websocket:
+                    break # Dropped by broadcast_state after a failed send (and maybe resumed elsewhere)
+                db_profiler.begin("ws", "input")
                 clients[player_id]["x"] = data["x"]
                 clients[player_id]["y"] = data["y"]
+                if "seq" in data:
+                    clients[player_id]["input_seq"] = data["seq"]  # Acknowledged in the next snapshot
+                if match_recorder.active:
+                    match_recorder.input(player_id, data)
+
+                if simulation_process is not None:
+                    # Pickups and collisions happen in the simulation process; broadcast_loop handles them
+                    simulation_process.move(player_id, data["x"], data["y"])
+                    continue
 
                 # Check for food collisions
-                player_x = clients[player_id]["x"]
-                player_y = clients[player_id]["y"]
-                food_to_remove = []
-
-                for food in food_instances:
-                    distance = ((player_x - food["x"]) ** 2 + (player_y - food["y"]) ** 2) ** 0.5
-                    if distance < 50:  # Increased from 30 to 50 for food collection radius
-                        food_to_remove.append(food)
-                        clients[player_id]["power"] += 1
-                        # --- Check score achievements after power increase ---
-                        current_username = clients[player_id].get("username")
-                        current_power = clients[player_id]["power"]
-                        if current_username:
-                            asyncio.create_task(check_in_game_score_achievements(current_username, current_power))
-                        # --- End Achievement Check --
-                # Remove collected food and notify all clients
+                food_to_remove = collect_food(player_id)
+                # Notify all clients about the collected food
                 if food_to_remove:
+                    await handle_pickup(player_id, food_to_remove)
 
-                    stats = playerStats_collection.find_one({"username": username})
-
-                    playerStats_collection.update_one(
-                        {"username": username},  # Match by username
-                        {"$set": {"pellets": stats["pellets"] + 1}},  # Update the selected field
-                        upsert=True  # Create a new document if none exists
-                    )
+                resolve_collisions()
 
-                    for food in food_to_remove:
-                        food_instances.remove(food)
-                    # Send food update to all clients
-                    for client in clients.values():
-                        try:
-                            await client["ws"].send_json({
-                                "type": "food_update",
-                                "removed_food": [f["id"] for f in food_to_remove]
-                            })
-                        except:
-                            pass
-
-                # Check for player collisions and update power
-                # Store players to process collisions for to avoid modifying during iteration
-                current_player_ids = list(clients.keys())
-                processed_collisions = set() # Avoid double checks
-
-                for p1_id in current_player_ids:
-                    if p1_id not in clients or p1_id in processed_collisions: # Check if player still exists
-                        continue
-
-                    for p2_id in current_player_ids:
-                        if p1_id == p2_id or p2_id not in clients or p2_id in processed_collisions: # Check if other player exists and not self
-                            continue
-
-                        # --- Check if either player is currently respawning ---
-                        if clients[p1_id].get("is_respawning", False) or clients[p2_id].get("is_respawning", False):
-                            continue # Skip collision check if one is respawning
-
-                        # --- Check if either player is invulnerable ---
-                        if clients[p1_id].get("isInvulnerable", False) or clients[p2_id].get("isInvulnerable", False):
-                            continue # Skip collision check if one is invulnerable
-                        # --- End Checks ---
-
-                        p1 = clients[p1_id]
-                        p2 = clients[p2_id]
-
-                        distance = ((p1["x"] - p2["x"]) ** 2 + (p1["y"] - p2["y"]) ** 2) ** 0.5
-
-                        if distance < 75: # Collision detected
-                            processed_collisions.add(p1_id)
-                            processed_collisions.add(p2_id)
-
-                            winner_id, loser_id = None, None
-                            p1_power = p1["power"]
-                            p2_power = p2["power"]
-
-                            if p1_power > p2_power:
-                                winner_id, loser_id = p1_id, p2_id
-                            elif p2_power > p1_power:
-                                winner_id, loser_id = p2_id, p1_id
-                            else: # Tie
-                                chosen_winner = random.choice([p1_id, p2_id])
-                                if chosen_winner == p1_id:
-                                    winner_id, loser_id = p1_id, p2_id
-                                else:
-                                    winner_id, loser_id = p2_id, p1_id
-
-                            # Process the win/loss if winner and loser are determined
-                            if winner_id and loser_id and winner_id in clients and loser_id in clients: # Double check clients exist
-                                winner = clients[winner_id]
-                                loser = clients[loser_id]
-
-                                # Add power (only add if loser is not already at 1, prevents negative power)
-                                power_gain = loser["power"] if loser["power"] > 1 else 1
-                                winner["power"] += power_gain
-
-                                # Reset loser power *immediately* in state
-                                loser["power"] = 1
-                                loser["is_respawning"] = True # <<< SET RESPAWNING FLAG
-
-                                # Send "eaten" message to loser
-                                try:
-                                    loser_ws = loser["ws"]
-                                    asyncio.create_task(loser_ws.send_json({"type": "eaten"}))
-                                except Exception as e:
-                                    print(f"Error sending 'eaten' message to {loser_id}: {e}")
-
-                                # --- Check winner's score achievements after power increase ---
-                                winner_username = winner.get("username") # Already got this above
-
-                                stats = playerStats_collection.find_one({"username": winner_username})
-
-                                playerStats_collection.update_one(
-                                    {"username": winner_username},  # Match by username
-                                    {"$set": {"kills": stats["kills"] + 1}},  # Update the selected field
-                                    upsert=True  # Create a new document if none exists
-                                )
-
-                                new_winner_power = winner["power"]
-                                if winner_username:
-                                    asyncio.create_task(check_in_game_score_achievements(winner_username, new_winner_power))
-                                # --- End Score Achievement Check ---
-
-                                # --- Update winner's eaten count & check achievements ---
-                                winner_username = winner.get("username")
-                                if winner_username:
-                                    users_collection.update_one(
-                                        {"username": winner_username},
-                                        {"$inc": {"players_eaten_lifetime": 1}}
-                                    )
-                                    asyncio.create_task(check_and_grant_achievements(winner_username))
-                                # --- End Eaten Count Update ---
-
-                                # Schedule the respawn task for the loser
-                                asyncio.create_task(schedule_respawn(loser_id))
-
-                            break # Move to next p1_id after processing a collision for p1
-
-        except WebSocketDisconnect:
-            # Player disconnecting logic
-            disconnected_client = clients.pop(player_id, None)
-            if disconnected_client:
-                disconnected_username = disconnected_client.get("username")
-                disconnected_score = disconnected_client.get("power", 0)
-                if disconnected_username:
-                    active_usernames.discard(disconnected_username)
-                    # --- Update score on disconnect ---
-                    await update_total_score(disconnected_username, disconnected_score)
-                    # --- End score update ---
-                print(f"Player {player_id} disconnected.") # Removed broadcast remove message
-                # Broadcast remove message to all remaining clients
-                await broadcast_message({
-                    "type": "remove",
-                    "id": player_id
-                })
+        except WebSocketDisconnect as e:
+            close_code = e.code # Handled below: the player is kept for a resume or removed
+        finally:
+            ingestor.stop()
+            link.cancel()
+            # A player's tasks are only cancelled when they leave for good (finalize_player), not on a resumable drop
     except Exception as e:
         err_s = str(e)
         tbs = traceback.format_exc()
         combo = err_s + "\n" + tbs
         error_logger.error(combo)
+    finally:
+        if admitted:
+            admission.release(ROOM)
+        if player_id is not None:
+            db_profiler.begin("ws", "disconnect")
+            # A normal close (1000) or leaving the page (1001) is not coming back
+            await drop_connection(player_id, websocket, resumable=close_code not in (1000, 1001))
+
+async def check_database_ready():
+    if await asyncio.to_thread(database.ping):
+        print("MongoDB connection successful.")
+        try:
+            await asyncio.to_thread(round_results.ensure_indexes)
+            await asyncio.to_thread(profile_summary.ensure_indexes)
+        except Exception as e:
+            print(f"Error creating leaderboard indexes: {e}")
+
+@app.get("/healthz")
+async def liveness():
+    """The process is up; does not touch the database."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readiness():
+    """Ready to serve once MongoDB answers a ping."""
+    if await asyncio.to_thread(database.ping):
+        return {"status": "ready"}
+    raise HTTPException(status_code=503, detail="Database not reachable")
+
+# Connection gauges are read at scrape time
+registry.gauge("game_connected_clients", "Players connected to /ws/game", function=lambda: len(clients))
+registry.gauge("game_rooms", "Active game rooms", function=lambda: 1 if clients else 0)
+registry.gauge("ws_admitted_players", "Players holding an admission slot", function=lambda: admission.players)
+registry.gauge("ws_admission_queue", "Connections waiting for a player slot", function=lambda: admission.stats()["waiting"])
+registry.gauge("ws_admission_events", "Admission decisions since start", ("outcome",),
+               function=lambda: {(k,): v for k, v in admission.counters.items()})
+registry.gauge("ws_spectators", "Connected /ws/spectate viewers", function=lambda: spectator_hub.spectators)
+registry.gauge("background_tasks_live", "Supervised background tasks running", ("category",),
+               function=lambda: {(name,): len(group.running) for name, group in task_supervisor.categories.items()})
+registry.gauge("background_tasks_peak", "Most supervised background tasks running at once", ("category",),
+               function=lambda: {(name,): group.peak for name, group in task_supervisor.categories.items()})
+registry.gauge("background_tasks_queued", "Supervised background tasks waiting for a slot",
+               function=lambda: sum(len(group.queue) for group in task_supervisor.categories.values()))
+registry.gauge("background_tasks_coalesced", "Spawns merged into an already pending task", ("category",),
+               function=lambda: {(name,): group.counters["coalesced"] for name, group in task_supervisor.categories.items()})
+registry.gauge("ws_detached_players", "Players whose socket dropped, kept for a resume",
+               function=lambda: len(resume_registry.detached))
+registry.gauge("ws_resume_events", "Resume outcomes since start", ("outcome",),
+               function=lambda: {(k,): v for k, v in resume_registry.counters.items()})
+registry.gauge("tick_deferred_queued", "Deferred jobs waiting for tick budget", ("category",),
+               function=lambda: {(name,): group.queued for name, group in tick_scheduler.categories.items()})
+registry.gauge("tick_deferred_oldest_seconds", "How long the oldest waiting deferred job has waited", ("category",),
+               function=lambda: {(name,): wait for name, wait in tick_scheduler.oldest_wait().items()})
+registry.gauge("tick_deferred_ticks", "Ticks that were over budget, carried work over, or ran none of it",
+               ("outcome",), function=lambda: {(k,): tick_scheduler.counters[k]
+                                               for k in ("over_budget", "carried_over", "starved")})
+registry.gauge("tick_deferred_forced", "Deferred jobs run without budget because they waited too long",
+               ("category",), function=lambda: {(name,): group.counters["forced"]
+                                                for name, group in tick_scheduler.categories.items()})
+registry.gauge("game_simulation_backlog", "Simulation process ticks received but not yet applied",
+               function=lambda: len(simulation_process.frames) if simulation_process is not None else 0)
+registry.gauge("game_food_pellets", "Pellets currently in the world", function=lambda: simulation.food.count)
+
+def _clients_by_snapshot_rate():
+    counts = {}
+    for info in list(clients.values()):
+        if "link" in info:
+            key = (info["link"].hz,)
+            counts[key] = counts.get(key, 0) + 1
+    return counts
+
+registry.gauge("game_clients_by_snapshot_hz", "Connected clients per adaptive snapshot rate", ("hz",),
+               function=_clients_by_snapshot_rate)
+registry.gauge("ws_in_flight_bytes_total", "Size of the snapshot frames whose send has not completed",
+               function=lambda: sum(info["link"].in_flight_bytes for info in list(clients.values()) if "link" in info))
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus-style text metrics for the game loop, WebSockets, MongoDB and the event loop."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/admin/stalls")
+async def get_stall_report(limit: int = 20, admin: str = Depends(get_admin_user)):
+    """Event-loop stalls aggregated per call site, worst total stall time first."""
+    return stall_watchdog.report(limit)
+
+@app.post("/api/admin/stalls/reset")
+async def reset_stall_report(admin: str = Depends(get_admin_user)):
+    stall_watchdog.reset()
+    return {"message": "Stall statistics cleared"}
+
+@app.get("/api/admin/links")
+async def get_link_stats(admin: str = Depends(get_admin_user)):
+    """Per-connection snapshot rate, send latency and bytes in flight."""
+    return {
+        pid: {"username": info.get("username"), **info["link"].stats()}
+        for pid, info in list(clients.items())
+        if "link" in info
+    }
+
+@app.get("/api/admin/recording")
+async def get_recording_status(admin: str = Depends(get_admin_user)):
+    return match_recorder.stats()
+
+@app.post("/api/admin/recording/start")
+async def start_recording(admin: str = Depends(get_admin_user)):
+    """Records the running match until stopped or the next round starts (with RECORD_MATCHES on)."""
+    match_recorder.start(recording_path(), clients, simulation.food)
+    return match_recorder.stats()
+
+@app.post("/api/admin/recording/stop")
+async def stop_recording(admin: str = Depends(get_admin_user)):
+    return match_recorder.stop()
+
+@app.get("/api/admin/admission")
+async def get_admission_stats(admin: str = Depends(get_admin_user)):
+    """Player slots in use, queue length and connections turned away (full / connecting too fast)."""
+    return admission.stats()
+
+@app.get("/api/admin/spectators")
+async def get_spectator_stats(admin: str = Depends(get_admin_user)):
+    return spectator_hub.stats()
+
+@app.get("/api/admin/ratelimits")
+async def get_rate_limit_stats(admin: str = Depends(get_admin_user)):
+    """Allowed and rejected (429) requests per rate-limited route, and how many keys each tracks."""
+    return rate_limits.stats()
+
+@app.get("/api/admin/traces")
+async def get_traces(limit: int = 50, path: Optional[str] = None, min_ms: float = 0.0,
+                     admin: str = Depends(get_admin_user)):
+    """Sampled request traces, newest first: per-layer timings and every span."""
+    return {**trace_buffer.stats(), "traces": trace_buffer.dump(limit, path, min_ms)}
+
+@app.post("/api/admin/traces/sample")
+async def set_trace_sample_rate(rate: float, admin: str = Depends(get_admin_user)):
+    """Fraction of requests to trace (0 turns tracing off)."""
+    if not 0 <= rate <= 1:
+        raise HTTPException(status_code=400, detail="rate must be between 0 and 1")
+    trace_buffer.sample_rate = rate
+    return trace_buffer.stats()
+
+@app.get("/api/admin/db")
+async def get_db_profile(top: int = 20, admin: str = Depends(get_admin_user)):
+    """MongoDB commands per collection and per route or game event, repeated queries and slow commands."""
+    return db_profiler.db_profiler.stats(top)
+
+@app.post("/api/admin/db/reset")
+async def reset_db_profile(admin: str = Depends(get_admin_user)):
+    db_profiler.db_profiler.reset()
+    return {"message": "Database profile cleared"}
+
+@app.get("/api/admin/memory")
+async def get_memory_report(sizes: bool = True, admin: str = Depends(get_admin_user)):
+    """RSS, live tasks by coroutine, and counts and estimated sizes of players, pellets, queues and caches."""
+    return memory_diagnostics.report(sizes)
+
+@app.post("/api/admin/memory/tracemalloc/start")
+async def start_tracemalloc(frames: int = 1, admin: str = Depends(get_admin_user)):
+    """Starts tracing allocations (slows the server down while on) and clears the baseline."""
+    if not 1 <= frames <= 50:
+        raise HTTPException(status_code=400, detail="frames must be between 1 and 50")
+    memory_diagnostics.start(frames)
+    return memory_diagnostics.tracemalloc_status()
+
+@app.post("/api/admin/memory/tracemalloc/stop")
+async def stop_tracemalloc(admin: str = Depends(get_admin_user)):
+    memory_diagnostics.stop()
+    return memory_diagnostics.tracemalloc_status()
+
+@app.post("/api/admin/memory/snapshot")
+async def take_memory_baseline(admin: str = Depends(get_admin_user)):
+    """Takes the snapshot that /api/admin/memory/diff compares against."""
+    try:
+        await asyncio.to_thread(memory_diagnostics.take_baseline)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return memory_diagnostics.tracemalloc_status()
+
+@app.get("/api/admin/memory/diff")
+async def get_memory_diff(top: int = 25, group_by: str = "lineno", rebase: bool = False,
+                          admin: str = Depends(get_admin_user)):
+    """Allocations that grew the most since the baseline, per line ("lineno"), "filename" or "traceback"."""
+    if group_by not in ("lineno", "filename", "traceback"):
+        raise HTTPException(status_code=400, detail="group_by must be lineno, filename or traceback")
+    try:
+        diff = await asyncio.to_thread(memory_diagnostics.diff, top, group_by, rebase)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {**memory_diagnostics.tracemalloc_status(), "top": diff}
+
+@app.get("/api/admin/tasks")
+async def get_task_stats(admin: str = Depends(get_admin_user)):
+    """Supervised background tasks per category: running, queued, peak, coalesced and cancelled."""
+    return task_supervisor.stats()
+
+@app.get("/api/admin/resume")
+async def get_resume_stats(admin: str = Depends(get_admin_user)):
+    """Players waiting to be resumed, and resumes, expiries and rejected tokens since start."""
+    return resume_registry.stats()
+
+@app.get("/api/admin/scheduler")
+async def get_tick_scheduler_stats(admin: str = Depends(get_admin_user)):
+    """Deferred work per category: queued, waits, cost, and ticks that carried work over or starved it."""
+    return tick_scheduler.stats()
+
+@app.get("/api/admin/simulation")
+async def get_simulation_process_stats(admin: str = Depends(get_admin_user)):
+    """Status of the simulation process (SIMULATION_PROCESS=true): ticks, slots, frames waiting and busy time."""
+    if simulation_process is None:
+        return {"enabled": False}
+    return {"enabled": True, **simulation_process.stats()}
+
+@app.get("/api/admin/profiles")
+async def get_profile_cache_stats(admin: str = Depends(get_admin_user)):
+    return profile_summary.stats()
+
+@app.get("/api/admin/ingest")
+async def get_ingest_stats(admin: str = Depends(get_admin_user)):
+    """Per-connection WebSocket ingress counters (rate limited, coalesced, malformed...)."""
+    return {
+        pid: {"username": info.get("username"), **info["ingest"].stats()}
+        for pid, info in list(clients.items())
+        if "ingest" in info
+    }
 
 @app.post("/api/addDeaths")
 async def add_Deaths(username: Optional[str] = Depends(get_current_user)):
@@ -766,6 +1429,7 @@ async def add_Deaths(username: Optional[str] = Depends(get_current_user)):
         {"$set": {"deaths": stats["deaths"]+1 }},  # Update the selected field
         upsert=True  # Create a new document if none exists
     )
+    profile_summary.invalidate(username)
 
     return
 
@@ -783,6 +1447,7 @@ async def add_Kills(username: Optional[str] = Depends(get_current_user)):
         {"$set": {"kills": stats["kills"]+1 }},  # Update the selected field
         upsert=True  # Create a new document if none exists
     )
+    profile_summary.invalidate(username)
 
     return
 
@@ -898,11 +1563,29 @@ async def save_skin(skin: SkinSelection, username: Optional[str] = Depends(get_c
             {"$set": {"selected": skin.selectedSkin}},  # Update the selected field
             upsert=True  # Create a new document if none exists
         )
+        profile_summary.invalidate(username)
 
         return {"message": "Skin selection saved successfully", "selected": skin.selectedSkin}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save skin: {str(e)}")
 
+@app.get("/api/profile/summary")
+async def get_profile_summary(username: Optional[str] = Depends(get_current_user)):
+    """Stats, skin, achievements and rank of the logged-in user in one response (see profile_summary.py)."""
+    if not username:
+        raise HTTPException(status_code=401, detail="Unauthorized: Username is required")
+    try:
+        summary = await asyncio.to_thread(profile_summary.get_summary, username, ACHIEVEMENTS)
+    except Exception as e:
+        print(f"Error building profile summary for {username}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Could not retrieve profile."
+        )
+    if summary is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return summary
+
 @app.get("/profile", response_class=FileResponse)
 async def serve_home_page():
     # Serve the main index page
@@ -917,6 +1600,7 @@ def resize_and_replace_circular_png(filename, target_size):
         filename (str): Path to the input PNG file (will be overwritten).
         target_size (int): Desired width and height of the output image in pixels.
     """
+    from PIL import Image, ImageDraw  # Pillow is only needed for uploads, keep it out of startup
     # Open the original image
     original = Image.open(filename).convert("RGBA")
     
@@ -967,6 +1651,7 @@ async def upload_file(file: UploadFile, username: Optional[str] = Depends(get_cu
             f.write(file_data)
 
         # Process into circular avatar
+        from PIL import Image, ImageDraw
         try:
             with Image.open(original_path) as img:
                 # Calculate largest possible circle
@@ -1011,6 +1696,7 @@ async def upload_file(file: UploadFile, username: Optional[str] = Depends(get_cu
                 {"$set": {"custom": avatar_filename}},
                 upsert=True
             )
+            profile_summary.invalidate(username)
 
         print(f"Avatar successfully processed and saved to {avatar_path}")
         return {"file_path": f"pictures/{avatar_filename}"}
@@ -1033,7 +1719,7 @@ async def serve_home_page():
 
 @app.get("/play", response_class=HTMLResponse)
 async def game_page(request: Request):
-    return templates.TemplateResponse("game.html", {"request": request})
+    return get_templates().TemplateResponse(request, "game.html")
 
 @app.get("/login", response_class=FileResponse)
 async def serve_login_page(username: Optional[str] = Depends(get_current_user)):
@@ -1070,7 +1756,7 @@ async def api_login(credentials: UserCredentials = Body(...), response: Response
             detail="Incorrect username or password",
         )
     salt = user.get("salt", "")
-    if not verify_password(credentials.password, salt, user["hashed_password"]):
+    if not await verify_password_async(credentials.password, salt, user["hashed_password"]):
         loginReg_logger.info(credentials.username + " could not verify password")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -1147,7 +1833,7 @@ async def api_register(credentials: UserCredentials = Body(...)):
             detail="Username already registered"
         )
 
-    salt, hashed_password = get_password_hash(credentials.password)
+    salt, hashed_password = await get_password_hash_async(credentials.password)
 
     users_collection.insert_one({
         "username": credentials.username,
@@ -1216,6 +1902,25 @@ async def get_leaderboard_data():
             detail="Could not retrieve leaderboard data."
         )
 
+@app.get("/api/leaderboard/{window}")
+async def get_windowed_leaderboard(window: str, limit: int = 20):
+    """Top players of the current hour, day or week, read from the pre-aggregated buckets."""
+    if window not in round_results.WINDOWS:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Unknown leaderboard window. Use one of: {', '.join(round_results.WINDOWS)}"
+        )
+    if limit < 1:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="limit must be at least 1")
+    try:
+        return await asyncio.to_thread(round_results.top_players, window, limit)
+    except Exception as e:
+        print(f"Error fetching {window} leaderboard: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Could not retrieve leaderboard data."
+        )
+
 # --- Achievements API Endpoint ---
 @app.get("/api/achievements")
 async def get_user_achievements(username: str = Depends(get_current_user)):
@@ -1268,8 +1973,9 @@ async def check_and_grant_achievements(username: str):
     if not username:
         return # Only logged-in users get achievements
 
+    await stats_flushed()  # players_eaten_lifetime may still be on its way
     # Fetch only the stats needed for lifetime checks + unlocked list
-    user_data = users_collection.find_one({"username": username}, {"_id": 0, "unlocked_achievements": 1, "games_played": 1, "players_eaten_lifetime": 1})
+    user_data = await asyncio.to_thread(users_collection.find_one, {"username": username}, {"_id": 0, "unlocked_achievements": 1, "games_played": 1, "players_eaten_lifetime": 1})
     if not user_data:
         print(f"[Achievements] User not found: {username}")
         return
@@ -1290,10 +1996,12 @@ async def check_and_grant_achievements(username: str):
     if newly_unlocked:
         print(f"[Achievements] User {username} unlocked: {newly_unlocked}")
         # Update database
-        users_collection.update_one(
+        await asyncio.to_thread(
+            users_collection.update_one,
             {"username": username},
             {"$addToSet": {"unlocked_achievements": {"$each": newly_unlocked}}}
         )
+        profile_summary.invalidate(username)
 
         # Send notifications via WebSocket
         for client_id, client_info in clients.items():
@@ -1302,7 +2010,7 @@ async def check_and_grant_achievements(username: str):
                 if ws:
                     for ach_id in newly_unlocked:
                         try:
-                            await ws.send_json({
+                            await send_message(ws, {
                                 "type": "achievement_unlocked",
                                 "achievement": {
                                     "id": ach_id,
@@ -1322,7 +2030,7 @@ async def check_in_game_score_achievements(username: str, current_power: int):
         return
 
     # Fetch only unlocked achievements to avoid duplicate checks/grants
-    user_data = users_collection.find_one({"username": username}, {"_id": 0, "unlocked_achievements": 1})
+    user_data = await asyncio.to_thread(users_collection.find_one, {"username": username}, {"_id": 0, "unlocked_achievements": 1})
     if user_data is None: # Check explicitly for None
         print(f"[AchievementsScore] User not found: {username}")
         return
@@ -1344,10 +2052,12 @@ async def check_in_game_score_achievements(username: str, current_power: int):
     if newly_unlocked:
         print(f"[AchievementsScore] User {username} unlocked score achievements: {newly_unlocked} with power {current_power}")
         # Update database
-        users_collection.update_one(
+        await asyncio.to_thread(
+            users_collection.update_one,
             {"username": username},
             {"$addToSet": {"unlocked_achievements": {"$each": newly_unlocked}}}
         )
+        profile_summary.invalidate(username)
         # Send notifications via WebSocket
         for client_id, client_info in clients.items():
             if client_info.get("username") == username:
@@ -1355,7 +2065,7 @@ async def check_in_game_score_achievements(username: str, current_power: int):
                 if ws:
                     for ach_id in newly_unlocked:
                         try:
-                            await ws.send_json({
+                            await send_message(ws, {
                                 "type": "achievement_unlocked",
                                 "achievement": {
                                     "id": ach_id,
@@ -0,0 +1,250 @@
+"""
+Compact binary match recorder.
+
+A recording is a 8 byte header followed by length-prefixed frames:
+
+    frame = kind (uint8) | payload length (uint32) | payload
+
+All integers are little-endian. Per-player and per-pellet data is packed
+into typed arrays rather than one record per entity, so a tick with 500
+players is a handful of memcpys to write and to read back:
+
+    JOIN   slot u32, x f64, y f64, power u32, then "player_id\\0username" as utf-8
+    LEAVE  slot u32
+    INPUTS n u32, slots u32[n], seqs i32[n], xs f64[n], ys f64[n]   (arrival order)
+    TICK   tick u32, server_time_ms u64, time_remaining f64, n u32,
+           slots u32[n], xs f64[n], ys f64[n], powers u32[n], flags u8[n]
+    FOOD   n u32, flat [id, x, y, ...] i32[3n]   (pellets spawned this tick)
+    FOOD_RESET  same layout, the field was cleared and refilled (round start)
+
+Player ids are replaced by small slot numbers assigned on JOIN. Inputs are
+buffered as they arrive and written together with the next TICK, on a
+single writer thread so file I/O never runs on the event loop.
+"""
+import os
+import struct
+import sys
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+MAGIC = b"MCREC\x00\x01\x00"  # format version 1
+
+KIND_JOIN = 1
+KIND_LEAVE = 2
+KIND_INPUTS = 3
+KIND_TICK = 4
+KIND_FOOD = 5
+KIND_FOOD_RESET = 6
+
+FLAG_RESPAWNING = 1
+FLAG_INVULNERABLE = 2
+
+_FRAME_HEADER = struct.Struct("<BI")
+_JOIN = struct.Struct("<IddI")
+_TICK = struct.Struct("<IQdI")
+_U32 = struct.Struct("<I")
+
+# Flush to the writer thread once this much is buffered
+FLUSH_BYTES = 64 * 1024
+
+_SWAP = sys.byteorder != "little"
+
+
+def _pack(arr: array) -> bytes:
+    if _SWAP:
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _unpack(typecode: str, data, offset: int, n: int):
+    arr = array(typecode)
+    end = offset + n * arr.itemsize
+    arr.frombytes(data[offset:end])
+    if _SWAP:
+        arr.byteswap()
+    return arr, end
+
+
+class MatchRecorder:
+    def __init__(self):
+        self.path = None
+        self.started_at = None
+        self.slots = {}  # player_id -> slot
+        self._next_slot = 0
+        self._file = None
+        self._writer = None
+        self._buffer = bytearray()
+        self._input_slots = array('I')
+        self._input_seqs = array('i')
+        self._input_xs = array('d')
+        self._input_ys = array('d')
+        self.frames = 0
+        self.inputs = 0
+        self.bytes_written = 0
+
+    @property
+    def active(self) -> bool:
+        return self._file is not None
+
+    def start(self, path: str, clients: dict, food_field):
+        """Starts recording to path, writing the current players and pellets first."""
+        if self.active:
+            self.stop()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "wb")
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="match-recorder")
+        self.path = path
+        self.started_at = time.time()
+        self.slots = {}
+        self._next_slot = 0
+        self.frames = self.inputs = self.bytes_written = 0
+        self._buffer = bytearray(MAGIC)
+        for player_id, info in list(clients.items()):
+            self.join(player_id, info)
+        self.food_reset(food_field)
+        print(f"Recording match to {path}")
+
+    def stop(self) -> dict:
+        if not self.active:
+            return self.stats()
+        self._flush_inputs()
+        self._flush()
+        file, writer = self._file, self._writer
+        self._file = self._writer = None
+        writer.submit(file.close)
+        writer.shutdown(wait=True)
+        print(f"Stopped recording {self.path}: {self.frames} frames, {self.bytes_written} bytes")
+        return self.stats()
+
+    def _frame(self, kind: int, *parts):
+        self._buffer += _FRAME_HEADER.pack(kind, sum(len(p) for p in parts))
+        for part in parts:
+            self._buffer += part
+        self.frames += 1
+
+    def _flush(self):
+        if self._buffer:
+            data = bytes(self._buffer)
+            self._buffer = bytearray()
+            self.bytes_written += len(data)
+            self._writer.submit(self._file.write, data)
+
+    def join(self, player_id: str, info: dict):
+        slot = self.slots.get(player_id)
+        if slot is None:
+            slot = self.slots[player_id] = self._next_slot
+            self._next_slot += 1
+        names = f"{player_id}\0{info.get('username') or ''}".encode()
+        self._frame(KIND_JOIN, _JOIN.pack(slot, info["x"], info["y"], info["power"]), names)
+
+    def leave(self, player_id: str):
+        slot = self.slots.pop(player_id, None)
+        if slot is not None:
+            self._frame(KIND_LEAVE, _U32.pack(slot))
+
+    def input(self, player_id: str, data: dict):
+        slot = self.slots.get(player_id)
+        if slot is None:
+            return
+        self._input_slots.append(slot)
+        self._input_seqs.append(data.get("seq", 0) & 0x7FFFFFFF)
+        self._input_xs.append(data["x"])
+        self._input_ys.append(data["y"])
+        self.inputs += 1
+
+    def _flush_inputs(self):
+        n = len(self._input_slots)
+        if not n:
+            return
+        self._frame(KIND_INPUTS, _U32.pack(n), _pack(self._input_slots), _pack(self._input_seqs),
+                    _pack(self._input_xs), _pack(self._input_ys))
+        self._input_slots = array('I')
+        self._input_seqs = array('i')
+        self._input_xs = array('d')
+        self._input_ys = array('d')
+
+    def food(self, flat: list, reset: bool = False):
+        self._frame(KIND_FOOD_RESET if reset else KIND_FOOD, _U32.pack(len(flat) // 3), _pack(array('i', flat)))
+
+    def food_reset(self, food_field):
+        alive = food_field.alive
+        self.food(food_field.encode_spawns([i for i in range(food_field.capacity) if alive[i]]), reset=True)
+
+    def tick(self, tick: int, time_remaining: float, clients: dict):
+        """Writes the inputs received since the last tick, then the authoritative player state."""
+        self._flush_inputs()
+        slots, xs, ys, powers, flags = array('I'), array('d'), array('d'), array('I'), bytearray()
+        for player_id, info in list(clients.items()):
+            slot = self.slots.get(player_id)
+            if slot is None:
+                continue
+            slots.append(slot)
+            xs.append(info["x"])
+            ys.append(info["y"])
+            powers.append(info["power"])
+            flags.append((FLAG_RESPAWNING if info.get("is_respawning") else 0)
+                         | (FLAG_INVULNERABLE if info.get("isInvulnerable") else 0))
+        self._frame(KIND_TICK, _TICK.pack(tick, round(time.time() * 1000), time_remaining, len(slots)),
+                    _pack(slots), _pack(xs), _pack(ys), _pack(powers), bytes(flags))
+        if len(self._buffer) >= FLUSH_BYTES:
+            self._flush()
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "path": self.path,
+            "started_at": self.started_at,
+            "frames": self.frames,
+            "inputs": self.inputs,
+            "players": len(self.slots),
+            "bytes_written": self.bytes_written + len(self._buffer),
+        }
+
+
+def read_frames(path: str):
+    """Yields (kind, payload) from a recording; payloads are decoded into dicts of arrays."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a match recording")
+    view = memoryview(data)
+    offset = len(MAGIC)
+    while offset + _FRAME_HEADER.size <= len(data):
+        kind, length = _FRAME_HEADER.unpack_from(data, offset)
+        offset += _FRAME_HEADER.size
+        if offset + length > len(data):
+            break  # truncated last frame (server stopped mid-write)
+        yield kind, _decode(kind, view[offset:offset + length])
+        offset += length
+
+
+def _decode(kind: int, payload) -> dict:
+    if kind == KIND_JOIN:
+        slot, x, y, power = _JOIN.unpack_from(payload)
+        player_id, _, username = bytes(payload[_JOIN.size:]).decode().partition("\0")
+        return {"slot": slot, "id": player_id, "username": username or None, "x": x, "y": y, "power": power}
+    if kind == KIND_LEAVE:
+        return {"slot": _U32.unpack_from(payload)[0]}
+    if kind == KIND_INPUTS:
+        n = _U32.unpack_from(payload)[0]
+        slots, offset = _unpack('I', payload, _U32.size, n)
+        seqs, offset = _unpack('i', payload, offset, n)
+        xs, offset = _unpack('d', payload, offset, n)
+        ys, offset = _unpack('d', payload, offset, n)
+        return {"slots": slots, "seqs": seqs, "xs": xs, "ys": ys}
+    if kind == KIND_TICK:
+        tick, server_time, time_remaining, n = _TICK.unpack_from(payload)
+        slots, offset = _unpack('I', payload, _TICK.size, n)
+        xs, offset = _unpack('d', payload, offset, n)
+        ys, offset = _unpack('d', payload, offset, n)
+        powers, offset = _unpack('I', payload, offset, n)
+        flags = bytes(payload[offset:offset + n])
+        return {"tick": tick, "server_time": server_time, "time_remaining": time_remaining,
+                "slots": slots, "xs": xs, "ys": ys, "powers": powers, "flags": flags}
+    if kind in (KIND_FOOD, KIND_FOOD_RESET):
+        n = _U32.unpack_from(payload)[0]
+        flat, _ = _unpack('i', payload, _U32.size, 3 * n)
+        return {"food": flat}
+    return {}
@@ -0,0 +1,158 @@
+"""
+Memory diagnostics for a running server (/api/admin/memory).
+
+Two views:
+- Allocation diffs: tracemalloc can be started and stopped at runtime. A
+  baseline snapshot is taken on demand, and diff() compares a fresh
+  snapshot against it, giving the source lines (or files / tracebacks)
+  whose allocations grew the most. tracemalloc slows allocation down, so
+  it is off unless an admin turns it on.
+- Entity accounting: live counts and estimated sizes of the structures
+  the server keeps (players, pellets, tasks, send queues, caches), each
+  registered with account() by the module that owns it.
+"""
+import asyncio
+import gc
+import os
+import sys
+import tracemalloc
+from array import array
+from collections import Counter, deque
+
+TRACEMALLOC_FRAMES = int(os.getenv("TRACEMALLOC_FRAMES", "1"))
+MAX_SIZE_NODES = 200000  # objects visited per size estimate, so a huge structure cannot stall the loop
+
+_IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def deep_size(obj, max_nodes: int = MAX_SIZE_NODES) -> int:
+    """
+    Estimated bytes held by obj: sys.getsizeof of it and of everything
+    reachable through dicts, lists, tuples, sets, deques and plain objects'
+    attributes, each object counted once. Sockets, tasks and other opaque
+    objects only count their own size. Stops after max_nodes objects.
+    """
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack and len(seen) < max_nodes:
+        current = stack.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current)
+        if isinstance(current, (str, bytes, bytearray, array, int, float, bool)) or current is None:
+            continue
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset, deque)):
+            stack.extend(current)
+        elif hasattr(current, "__dict__") and type(current).__module__ in _OWN_MODULES:
+            stack.append(vars(current))
+    return total
+
+
+# Objects of these modules are walked into; anything else (websockets, tasks, events) is opaque
+_OWN_MODULES = {"food_field", "link_rate", "ingest", "simulation", "admission", "rate_limit", "tracing",
+                "db_profiler", "spectators", "match_recorder", "messaging"}
+
+
+def rss_bytes() -> int:
+    """Resident set size of the process (Linux), or 0 where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def task_counts(top: int = 20) -> dict:
+    """Live asyncio tasks grouped by the coroutine they run."""
+    counts = Counter(getattr(task.get_coro(), "__qualname__", "?") for task in asyncio.all_tasks())
+    return dict(counts.most_common(top))
+
+
+class MemoryDiagnostics:
+    def __init__(self):
+        self.accounts = {}  # name -> function returning (count, object to size or size in bytes)
+        self.baseline = None
+
+    def account(self, name: str, function):
+        """Registers a structure: function() returns (live count, object whose size to estimate)."""
+        self.accounts[name] = function
+
+    def entities(self, sizes: bool = True) -> dict:
+        result = {}
+        for name, function in self.accounts.items():
+            try:
+                count, target = function()
+            except Exception as e:
+                result[name] = {"error": str(e)}
+                continue
+            entry = {"count": count}
+            if sizes:
+                entry["bytes"] = target if isinstance(target, int) else deep_size(target)
+            result[name] = entry
+        return result
+
+    def report(self, sizes: bool = True) -> dict:
+        return {
+            "rss_bytes": rss_bytes(),
+            "gc_counts": gc.get_count(),
+            "gc_objects_tracked": len(gc.get_objects()),
+            "tasks": task_counts(),
+            "entities": self.entities(sizes),
+            "tracemalloc": self.tracemalloc_status(),
+        }
+
+    # --- tracemalloc ---
+
+    def tracemalloc_status(self) -> dict:
+        if not tracemalloc.is_tracing():
+            return {"tracing": False, "baseline": self.baseline is not None}
+        current, peak = tracemalloc.get_traced_memory()
+        return {"tracing": True, "frames": tracemalloc.get_traceback_limit(), "traced_bytes": current,
+                "traced_peak_bytes": peak, "overhead_bytes": tracemalloc.get_tracemalloc_memory(),
+                "baseline": self.baseline is not None}
+
+    def start(self, frames: int = TRACEMALLOC_FRAMES):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self.baseline = None  # a baseline from an earlier run would not be comparable
+
+    def stop(self):
+        tracemalloc.stop()
+        self.baseline = None
+
+    def take_baseline(self):
+        """Snapshot that later diffs compare against. Blocking; takes a while with many live objects."""
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc is not running")
+        self.baseline = tracemalloc.take_snapshot().filter_traces(_IGNORED)
+
+    def diff(self, top: int = 25, group_by: str = "lineno", rebase: bool = False) -> list:
+        """Allocation growth since the baseline, largest first. Blocking."""
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc is not running")
+        snapshot = tracemalloc.take_snapshot().filter_traces(_IGNORED)
+        if self.baseline is None:
+            self.baseline = snapshot  # first call only establishes the baseline
+            return []
+        stats = snapshot.compare_to(self.baseline, group_by)
+        if rebase:
+            self.baseline = snapshot
+        return [
+            {"where": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+             "size_diff_bytes": stat.size_diff, "size_bytes": stat.size,
+             "count_diff": stat.count_diff, "count": stat.count}
+            for stat in stats[:top]
+        ]
+
+
+memory_diagnostics = MemoryDiagnostics()
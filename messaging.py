@@ -0,0 +1,31 @@
+import json
+
+from metrics import WS_MESSAGES_SENT, WS_BYTES_SENT, WS_SEND_DEPTH, pending_sends
+
+
+def encode_message(message: dict) -> str:
+    """Encodes a message the same way Starlette's send_json does."""
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+
+async def send_encoded(ws, kind: str, text: str):
+    """Sends an already encoded message, counting it by type and tracking sends in flight."""
+    key = id(ws)
+    depth = pending_sends.get(key, 0)
+    WS_SEND_DEPTH.observe(depth)
+    pending_sends[key] = depth + 1
+    try:
+        await ws.send_text(text)
+    finally:
+        remaining = pending_sends.get(key, 1) - 1
+        if remaining > 0:
+            pending_sends[key] = remaining
+        else:
+            pending_sends.pop(key, None)
+    WS_MESSAGES_SENT.inc(1, kind)
+    WS_BYTES_SENT.inc(len(text) if text.isascii() else len(text.encode()), kind)
+
+
+async def send_message(ws, message: dict):
+    """Drop-in replacement for ws.send_json(message) that records outbound metrics."""
+    await send_encoded(ws, message.get("type", ""), encode_message(message))
@@ -0,0 +1,193 @@
+"""
+Small in-process metrics registry rendered in the Prometheus text format.
+
+Everything here is a dict lookup plus an add (histograms also do one bisect),
+so it is cheap enough to call from the 30 Hz game loop.
+"""
+import asyncio
+import time
+from bisect import bisect_left
+
+from pymongo import monitoring
+
+# Bucket upper bounds in seconds, tuned for 30 Hz ticks and Mongo round trips
+TIME_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.02, 0.033, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+DEPTH_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def inc(self, amount=1, *labels):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name, help, labelnames=(), function=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        # Optional callable evaluated at scrape time, returning a number or {labels: number}
+        self.function = function
+
+    def set(self, value, *labels):
+        self.values[labels] = value
+
+    def samples(self):
+        values = self.values
+        if self.function is not None:
+            result = self.function()
+            values = result if isinstance(result, dict) else {(): result}
+        for labels, value in values.items():
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=TIME_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [bucket counts..., +Inf count, sum]
+        self.values = {}
+
+    def observe(self, value, *labels):
+        data = self.values.get(labels)
+        if data is None:
+            data = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        data[bisect_left(self.buckets, value)] += 1
+        data[-1] += value
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def samples(self):
+        for labels, data in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, data):
+                cumulative += count
+                yield self.name + "_bucket", _format_labels(self.labelnames, labels, ("le", repr(float(bound)))), cumulative
+            cumulative += data[len(self.buckets)]
+            yield self.name + "_bucket", _format_labels(self.labelnames, labels, ("le", "+Inf")), cumulative
+            yield self.name + "_sum", _format_labels(self.labelnames, labels), data[-1]
+            yield self.name + "_count", _format_labels(self.labelnames, labels), cumulative
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=(), function=None):
+        return self.register(Gauge(name, help, labelnames, function))
+
+    def histogram(self, name, help, labelnames=(), buckets=TIME_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# --- Game loop ---
+TICK_SECONDS = registry.histogram("game_tick_seconds", "Time spent in one broadcast loop tick")
+BROADCAST_SECONDS = registry.histogram("broadcast_state_seconds", "Time spent in broadcast_state")
+
+# --- Network ---
+WS_MESSAGES_SENT = registry.counter("ws_messages_sent_total", "WebSocket messages sent", ("type",))
+WS_BYTES_SENT = registry.counter("ws_bytes_sent_total", "WebSocket payload bytes sent", ("type",))
+WS_SEND_DEPTH = registry.histogram("ws_send_queue_depth", "Sends already in flight to a client when a new one starts",
+                                   buckets=DEPTH_BUCKETS)
+
+# --- Database / auth ---
+MONGO_COMMAND_SECONDS = registry.histogram("mongo_command_seconds", "MongoDB command latency",
+                                           ("collection", "command"))
+MONGO_COMMAND_FAILURES = registry.counter("mongo_command_failures_total", "Failed MongoDB commands",
+                                          ("collection", "command"))
+BCRYPT_QUEUE_WAIT_SECONDS = registry.histogram("bcrypt_queue_wait_seconds",
+                                               "Time a bcrypt job waited for a worker thread")
+BCRYPT_SECONDS = registry.histogram("bcrypt_seconds", "Time spent hashing or verifying a password")
+
+# --- Event loop ---
+EVENT_LOOP_LAG_SECONDS = registry.histogram("event_loop_lag_seconds", "How late the event loop woke a sleeping task")
+registry.gauge("asyncio_tasks", "Live asyncio tasks", function=lambda: len(asyncio.all_tasks()))
+
+# In-flight sends per WebSocket (id(ws) -> count); entries are dropped when they reach zero
+pending_sends = {}
+registry.gauge("ws_send_queue_depth_max", "Largest number of sends in flight to a single client",
+               function=lambda: max(pending_sends.values(), default=0))
+registry.gauge("ws_send_queue_depth_total", "Sends in flight across all clients",
+               function=lambda: sum(pending_sends.values()))
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """pymongo command listener recording latency per collection and command."""
+
+    def __init__(self):
+        self._collections = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        self._collections[event.request_id] = collection if isinstance(collection, str) else ""
+
+    def succeeded(self, event):
+        collection = self._collections.pop(event.request_id, "")
+        MONGO_COMMAND_SECONDS.observe(event.duration_micros / 1e6, collection, event.command_name)
+
+    def failed(self, event):
+        collection = self._collections.pop(event.request_id, "")
+        MONGO_COMMAND_SECONDS.observe(event.duration_micros / 1e6, collection, event.command_name)
+        MONGO_COMMAND_FAILURES.inc(1, collection, event.command_name)
@@ -0,0 +1,146 @@
+"""
+Everything the profile and home pages show about one user, in one response.
+
+The summary (stats, skin, unlocked achievements, total score and rank) is
+built with a single aggregation on users that $lookups the other
+collections, and cached per user. Code that writes any of those fields
+calls invalidate(username) so the next read rebuilds it; the TTL only
+bounds how stale the rank gets when other players' scores move it.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from pymongo import DESCENDING
+
+from database import users_collection, leaderboard_stats_collection
+
+CACHE_TTL_SECONDS = float(os.getenv("PROFILE_CACHE_TTL", "30"))
+CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "1000"))
+
+DEFAULT_SKIN = "PurplePlanet.png"
+BUILTIN_SKINS = {"skin1": "PurplePlanet.png", "skin2": "RedPlanet.png", "skin3": "BluePlanet.png"}
+
+_cache = OrderedDict()  # username -> (expires at, summary), least recently used first
+_cache_lock = threading.Lock()
+_loading = set()  # usernames being built; invalidate() removes them so a stale build is not cached
+cache_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+_indexes_ready = False
+
+
+def ensure_indexes():
+    """The rank lookup counts players with a higher total_score; let it walk an index. Blocking."""
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    leaderboard_stats_collection.create_index([("total_score", DESCENDING)], name="total_score")
+    leaderboard_stats_collection.create_index("username", name="username")
+    _indexes_ready = True
+
+
+def skin_file_name(skin: dict) -> str:
+    """Picture file of the user's selected skin, from their skin document (or None)."""
+    if not skin:
+        return DEFAULT_SKIN
+    selected = skin.get("selected", "skin1")
+    if selected == "custom":
+        return skin.get("custom") or DEFAULT_SKIN
+    return BUILTIN_SKINS.get(selected, DEFAULT_SKIN)
+
+
+def summary_pipeline(username: str) -> list:
+    return [
+        {"$match": {"username": username}},
+        {"$limit": 1},
+        {"$project": {"_id": 0, "username": 1, "unlocked_achievements": 1, "games_played": 1,
+                      "players_eaten_lifetime": 1}},
+        {"$lookup": {"from": "stats", "localField": "username", "foreignField": "username", "as": "stats",
+                     "pipeline": [{"$project": {"_id": 0, "gamesWon": 1, "deaths": 1, "kills": 1, "pellets": 1}}]}},
+        {"$lookup": {"from": "skin", "localField": "username", "foreignField": "username", "as": "skin",
+                     "pipeline": [{"$project": {"_id": 0, "selected": 1, "custom": 1}}]}},
+        {"$lookup": {"from": "leaderboard_stats", "localField": "username", "foreignField": "username",
+                     "as": "score", "pipeline": [{"$project": {"_id": 0, "total_score": 1}}]}},
+        {"$set": {"total_score": {"$ifNull": [{"$first": "$score.total_score"}, 0]}}},
+        # Rank = 1 + number of players with a higher total score (only meaningful once they scored)
+        {"$lookup": {"from": "leaderboard_stats", "let": {"score": "$total_score"}, "as": "ahead",
+                     "pipeline": [{"$match": {"$expr": {"$gt": ["$total_score", "$$score"]}}}, {"$count": "n"}]}},
+    ]
+
+
+def shape_summary(doc: dict, achievements: dict) -> dict:
+    """Turns the aggregation result into the response the pages use."""
+    stats = doc["stats"][0] if doc.get("stats") else {}
+    skin = doc["skin"][0] if doc.get("skin") else None
+    unlocked = set(doc.get("unlocked_achievements", []))
+    total_score = doc.get("total_score", 0)
+    ahead = doc["ahead"][0]["n"] if doc.get("ahead") else 0
+    return {
+        "username": doc["username"],
+        "stats": {
+            "gamesWon": stats.get("gamesWon", 0),
+            "deaths": stats.get("deaths", 0),
+            "kills": stats.get("kills", 0),
+            "pellets": stats.get("pellets", 0),
+            "gamesPlayed": doc.get("games_played", 0),
+            "playersEaten": doc.get("players_eaten_lifetime", 0),
+        },
+        "skin": {
+            "selected": (skin or {}).get("selected", "skin1"),
+            "fileName": skin_file_name(skin),
+            "custom": (skin or {}).get("custom"),  # uploaded picture, even when another skin is selected
+        },
+        "achievements": [
+            {"id": ach_id, "name": details["name"], "description": details["description"],
+             "unlocked": ach_id in unlocked}
+            for ach_id, details in achievements.items()
+        ],
+        "total_score": total_score,
+        "rank": ahead + 1 if total_score > 0 else None,
+    }
+
+
+def get_summary(username: str, achievements: dict):
+    """Cached summary for username, or None if there is no such user. Blocking on a cache miss."""
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _cache.get(username)
+        if entry is not None and entry[0] > now:
+            _cache.move_to_end(username)
+            cache_stats["hits"] += 1
+            return entry[1]
+        cache_stats["misses"] += 1
+        _loading.add(username)
+
+    ensure_indexes()
+    try:
+        docs = list(users_collection.aggregate(summary_pipeline(username)))
+    except Exception:
+        with _cache_lock:
+            _loading.discard(username)
+        raise
+    summary = shape_summary(docs[0], achievements) if docs else None
+    with _cache_lock:
+        unchanged = username in _loading  # no write invalidated it while the aggregation ran
+        _loading.discard(username)
+        if unchanged and summary is not None:
+            _cache[username] = (now + CACHE_TTL_SECONDS, summary)
+            _cache.move_to_end(username)
+            while len(_cache) > CACHE_SIZE:
+                _cache.popitem(last=False)
+    return summary
+
+
+def invalidate(*usernames):
+    """Drops cached summaries; call after writing anything a summary shows."""
+    with _cache_lock:
+        for username in usernames:
+            _loading.discard(username)
+            if username and _cache.pop(username, None) is not None:
+                cache_stats["invalidations"] += 1
+
+
+def stats() -> dict:
+    with _cache_lock:
+        return {"size": len(_cache), "ttl_seconds": CACHE_TTL_SECONDS, **cache_stats}
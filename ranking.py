@@ -0,0 +1,57 @@
+from bisect import bisect_left
+
+
+class Ranking:
+    """
+    Live players ordered by power, kept sorted incrementally.
+
+    Every power change moves one entry with a bisect instead of re-sorting
+    everyone, so the top K is always the front of the list. version only
+    changes when the top K does (someone in it changed power, left, or was
+    overtaken), which is what decides whether snapshots carry the list.
+    """
+
+    def __init__(self, k: int = 10):
+        self.k = k
+        self.keys = []    # sorted (-power, join order, player id)
+        self.key_of = {}  # player id -> its key in keys
+        self.version = 0
+        self._next_seq = 0
+
+    def update(self, player_id: str, power: int):
+        keys = self.keys
+        old = self.key_of.get(player_id)
+        if old is None:
+            seq = self._next_seq
+            self._next_seq += 1
+            old_index = None
+        else:
+            if old[0] == -power:
+                return
+            seq = old[1]
+            old_index = bisect_left(keys, old)
+            del keys[old_index]
+        key = (-power, seq, player_id)
+        new_index = bisect_left(keys, key)
+        keys.insert(new_index, key)
+        self.key_of[player_id] = key
+        if new_index < self.k or (old_index is not None and old_index < self.k):
+            self.version += 1
+
+    def remove(self, player_id: str):
+        old = self.key_of.pop(player_id, None)
+        if old is None:
+            return
+        index = bisect_left(self.keys, old)
+        del self.keys[index]
+        if index < self.k:
+            self.version += 1
+
+    def clear(self):
+        self.keys.clear()
+        self.key_of.clear()
+        self.version += 1
+
+    def top(self) -> list:
+        """[(player id, power), ...] for the top K, highest power first."""
+        return [(player_id, -negative_power) for negative_power, _, player_id in self.keys[:self.k]]
@@ -0,0 +1,219 @@
+"""
+Per-route rate limiting for the HTTP API.
+
+RateLimitMiddleware is a plain ASGI middleware added outside the logging
+middleware (only the tracing and DB profiling middlewares wrap it), so a
+request over its limit is answered with 429 before the logging middleware
+looks up the session or the route touches MongoDB or bcrypt. Limits are
+sliding-window counters (the previous window's count, weighted by how
+much of it still overlaps, plus the current one) kept per key in a
+bounded LRU table, so memory stays flat however many clients show up.
+
+Keys never need the database: the client IP (x-real-ip, as the logging
+middleware uses), a hash of the session cookie for logged-in routes, and
+for login/register the username in the JSON body.
+"""
+import hashlib
+import json
+import math
+import os
+import time
+from collections import OrderedDict
+
+from metrics import registry
+
+RATE_LIMITS_ENABLED = os.getenv("RATE_LIMITS_ENABLED", "true").lower() == "true"
+MAX_TRACKED_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "50000"))
+MAX_BODY_PEEK = 4096  # login/register bodies are tiny; anything larger is not parsed for a username
+
+# (method, path) -> {key kind: (requests, window seconds)}
+# "ip": client IP, "session": session cookie, "username": "username" field of the JSON body
+POLICIES = {
+    ("POST", "/api/login"): {"ip": (20, 60), "username": (10, 60)},
+    ("POST", "/api/register"): {"ip": (5, 60), "username": (5, 60)},
+    ("POST", "/api/getImg"): {"ip": (300, 60)},  # the game asks once per player it sees
+    ("POST", "/api/addKills"): {"ip": (60, 60), "session": (30, 60)},
+    ("POST", "/api/addDeaths"): {"ip": (60, 60), "session": (30, 60)},
+    ("POST", "/upload"): {"ip": (20, 60), "session": (10, 60)},
+}
+
+RATE_LIMITED = registry.counter("http_rate_limited_total", "Requests rejected with 429", ("route", "key"))
+
+
+class SlidingWindowLimiter:
+    """Sliding-window counters for many keys, at most max_keys of them (least recently used are evicted)."""
+
+    def __init__(self, limit: int, window: float, max_keys: int = MAX_TRACKED_KEYS, clock=time.monotonic):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self.clock = clock
+        self.entries = OrderedDict()  # key -> [window start, previous window count, current window count]
+        self.evicted = 0
+
+    def check(self, key) -> float:
+        """Returns 0 if a request for key would be allowed, else the seconds until it would be. Counts nothing."""
+        now = self.clock()
+        window = self.window
+        start = now - now % window
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = [start, 0, 0]
+            if len(self.entries) > self.max_keys:
+                self.entries.popitem(last=False)
+                self.evicted += 1
+        else:
+            self.entries.move_to_end(key)
+            if entry[0] != start:
+                # Roll over; if more than one window passed the previous one is empty
+                entry[1] = entry[2] if start - entry[0] == window else 0
+                entry[2] = 0
+                entry[0] = start
+        _, previous, current = entry
+        elapsed = now - start
+        estimate = previous * (1 - elapsed / window) + current
+        if estimate + 1 <= self.limit:
+            return 0.0
+        return self._retry_after(previous, current, elapsed)
+
+    def hit(self, key) -> float:
+        """Counts one request for key if allowed. Returns 0 if it was, else the seconds until it would be."""
+        retry_after = self.check(key)
+        if not retry_after:
+            self.entries[key][2] += 1
+        return retry_after
+
+    def _retry_after(self, previous: int, current: int, elapsed: float) -> float:
+        window = self.window
+        if current + 1 > self.limit:
+            # Wait for this window to end and enough of it to slide out
+            return (window - elapsed) + window * max(0.0, 1 - (self.limit - 1) / current)
+        # The previous window's weight has to decay far enough
+        return max(0.0, window * (1 - (self.limit - current - 1) / previous) - elapsed)
+
+
+class RateLimits:
+    """The limiters for every policy, and their counters (shown at /api/admin/ratelimits)."""
+
+    def __init__(self, policies: dict = None, enabled: bool = RATE_LIMITS_ENABLED):
+        self.enabled = enabled
+        self.limiters = {
+            f"{method} {path}": {kind: SlidingWindowLimiter(limit, window) for kind, (limit, window) in rules.items()}
+            for (method, path), rules in (POLICIES if policies is None else policies).items()
+        }
+        self.counters = {route: {"allowed": 0, "limited": 0} for route in self.limiters}
+
+    def stats(self) -> dict:
+        return {
+            route: {
+                **self.counters[route],
+                "keys": {kind: len(limiter.entries) for kind, limiter in limiters.items()},
+                "evicted": sum(limiter.evicted for limiter in limiters.values()),
+            }
+            for route, limiters in self.limiters.items()
+        }
+
+
+class RateLimitMiddleware:
+    def __init__(self, app, limits: RateLimits):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.limits.enabled:
+            return await self.app(scope, receive, send)
+        route = f"{scope['method']} {scope['path']}"
+        limiters = self.limits.limiters.get(route)
+        if limiters is None:
+            return await self.app(scope, receive, send)
+
+        if "username" in limiters:
+            body, receive = await _buffer_body(receive)
+        else:
+            body = None
+        headers = _headers(scope)
+        counters = self.limits.counters[route]
+        keyed = []
+        for kind, limiter in limiters.items():
+            key = _key(kind, scope, headers, body)
+            if key is not None:
+                keyed.append((kind, limiter, key))
+        # Check every limit before counting any, so a request one limit rejects uses up none of the others
+        for kind, limiter, key in keyed:
+            retry_after = limiter.check(key)
+            if retry_after:
+                counters["limited"] += 1
+                RATE_LIMITED.inc(1, scope["path"], kind)
+                return await _too_many_requests(send, retry_after)
+        for _, limiter, key in keyed:
+            limiter.hit(key)
+        counters["allowed"] += 1
+        await self.app(scope, receive, send)
+
+
+def _headers(scope) -> dict:
+    return {name.decode("latin-1"): value.decode("latin-1") for name, value in scope.get("headers", [])}
+
+
+def _key(kind: str, scope, headers: dict, body: bytes):
+    if kind == "ip":
+        client = scope.get("client")
+        return headers.get("x-real-ip", client[0] if client else "unknown")
+    if kind == "session":
+        for part in headers.get("cookie", "").split(";"):
+            name, _, value = part.strip().partition("=")
+            if name == "session_token" and value:
+                return hashlib.sha256(value.encode()).hexdigest()
+        return None  # not logged in; the route rejects it without any DB work
+    if kind == "username":
+        if not body or len(body) > MAX_BODY_PEEK:
+            return None
+        try:
+            username = json.loads(body).get("username")
+        except (ValueError, AttributeError):
+            return None
+        return username.lower() if isinstance(username, str) else None
+    raise ValueError(f"Unknown rate limit key: {kind}")
+
+
+async def _buffer_body(receive):
+    """Reads the request body and returns it with a receive callable that replays it to the app."""
+    chunks = []
+    size = 0
+    more = True
+    while more:
+        message = await receive()
+        if message["type"] != "http.request":
+            # Client went away; hand the message on untouched
+            async def replay_disconnect(message=message):
+                return message
+            return None, replay_disconnect
+        chunk = message.get("body", b"")
+        chunks.append(chunk)
+        size += len(chunk)
+        more = message.get("more_body", False)
+    body = b"".join(chunks)
+    sent = False
+
+    async def replay():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+
+    return body if size <= MAX_BODY_PEEK else None, replay
+
+
+async def _too_many_requests(send, retry_after: float):
+    body = json.dumps({"detail": "Too many requests, slow down."}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 429,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,72 @@
+"""
+Resume tokens for /ws/game.
+
+Every player gets a random resume token in their "id" message. When their
+socket drops, game_ws keeps the player in clients (hidden and out of
+collisions) for RESUME_GRACE_SECONDS instead of removing them, and the
+token becomes redeemable: a client that reconnects with
+/ws/game?resume=<token>&tick=<last snapshot tick> gets the same player back
+without a session lookup or an admission slot, plus only the pellets that
+changed since that tick. Tokens are single use; each resume hands out a
+new one. Players not resumed in time are removed as before.
+"""
+import os
+import secrets
+import time
+
+RESUME_GRACE_SECONDS = float(os.getenv("RESUME_GRACE_SECONDS", "20"))  # 0 removes players on disconnect
+# Pellet changes are resent from this many ticks before the client's last snapshot, so
+# food messages that raced that snapshot are covered too (re-sending a pellet is harmless)
+RESUME_SLACK_TICKS = 5
+
+
+class ResumeRegistry:
+    def __init__(self, grace: float = RESUME_GRACE_SECONDS, clock=time.monotonic):
+        self.grace = grace
+        self.clock = clock
+        self.tokens = {}    # player id -> current token
+        self.detached = {}  # token -> (player id, expires at), for players whose socket dropped
+        self.counters = {"detached": 0, "resumed": 0, "expired": 0, "rejected": 0}
+
+    def issue(self, player_id: str) -> str:
+        """New token for a connected player (replaces their previous one)."""
+        token = secrets.token_urlsafe(24)
+        self.tokens[player_id] = token
+        return token
+
+    def detach(self, player_id: str):
+        """The player's socket dropped: their token can be redeemed until the grace period ends."""
+        token = self.tokens.get(player_id)
+        if token is not None:
+            self.detached[token] = (player_id, self.clock() + self.grace)
+            self.counters["detached"] += 1
+
+    def take(self, token: str):
+        """Redeems a token. Returns the player id, or None if it is unknown, used or expired."""
+        entry = self.detached.get(token)
+        if entry is None or entry[1] < self.clock():
+            self.counters["rejected"] += 1
+            return None  # an expired entry stays until expired() hands it over for removal
+        del self.detached[token]
+        self.counters["resumed"] += 1
+        return entry[0]
+
+    def expired(self) -> list:
+        """Player ids whose grace period ran out; their tokens are dropped."""
+        now = self.clock()
+        gone = [token for token, (_, expires_at) in self.detached.items() if expires_at < now]
+        player_ids = []
+        for token in gone:
+            player_ids.append(self.detached.pop(token)[0])
+        self.counters["expired"] += len(player_ids)
+        return player_ids
+
+    def discard(self, player_id: str):
+        """Forgets a player who is gone for good."""
+        token = self.tokens.pop(player_id, None)
+        if token is not None:
+            self.detached.pop(token, None)
+
+    def stats(self) -> dict:
+        return {"grace_seconds": self.grace, "players": len(self.tokens), "waiting": len(self.detached),
+                **self.counters}
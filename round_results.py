@@ -0,0 +1,110 @@
+"""
+Per-round results and time-windowed leaderboards.
+
+Every finished round is stored once as a compact document in
+round_results. At the same time each player's score is added with $inc to
+one bucket per window (the hour, day and week the round ended in), so a
+window's leaderboard is a single indexed read of the top N bucket
+documents, however many rounds have been played.
+"""
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+
+from database import round_results_collection, leaderboard_buckets_collection
+
+# Window name -> (bucket length, how long its buckets are kept)
+WINDOWS = {
+    "hourly": (timedelta(hours=1), timedelta(days=2)),
+    "daily": (timedelta(days=1), timedelta(days=30)),
+    "weekly": (timedelta(weeks=1), timedelta(weeks=26)),
+}
+MAX_LEADERBOARD_SIZE = 100
+
+_indexes_ready = False
+
+
+def ensure_indexes():
+    """Creates the indexes the window reads and bucket upserts rely on. Blocking, runs once."""
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    # Top N of one bucket: equality on window and bucket, then walk score downwards
+    leaderboard_buckets_collection.create_index(
+        [("window", ASCENDING), ("bucket", ASCENDING), ("score", DESCENDING)], name="window_bucket_score")
+    # One document per user and bucket, which is what the $inc upserts match on
+    leaderboard_buckets_collection.create_index(
+        [("window", ASCENDING), ("bucket", ASCENDING), ("username", ASCENDING)],
+        name="window_bucket_username", unique=True)
+    # Old buckets and rounds are dropped by MongoDB once expires_at has passed
+    leaderboard_buckets_collection.create_index("expires_at", name="expires_at_ttl", expireAfterSeconds=0)
+    round_results_collection.create_index("expires_at", name="expires_at_ttl", expireAfterSeconds=0)
+    _indexes_ready = True
+
+
+def bucket_start(window: str, when: datetime) -> datetime:
+    """Start of the bucket of `window` that `when` falls in (UTC; weeks start on Monday)."""
+    when = when.astimezone(timezone.utc)
+    if window == "hourly":
+        return when.replace(minute=0, second=0, microsecond=0)
+    day = when.replace(hour=0, minute=0, second=0, microsecond=0)
+    if window == "daily":
+        return day
+    if window == "weekly":
+        return day - timedelta(days=day.weekday())
+    raise ValueError(f"Unknown leaderboard window: {window}")
+
+
+def record_round(results: list, winner: str, started_at: datetime, ended_at: datetime):
+    """
+    Stores one finished round and adds its scores to the window buckets. Blocking.
+
+    results is [(username, score, kills), ...] for the registered players
+    still in the game when it ended; guests are not tracked.
+    """
+    ensure_indexes()
+    results = [(username, score, kills) for username, score, kills in results if username]
+    if not results:
+        return
+    longest_retention = max(retention for _, retention in WINDOWS.values())
+    round_results_collection.insert_one({
+        "started_at": started_at,
+        "ended_at": ended_at,
+        "winner": winner,
+        "players": [{"u": username, "s": score, "k": kills} for username, score, kills in results],
+        "expires_at": ended_at + longest_retention,
+    })
+
+    operations = []
+    for window, (length, retention) in WINDOWS.items():
+        bucket = bucket_start(window, ended_at)
+        for username, score, kills in results:
+            operations.append(UpdateOne(
+                {"window": window, "bucket": bucket, "username": username},
+                {
+                    "$inc": {"score": score, "rounds": 1, "kills": kills, "wins": 1 if username == winner else 0},
+                    "$max": {"best_round": score},
+                    "$setOnInsert": {"expires_at": bucket + length + retention},
+                },
+                upsert=True,
+            ))
+    leaderboard_buckets_collection.bulk_write(operations, ordered=False)
+
+
+def top_players(window: str, limit: int = 20, when: datetime = None) -> dict:
+    """Top `limit` players of the current (or `when`'s) bucket of `window`. Blocking."""
+    ensure_indexes()
+    bucket = bucket_start(window, when or datetime.now(timezone.utc))
+    length, _ = WINDOWS[window]
+    players = list(
+        leaderboard_buckets_collection.find(
+            {"window": window, "bucket": bucket},
+            {"_id": 0, "username": 1, "score": 1, "rounds": 1, "wins": 1, "kills": 1, "best_round": 1},
+        ).sort("score", DESCENDING).limit(min(limit, MAX_LEADERBOARD_SIZE))
+    )
+    return {
+        "window": window,
+        "start": bucket.isoformat(),
+        "end": (bucket + length).isoformat(),
+        "players": players,
+    }
@@ -0,0 +1,387 @@
+"""
+Optional out-of-process simulation (SIMULATION_PROCESS=true).
+
+The game rules (simulation.py) run in a child process on their own 30 Hz
+clock, so tick timing no longer depends on request traffic and the rules
+get a core of their own. The server process keeps the sockets, HTTP, the
+database and a mirror of the world that snapshots are built from.
+
+The two processes share one multiprocessing.shared_memory block of
+fixed-size arrays with an entry per player slot:
+- inputs (x, y and a move counter), written by the server on every move;
+- entity state (x, y, power, kills, flags), written by the simulation
+  after each tick into one of two banks in turn, so the server reads a
+  complete tick while the next one is being written. Each bank also holds
+  the tick it was last completed for (-1 while it is being written), so a
+  server that fell two ticks behind notices the bank was reused instead of
+  reading half of one tick and half of another.
+A pipe carries everything else. The server sends commands (join, leave,
+detach, protect, new round), and the simulation answers every completed
+tick with a frame: the tick number, the bank holding its state and what
+happened (pickups, kills, respawns, spawned pellets). The frame is the
+tick signal; the server's event loop wakes when the pipe becomes readable.
+"""
+import asyncio
+import multiprocessing
+import os
+import random
+import struct
+import time
+from collections import deque
+from multiprocessing import shared_memory
+
+from food_field import FoodField
+from link_rate import TICK_HZ
+from simulation import Simulation
+
+SIMULATION_PROCESS = os.getenv("SIMULATION_PROCESS", "false").lower() == "true"
+
+# Bits of the flags array
+RESPAWNING = 1
+INVULNERABLE = 2
+
+INPUT_FIELDS = (("x", "d"), ("y", "d"), ("moves", "q"))
+STATE_FIELDS = (("x", "d"), ("y", "d"), ("power", "q"), ("kills", "q"), ("flags", "B"))
+BANKS = 2
+ITEM_STRIDE = 8  # every array gets 8 bytes per slot so all of them stay aligned
+
+
+class SharedWorld:
+    """The per-slot arrays, as memoryviews into one shared memory block (created when name is None)."""
+
+    def __init__(self, slots: int, name: str = None):
+        self.slots = slots
+        self.inputs = {}
+        self.banks = [{} for _ in range(BANKS)]
+        layout = [(self.inputs, field, fmt) for field, fmt in INPUT_FIELDS]
+        for bank in self.banks:
+            layout.extend((bank, field, fmt) for field, fmt in STATE_FIELDS)
+        size = len(layout) * ITEM_STRIDE * slots + ITEM_STRIDE * BANKS
+        self.shm = shared_memory.SharedMemory(name=name, create=name is None, size=size)
+        self.bank_ticks = self.shm.buf[:ITEM_STRIDE * BANKS].cast("q")  # tick each bank holds
+        self._views = [self.bank_ticks]
+        offset = ITEM_STRIDE * BANKS
+        for arrays, field, fmt in layout:
+            view = self.shm.buf[offset:offset + struct.calcsize(fmt) * slots].cast(fmt)
+            arrays[field] = view
+            self._views.append(view)
+            offset += ITEM_STRIDE * slots
+
+    def close(self):
+        for view in self._views:
+            view.release()  # SharedMemory.close fails while views are exported
+        self._views = []
+        self.inputs = {}
+        self.banks = []
+        self.bank_ticks = None
+        self.shm.close()
+
+
+# --- Simulation process ---
+
+def _run(name: str, slots: int, conn, config: tuple):
+    """Entry point of the child process: ticks until told to stop or the server goes away."""
+    world = SharedWorld(slots, name)
+    width, height, food_capacity, food_target, food_respawn = config
+    rng = random.Random()
+    simulation = Simulation(width, height, FoodField(food_capacity, food_target, food_respawn, width, height, rng),
+                            rng=rng)
+    simulation.food.reset()
+    players = simulation.players  # slot -> player state
+    inputs = world.inputs
+    seen = {}  # slot -> input move counter last applied
+    period = 1 / TICK_HZ
+    tick = 0
+    next_at = last = time.monotonic()
+    try:
+        while True:
+            frame = {"collected": [], "left": []}
+            if tick == 0:
+                frame["food_reset"] = True
+            while conn.poll():
+                command = conn.recv()
+                kind = command[0]
+                if kind == "stop":
+                    return
+                if kind == "join":
+                    slot = command[1]
+                    simulation.add_player(slot)
+                    seen[slot] = inputs["moves"][slot]  # whatever an earlier occupant sent is stale
+                elif kind == "leave":
+                    simulation.remove_player(command[1])
+                    frame["left"].append(command[1])
+                elif kind == "detach":
+                    if command[1] in players and command[2]:
+                        simulation.detach(command[1])
+                    elif command[1] in players:
+                        simulation.attach(command[1])
+                elif kind == "protect":
+                    for player in players.values():  # round over: nobody can be eaten until the reset
+                        player["isInvulnerable"] = True
+                        player["is_respawning"] = False
+                elif kind == "reset":
+                    simulation.food.reset()
+                    simulation.reset_players()
+                    frame["food_reset"] = True
+
+            started = time.monotonic()
+            moves, xs, ys = inputs["moves"], inputs["x"], inputs["y"]
+            for slot, player in players.items():
+                if moves[slot] != seen[slot]:  # only a new move; an old one would undo respawns and resets
+                    seen[slot] = moves[slot]
+                    player["x"] = xs[slot]
+                    player["y"] = ys[slot]
+                    collected = simulation.collect_food(slot)
+                    if collected:
+                        frame["collected"].append((slot, collected))
+            frame["kills"] = simulation.resolve_collisions()
+            frame["respawned"] = simulation.update_timers()
+            spawned = simulation.food.replenish(started - last)
+            last = started
+            food = simulation.food
+            if spawned:
+                frame["spawned"] = food.encode_spawns(spawned)
+            if "food_reset" in frame:
+                frame["food_reset"] = food.encode_spawns([i for i in range(food.capacity) if food.alive[i]])
+
+            bank = tick % BANKS
+            state = world.banks[bank]
+            world.bank_ticks[bank] = -1
+            for slot, player in players.items():
+                state["x"][slot] = player["x"]
+                state["y"][slot] = player["y"]
+                state["power"][slot] = player["power"]
+                state["kills"][slot] = player.get("round_kills", 0)
+                state["flags"][slot] = ((RESPAWNING if player.get("is_respawning") else 0)
+                                        | (INVULNERABLE if player.get("isInvulnerable") else 0))
+            tick += 1
+            world.bank_ticks[bank] = tick
+            frame["tick"] = tick
+            frame["bank"] = bank
+            frame["busy"] = time.monotonic() - started
+            conn.send(frame)
+
+            next_at += period
+            delay = next_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_at = time.monotonic()  # fell behind: carry on from now rather than bursting to catch up
+    except (EOFError, BrokenPipeError, KeyboardInterrupt):
+        pass  # the server is gone
+    finally:
+        world.close()
+
+
+# --- Server side ---
+
+class SimulationProcess:
+    """Starts the simulation process and translates between player ids and shared-memory slots."""
+
+    def __init__(self, width: int, height: int, food_capacity: int, food_target: int, food_respawn: float):
+        self.config = (width, height, food_capacity, food_target, food_respawn)
+        self.world = None
+        self.process = None
+        self.conn = None
+        self.running = False
+        self.slot_of = {}     # player id -> slot
+        self.player_at = []   # slot -> player id, None while free or leaving
+        self.free = []
+        self.on_freed = {}    # slot -> callback for when the process confirms it left
+        self.frames = deque()
+        self._wakeup = asyncio.Event()
+        self._reset_waiters = []
+        self.tick = 0
+        self.counters = {"frames": 0, "commands": 0, "max_backlog": 0, "busy_seconds": 0.0, "max_busy_seconds": 0.0}
+
+    def start(self, slots: int):
+        """Starts the process with room for slots players. Needs a running event loop."""
+        if self.running:
+            return
+        self.world = SharedWorld(slots)
+        self.player_at = [None] * slots
+        self.free = list(range(slots - 1, -1, -1))
+        self.slot_of = {}
+        self.on_freed = {}
+        self.frames.clear()
+        # spawn, not fork: the server has threads (pymongo, the stall watchdog) and an event loop
+        context = multiprocessing.get_context("spawn")
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_run, args=(self.world.shm.name, slots, child_conn, self.config),
+                                       name="simulation", daemon=True)
+        try:
+            self.process.start()
+        except Exception:
+            self.conn.close()
+            self.world.close()
+            self.world.shm.unlink()
+            raise
+        finally:
+            child_conn.close()
+        asyncio.get_running_loop().add_reader(self.conn.fileno(), self._on_readable)
+        self.running = True
+        print(f"Simulation process {self.process.pid} started with {slots} player slots.")
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        try:
+            asyncio.get_running_loop().remove_reader(self.conn.fileno())
+        except RuntimeError:
+            pass  # no loop any more
+        try:
+            self.conn.send(("stop",))
+        except OSError:
+            pass
+        self.process.join(timeout=2)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+        self.world.close()
+        self.world.shm.unlink()
+        self._free_leaving()
+        self.reset_applied()
+        self._wakeup.set()
+
+    def _on_readable(self):
+        try:
+            while self.conn.poll():
+                frame = self.conn.recv()
+                for slot in frame["left"]:
+                    self._freed(slot)  # nothing from the old occupant can arrive after this
+                self.frames.append(frame)
+        except (EOFError, OSError):
+            print("Simulation process exited unexpectedly.")
+            asyncio.get_running_loop().remove_reader(self.conn.fileno())
+            self.running = False
+            self._free_leaving()
+            self.reset_applied()  # nobody is going to apply one now
+        self.counters["max_backlog"] = max(self.counters["max_backlog"], len(self.frames))
+        self._wakeup.set()
+
+    def _freed(self, slot: int):
+        self.free.append(slot)
+        callback = self.on_freed.pop(slot, None)
+        if callback is not None:
+            callback()
+
+    def _free_leaving(self):
+        """No confirmation is coming any more: every slot still leaving is free."""
+        for slot in list(self.on_freed):
+            self._freed(slot)
+
+    def _send(self, *command):
+        if self.running:
+            self.conn.send(command)
+            self.counters["commands"] += 1
+
+    async def next_frames(self) -> list:
+        """Waits for the next completed tick; returns every frame received since the last call ([] once stopped)."""
+        while not self.frames and self.running:
+            self._wakeup.clear()
+            await self._wakeup.wait()
+        frames = list(self.frames)
+        self.frames.clear()
+        for frame in frames:
+            self.tick = frame["tick"]
+            self.counters["frames"] += 1
+            self.counters["busy_seconds"] += frame["busy"]
+            self.counters["max_busy_seconds"] = max(self.counters["max_busy_seconds"], frame["busy"])
+        return frames
+
+    # --- Commands ---
+
+    def join(self, player_id: str):
+        slot = self.free.pop()
+        self.slot_of[player_id] = slot
+        self.player_at[slot] = player_id
+        self._send("join", slot)
+
+    def leave(self, player_id: str, on_freed=None):
+        """
+        Removes a player. Their slot is reused once the process confirms
+        (frame["left"]); on_freed() is called then, or right away if the
+        player had no slot or the process is not running.
+        """
+        slot = self.slot_of.pop(player_id, None)
+        if slot is None or not self.running:
+            if slot is not None:
+                self.player_at[slot] = None
+                self.free.append(slot)
+            if on_freed is not None:
+                on_freed()
+            return
+        self.player_at[slot] = None
+        if on_freed is not None:
+            self.on_freed[slot] = on_freed
+        self._send("leave", slot)
+
+    def set_detached(self, player_id: str, detached: bool):
+        if player_id in self.slot_of:
+            self._send("detach", self.slot_of[player_id], detached)
+
+    def protect_all(self):
+        self._send("protect")
+
+    def move(self, player_id: str, x: float, y: float):
+        slot = self.slot_of.get(player_id)
+        if slot is not None and self.running:
+            inputs = self.world.inputs
+            inputs["x"][slot] = x
+            inputs["y"][slot] = y
+            inputs["moves"][slot] += 1
+
+    async def reset_round(self):
+        """New pellets and players back to power 1; returns once a frame with the new world was applied."""
+        waiter = asyncio.get_running_loop().create_future()
+        self._reset_waiters.append(waiter)
+        self._send("reset")
+        if self.running:
+            await waiter
+
+    def reset_applied(self):
+        """Called by the server once it applied a frame carrying "food_reset"."""
+        for waiter in self._reset_waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+        self._reset_waiters = []
+
+    # --- Reading state ---
+
+    def player(self, slot: int):
+        """Player id in slot, or None if it left meanwhile."""
+        return self.player_at[slot]
+
+    def read_players(self, bank: int, tick: int):
+        """
+        (player id, x, y, power, kills, flags) of every player, from the
+        state bank of the given tick. None if the process already started
+        overwriting that bank with a later tick.
+        """
+        if self.world.bank_ticks[bank] != tick:
+            return None
+        state = self.world.banks[bank]
+        xs, ys, powers, kills, flags = state["x"], state["y"], state["power"], state["kills"], state["flags"]
+        players = [(player_id, xs[slot], ys[slot], powers[slot], kills[slot], flags[slot])
+                   for player_id, slot in self.slot_of.items()]
+        if self.world.bank_ticks[bank] != tick:
+            return None  # overwritten while we read it
+        return players
+
+    def stats(self) -> dict:
+        frames = self.counters["frames"]
+        return {
+            "running": self.running,
+            "pid": self.process.pid if self.process is not None else None,
+            "tick": self.tick,
+            "slots": len(self.player_at),
+            "players": len(self.slot_of),
+            "leaving": len(self.on_freed),
+            "backlog": len(self.frames),
+            "frames": frames,
+            "commands": self.counters["commands"],
+            "max_backlog": self.counters["max_backlog"],
+            "avg_busy_ms": round(self.counters["busy_seconds"] * 1000 / frames, 3) if frames else 0.0,
+            "max_busy_ms": round(self.counters["max_busy_seconds"] * 1000, 3),
+        }
@@ -0,0 +1,277 @@
+"""
+Game rules without sockets, asyncio or the database.
+
+main.py runs one Simulation over the live clients dict and handles the
+side effects (messages, stats, achievements) of the events it returns.
+tools/simulate.py steps one headless as fast as the CPU allows. All
+randomness comes from the injected rng and all timers from the injected
+clock, so two runs with the same seed and clock produce the same game.
+"""
+import random
+import time
+
+from food_field import FoodField
+from ranking import Ranking
+
+WORLD_WIDTH = 1920 * 9    # 9x9 background tiles, same as main.worldWidth
+WORLD_HEIGHT = 1080 * 9
+PICKUP_RADIUS = 50
+COLLISION_DISTANCE = 75
+RESPAWN_DELAY = 10            # seconds a player who was eaten waits before respawning
+INVULNERABILITY_SECONDS = 10  # after joining, respawning and round resets; matches game.js
+# Collision broad-phase cell size; at least COLLISION_DISTANCE so every overlap is in a neighbouring cell
+CELL_SIZE = 128
+LEADERBOARD_SIZE = 10
+# After the top K changes, snapshots carry it for this many ticks so that clients on
+# every snapshot rate (30 Hz ticks, slowest rate 5 Hz) get at least one of them
+LEADERBOARD_REPEAT_TICKS = 6
+# ...and every this many ticks regardless, so a client that dropped a frame catches up
+LEADERBOARD_REFRESH_TICKS = 60
+# Minimap overview: 3x3 cells per background tile of the 9x9 world, plus markers for the top players
+MINIMAP_COLUMNS = 27
+MINIMAP_ROWS = 27
+MINIMAP_MARKERS = 5
+
+
+class Simulation:
+    def __init__(self, width: int = WORLD_WIDTH, height: int = WORLD_HEIGHT, food: FoodField = None,
+                 rng: random.Random = None, clock=time.monotonic, players: dict = None):
+        self.width = width
+        self.height = height
+        self.rng = rng or random.Random()
+        self.clock = clock
+        self.food = food if food is not None else FoodField(0, 0, 0, width, height, self.rng)
+        # player id -> state dict; main.py passes its clients dict so the rules work on it directly
+        self.players = players if players is not None else {}
+        self.ranking = Ranking(LEADERBOARD_SIZE)
+        self.rerank()
+        self._leaderboard_version = None
+        self._leaderboard = []
+        self._snapshot_leaderboard_version = None
+        self._leaderboard_changed_tick = 0
+
+    def add_player(self, player_id: str, username: str = None) -> dict:
+        """Adds a player in the centre of the world, invulnerable for a while (as in game_ws)."""
+        self.players[player_id] = {
+            "x": self.width / 2,
+            "y": self.height / 2,
+            "power": 1,
+            "username": username,
+            "is_respawning": False,
+            "isInvulnerable": False,
+        }
+        self.join(player_id)
+        return self.players[player_id]
+
+    def join(self, player_id: str):
+        """Starts tracking a player already put in players: ranked, invulnerable for a while."""
+        self.ranking.update(player_id, self.players[player_id]["power"])
+        self.make_invulnerable(player_id)
+
+    def remove_player(self, player_id: str):
+        """Removes a player who left. Returns their state, or None if they were already gone."""
+        self.ranking.remove(player_id)
+        return self.players.pop(player_id, None)
+
+    def detach(self, player_id: str):
+        """The player's socket dropped: out of collisions, the leaderboard and the minimap until attach()."""
+        self.players[player_id]["detached"] = True
+        self.ranking.remove(player_id)
+
+    def attach(self, player_id: str):
+        """The player resumed."""
+        self.players[player_id].pop("detached", None)
+        self.ranking.update(player_id, self.players[player_id]["power"])
+
+    def rerank(self):
+        """Rebuilds the ranking from players, for code that filled or edited players directly."""
+        self.ranking.clear()
+        for player_id, player in self.players.items():
+            if not player.get("detached"):
+                self.ranking.update(player_id, player["power"])
+
+    def set_power(self, player_id: str, power: int):
+        player = self.players[player_id]
+        player["power"] = power
+        if not player.get("detached"):
+            self.ranking.update(player_id, power)
+
+    def make_invulnerable(self, player_id: str, seconds: float = INVULNERABILITY_SECONDS):
+        player = self.players[player_id]
+        player["isInvulnerable"] = True
+        player["invulnerable_until"] = self.clock() + seconds
+
+    def spawn_point(self) -> tuple:
+        return self.rng.randint(0, self.width), self.rng.randint(0, self.height)
+
+    def collect_food(self, player_id: str) -> list:
+        """Picks up every pellet within reach of the player, adding power. Returns the collected ids."""
+        player = self.players[player_id]
+        collected = self.food.collect_near(player["x"], player["y"], PICKUP_RADIUS)
+        if collected:
+            self.set_power(player_id, player["power"] + len(collected))
+        return collected
+
+    def resolve_collisions(self) -> list:
+        """
+        One collision pass over all players; the bigger one eats the smaller one.
+
+        Same rules and pairing order as checking every pair in player order,
+        but players are bucketed into a grid first so each one is only
+        compared with its neighbours. Returns (winner id, loser id) pairs.
+        """
+        players = self.players
+        order = {}
+        cell_of = {}
+        cells = {}
+        for index, (player_id, player) in enumerate(players.items()):
+            order[player_id] = index
+            # Respawning and invulnerable players cannot collide at all, nor can players
+            # whose connection dropped and who are waiting to be resumed (main.py)
+            if player.get("is_respawning", False) or player.get("isInvulnerable", False) or player.get("detached"):
+                continue
+            cell = cell_of[player_id] = (int(player["x"] // CELL_SIZE), int(player["y"] // CELL_SIZE))
+            cells.setdefault(cell, []).append(player_id)
+
+        distance_sq = COLLISION_DISTANCE * COLLISION_DISTANCE
+        processed = set()
+        events = []
+        for p1_id, (cx, cy) in cell_of.items():  # player order
+            if p1_id in processed:
+                continue
+            p1 = players[p1_id]
+            # The first colliding player in player order, as in the pairwise scan
+            p2_id = None
+            for nx in (cx - 1, cx, cx + 1):
+                for ny in (cy - 1, cy, cy + 1):
+                    for other_id in cells.get((nx, ny), ()):
+                        if other_id == p1_id or other_id in processed:
+                            continue
+                        other = players[other_id]
+                        dx = p1["x"] - other["x"]
+                        dy = p1["y"] - other["y"]
+                        if dx * dx + dy * dy < distance_sq and (p2_id is None or order[other_id] < order[p2_id]):
+                            p2_id = other_id
+            if p2_id is not None:
+                processed.add(p1_id)
+                processed.add(p2_id)
+                events.append(self._settle(p1_id, p2_id))
+        return events
+
+    def _settle(self, p1_id: str, p2_id: str) -> tuple:
+        p1 = self.players[p1_id]
+        p2 = self.players[p2_id]
+        if p1["power"] > p2["power"]:
+            winner_id, loser_id = p1_id, p2_id
+        elif p2["power"] > p1["power"]:
+            winner_id, loser_id = p2_id, p1_id
+        else:  # Tie
+            winner_id = self.rng.choice([p1_id, p2_id])
+            loser_id = p2_id if winner_id == p1_id else p1_id
+        winner = self.players[winner_id]
+        loser = self.players[loser_id]
+        # Gain the loser's power (at least 1), loser starts over after RESPAWN_DELAY
+        self.set_power(winner_id, winner["power"] + (loser["power"] if loser["power"] > 1 else 1))
+        self.set_power(loser_id, 1)
+        winner["round_kills"] = winner.get("round_kills", 0) + 1
+        loser["is_respawning"] = True
+        loser["respawn_at"] = self.clock() + RESPAWN_DELAY
+        return winner_id, loser_id
+
+    def update_timers(self) -> list:
+        """Respawns players whose delay is over and ends invulnerability. Returns the respawned ids."""
+        now = self.clock()
+        respawned = []
+        for player_id, player in self.players.items():
+            respawn_at = player.get("respawn_at")
+            if respawn_at is not None and now >= respawn_at:
+                del player["respawn_at"]
+                player["x"], player["y"] = self.spawn_point()
+                player["is_respawning"] = False
+                self.make_invulnerable(player_id)
+                respawned.append(player_id)
+            else:
+                until = player.get("invulnerable_until")
+                if until is not None and now >= until:
+                    del player["invulnerable_until"]
+                    player["isInvulnerable"] = False
+        return respawned
+
+    def reset_players(self):
+        """Round start: everyone back to power 1 at a random spot, invulnerable for a while."""
+        for player_id, player in self.players.items():
+            self.set_power(player_id, 1)
+            player["round_kills"] = 0
+            player["x"], player["y"] = self.spawn_point()
+            player["is_respawning"] = False
+            player.pop("respawn_at", None)
+            self.make_invulnerable(player_id)
+
+    def leaderboard(self) -> list:
+        """Top players as sent to clients, rebuilt only when the ranking's top K changed."""
+        if self.ranking.version != self._leaderboard_version:
+            self._leaderboard_version = self.ranking.version
+            self._leaderboard = [
+                {"id": player_id, "username": self.players[player_id].get("username"), "power": power}
+                for player_id, power in self.ranking.top()
+            ]
+        return self._leaderboard
+
+    def build_minimap(self, columns: int = MINIMAP_COLUMNS, rows: int = MINIMAP_ROWS,
+                      markers: int = MINIMAP_MARKERS) -> dict:
+        """
+        Coarse world overview: players and summed power per grid cell, as a
+        flat [cell, count, power, ...] list of the occupied cells (cell =
+        row * columns + column), and [x, y, power, ...] for the top players.
+        Its size depends on the grid, not on how many players there are.
+        """
+        scale_x = columns / self.width
+        scale_y = rows / self.height
+        counts = {}
+        power = {}
+        for player in self.players.values():
+            if player.get("is_respawning", False) or player.get("detached"):
+                continue
+            column = min(columns - 1, max(0, int(player["x"] * scale_x)))
+            row = min(rows - 1, max(0, int(player["y"] * scale_y)))
+            cell = row * columns + column
+            counts[cell] = counts.get(cell, 0) + 1
+            power[cell] = power.get(cell, 0) + player["power"]
+        cells = []
+        for cell in sorted(counts):
+            cells.extend((cell, counts[cell], power[cell]))
+        top = []
+        for player_id, player_power in self.ranking.top()[:markers]:
+            player = self.players[player_id]
+            if not player.get("is_respawning", False):
+                top.extend((round(player["x"]), round(player["y"]), player_power))
+        return {"type": "minimap", "columns": columns, "rows": rows, "cells": cells, "top": top}
+
+    def build_state(self, players_items: list, tick: int, time_remaining: float, server_time: int) -> dict:
+        """Builds the "players" snapshot sent to every client; it carries the leaderboard when that changed."""
+        state = {
+            "type": "players",
+            "players": {
+                pid: {
+                    "x": info["x"],
+                    "y": info["y"],
+                    "power": info["power"],
+                    "username": info["username"],
+                    "is_respawning": info.get("is_respawning", False),
+                    "isInvulnerable": info.get("isInvulnerable", False),
+                    "ack": info.get("input_seq", 0)  # Last input sequence applied for this player
+                }
+                for pid, info in players_items
+                if "ws" in info
+            },
+            "time_remaining": time_remaining,
+            # Lets clients order snapshots and interpolate between them
+            "tick": tick,
+            "server_time": server_time
+        }
+        if self.ranking.version != self._snapshot_leaderboard_version:
+            self._snapshot_leaderboard_version = self.ranking.version
+            self._leaderboard_changed_tick = tick
+        if tick - self._leaderboard_changed_tick < LEADERBOARD_REPEAT_TICKS or tick % LEADERBOARD_REFRESH_TICKS == 0:
+            state["leaderboard"] = self.leaderboard()
+        return state
@@ -0,0 +1,101 @@
+"""
+Spectator stream for /ws/spectate.
+
+Spectators are not in clients and take no part in the simulation. The
+broadcast loop publishes one frame every TICK_HZ / SPECTATOR_HZ ticks:
+the same "players" snapshot the players get, encoded once and turned into
+bytes once. Every spectator is handed that same bytes object, so the
+server does no per-spectator serialization (a binary frame also skips the
+str -> UTF-8 encode a text send costs per socket). Publishing is O(1):
+spectators wait on a shared event and always send the newest frame, so a
+slow one skips frames instead of queueing them. Every
+SPECTATOR_FOOD_SECONDS a full pellet list goes out the same way.
+"""
+import asyncio
+import os
+
+from link_rate import TICK_HZ
+from messaging import encode_message
+from metrics import WS_MESSAGES_SENT, WS_BYTES_SENT
+
+SPECTATOR_HZ = int(os.getenv("SPECTATOR_HZ", "5"))  # must divide TICK_HZ
+SPECTATOR_FOOD_SECONDS = 2
+MAX_SPECTATORS = int(os.getenv("MAX_SPECTATORS", "5000"))
+
+
+class SpectatorHub:
+    def __init__(self, hz: int = SPECTATOR_HZ, max_spectators: int = MAX_SPECTATORS):
+        self.every = max(1, TICK_HZ // hz)
+        self.food_every = SPECTATOR_FOOD_SECONDS * TICK_HZ
+        self.max_spectators = max_spectators
+        self.frame = None    # newest frame (bytes), shared by every spectator
+        self.frame_kind = None
+        self.version = 0
+        self._published = asyncio.Event()
+        self.spectators = 0
+        self.peak_spectators = 0
+        self.frames_published = 0
+        self.frames_sent = 0
+        self.frames_skipped = 0  # a newer frame was published before the spectator sent the last one
+        self.rejected = 0
+
+    def join(self) -> bool:
+        """Takes a spectator slot; False when MAX_SPECTATORS are already watching."""
+        if self.spectators >= self.max_spectators:
+            self.rejected += 1
+            return False
+        self.spectators += 1
+        self.peak_spectators = max(self.peak_spectators, self.spectators)
+        return True
+
+    def leave(self):
+        self.spectators -= 1
+
+    def snapshot_due(self, tick: int) -> bool:
+        return self.spectators > 0 and tick % self.every == 0
+
+    def food_due(self, tick: int) -> bool:
+        # Offset by one tick so it never replaces a snapshot frame before anyone sends it
+        return self.spectators > 0 and tick % self.food_every == 1
+
+    def publish(self, kind: str, encoded: str):
+        """Makes an encoded message the current frame and wakes every spectator."""
+        self.frame = encoded.encode()
+        self.frame_kind = kind
+        self.version += 1
+        self.frames_published += 1
+        event, self._published = self._published, asyncio.Event()
+        event.set()
+
+    def publish_food(self, food_field):
+        alive = food_field.alive
+        flat = food_field.encode_spawns([food_id for food_id in range(food_field.capacity) if alive[food_id]])
+        self.publish("food_sync", encode_message({"type": "food_sync", "food": flat}))
+
+    async def stream(self, websocket):
+        """Sends each new frame to one spectator until the socket fails; cancelled on disconnect."""
+        seen = self.version
+        while True:
+            if self.version == seen:
+                await self._published.wait()
+            if self.version - seen > 1:
+                self.frames_skipped += self.version - seen - 1
+            seen = self.version
+            frame, kind = self.frame, self.frame_kind
+            await websocket.send_bytes(frame)
+            self.frames_sent += 1
+            WS_MESSAGES_SENT.inc(1, kind)
+            WS_BYTES_SENT.inc(len(frame), kind)
+
+    def stats(self) -> dict:
+        return {
+            "spectators": self.spectators,
+            "peak_spectators": self.peak_spectators,
+            "max_spectators": self.max_spectators,
+            "hz": TICK_HZ // self.every,
+            "frames_published": self.frames_published,
+            "frames_sent": self.frames_sent,
+            "frames_skipped": self.frames_skipped,
+            "last_frame_bytes": len(self.frame) if self.frame is not None else 0,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,139 @@
+"""
+Event-loop stall detector.
+
+A heartbeat task on the event loop updates a timestamp every few
+milliseconds (and records loop lag in /metrics). A watchdog thread checks
+that timestamp; when the loop has not come back for longer than the
+threshold, the thread grabs the loop thread's current stack. That stack
+shows the call that is blocking right now, e.g. a pymongo find_one inside
+game_ws or bcrypt inside api_login. Stalls are aggregated per call site.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+
+from metrics import EVENT_LOOP_LAG_SECONDS
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def _is_project_frame(filename: str) -> bool:
+    return filename.startswith(PROJECT_ROOT) and "site-packages" not in filename
+
+
+class StallWatchdog:
+    def __init__(self, threshold: float = 0.1, heartbeat_interval: float = 0.02,
+                 logger: logging.Logger = None, max_sites: int = 200):
+        self.threshold = threshold
+        self.heartbeat_interval = heartbeat_interval
+        self.logger = logger
+        self.max_sites = max_sites
+        self.sites = {}  # site -> aggregated stats
+        self.total_stalls = 0
+        self.total_stall_seconds = 0.0
+        self._last_beat = time.perf_counter()
+        self._loop_thread_id = None
+        self._current = None  # stall being observed: (started_at, site, blocking_call, stack)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._task = None
+        self._running = False
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.perf_counter()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="stall-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _heartbeat(self):
+        interval = self.heartbeat_interval
+        while self._running:
+            before = time.perf_counter()
+            await asyncio.sleep(interval)
+            now = time.perf_counter()
+            EVENT_LOOP_LAG_SECONDS.observe(max(0.0, now - before - interval))
+            self._last_beat = now
+            if self._current is not None:
+                self._finish_stall(now)
+
+    def _watch(self):
+        # Check a few times per threshold so short stalls are still caught in the act
+        check_every = max(self.threshold / 4, 0.005)
+        while self._running:
+            time.sleep(check_every)
+            if self._current is not None:
+                continue
+            last_beat = self._last_beat
+            stalled_for = time.perf_counter() - last_beat - self.heartbeat_interval
+            if stalled_for > self.threshold:
+                frame = sys._current_frames().get(self._loop_thread_id)
+                if frame is None:
+                    continue
+                stack = traceback.extract_stack(frame)
+                if self._last_beat != last_beat:
+                    continue  # the loop came back while we were looking
+                self._current = (last_beat + self.heartbeat_interval,) + self._attribute(stack)
+
+    def _attribute(self, stack):
+        """Returns (site, blocking_call, formatted stack) for the innermost project frame."""
+        innermost = stack[-1]
+        blocking_call = f"{os.path.basename(innermost.filename)}:{innermost.lineno} in {innermost.name}"
+        site = blocking_call
+        for entry in reversed(stack):
+            if _is_project_frame(entry.filename) and not entry.filename.endswith("stall_watchdog.py"):
+                site = f"{os.path.relpath(entry.filename, PROJECT_ROOT)}:{entry.lineno} in {entry.name}"
+                break
+        return site, blocking_call, "".join(traceback.format_list(stack[-15:]))
+
+    def _finish_stall(self, resumed_at: float):
+        started_at, site, blocking_call, stack = self._current
+        self._current = None
+        duration = max(0.0, resumed_at - started_at)
+        with self._lock:
+            self.total_stalls += 1
+            self.total_stall_seconds += duration
+            stats = self.sites.get(site)
+            if stats is None:
+                if len(self.sites) >= self.max_sites:
+                    # Keep memory bounded: forget the site that has cost the least
+                    del self.sites[min(self.sites, key=lambda s: self.sites[s]["total_seconds"])]
+                stats = self.sites[site] = {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0,
+                                            "blocking_call": blocking_call, "stack": stack}
+            stats["count"] += 1
+            stats["total_seconds"] += duration
+            if duration >= stats["max_seconds"]:
+                stats["max_seconds"] = duration
+                stats["blocking_call"] = blocking_call
+                stats["stack"] = stack
+        if self.logger is not None:
+            self.logger.warning(f"Event loop stalled {duration * 1000:.1f} ms at {site} "
+                                f"(blocking in {blocking_call})\n{stack}")
+
+    def report(self, limit: int = 20) -> dict:
+        with self._lock:
+            sites = sorted(self.sites.items(), key=lambda item: item[1]["total_seconds"], reverse=True)
+            return {
+                "threshold_ms": self.threshold * 1000,
+                "stalls": self.total_stalls,
+                "stall_seconds": self.total_stall_seconds,
+                "sites": [{"site": site, **stats} for site, stats in sites[:limit]],
+            }
+
+    def reset(self):
+        with self._lock:
+            self.sites.clear()
+            self.total_stalls = 0
+            self.total_stall_seconds = 0.0
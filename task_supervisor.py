@@ -0,0 +1,199 @@
+"""
+Owner of the game's fire-and-forget background tasks.
+
+Everything the game used to start with a bare asyncio.create_task
+(achievement checks, "eaten" / "respawn" messages) goes through
+TaskSupervisor.spawn instead:
+- every task is referenced until it finishes, and its exception is logged;
+- each category runs at most its limit of tasks at once; the rest wait as
+  not-yet-created coroutine factories in a bounded queue;
+- spawns with a key (e.g. the username for an achievement check) are
+  coalesced: while one is queued or running, later ones only replace the
+  arguments of a single follow-up run, so a player collecting fifty
+  pellets in a second costs two checks instead of fifty;
+- tasks are grouped by room, and per-connection work (sends to one
+  player) by owner, the player id; cancel_owner() drops a departed
+  player's queued and running tasks. Work that must outlive the socket,
+  like achievement checks, has no owner.
+"""
+import asyncio
+import os
+import traceback
+from collections import deque
+
+from admission import ROOM
+
+# Tasks of a category that may run at once
+CATEGORY_LIMITS = {
+    "achievements": int(os.getenv("TASK_LIMIT_ACHIEVEMENTS", "8")),        # each does a users find_one
+    "score_achievements": int(os.getenv("TASK_LIMIT_ACHIEVEMENTS", "8")),
+    "messages": int(os.getenv("TASK_LIMIT_MESSAGES", "256")),              # one-off sends to a player
+}
+DEFAULT_LIMIT = 32
+MAX_QUEUED = int(os.getenv("TASK_QUEUE_SIZE", "1000"))  # per category; the oldest waiting job is dropped
+
+
+class _Job:
+    __slots__ = ("category", "factory", "owner", "key", "room", "task", "rerun", "cancelled")
+
+    def __init__(self, category, factory, owner, key, room):
+        self.category = category
+        self.factory = factory  # called with no arguments to create the coroutine
+        self.owner = owner
+        self.key = key
+        self.room = room
+        self.task = None
+        self.rerun = None       # factory of a coalesced spawn that arrived while this one ran
+        self.cancelled = False
+
+
+class _Category:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.running = set()
+        self.queue = deque()
+        self.peak = 0
+        self.counters = {"spawned": 0, "started": 0, "coalesced": 0, "completed": 0, "failed": 0,
+                         "cancelled": 0, "dropped": 0}
+
+
+class TaskSupervisor:
+    def __init__(self, limits: dict = None, default_limit: int = DEFAULT_LIMIT, max_queued: int = MAX_QUEUED):
+        self.limits = CATEGORY_LIMITS if limits is None else limits
+        self.default_limit = default_limit
+        self.max_queued = max_queued
+        self.categories = {}
+        self.keyed = {}   # (category, key) -> job queued or running for that key
+        self.owners = {}  # owner -> set of its queued and running jobs
+        self.peak_live = 0
+
+    def _category(self, name: str) -> _Category:
+        category = self.categories.get(name)
+        if category is None:
+            category = self.categories[name] = _Category(self.limits.get(name, self.default_limit))
+        return category
+
+    def spawn(self, category: str, factory, owner=None, key=None, room: str = ROOM):
+        """
+        Runs factory() as a background task of category, now or once the
+        category has a free slot. With a key, a spawn that finds one for the
+        same (category, key) queued or running is merged into it. Returns
+        the task if one was started right away, else None.
+        """
+        group = self._category(category)
+        group.counters["spawned"] += 1
+        if key is not None:
+            existing = self.keyed.get((category, key))
+            if existing is not None and existing.owner == owner:  # never inherit another owner's cancellation
+                group.counters["coalesced"] += 1
+                if existing.task is None:
+                    existing.factory = factory  # still waiting: run with the newest arguments
+                else:
+                    existing.rerun = factory    # running: run once more afterwards
+                return None
+        job = _Job(category, factory, owner, key, room)
+        if key is not None:
+            self.keyed[(category, key)] = job  # a job of another owner for the key runs on, uncoalesced
+        if owner is not None:
+            self.owners.setdefault(owner, set()).add(job)
+        if len(group.running) < group.limit:
+            self._start(job, group)
+            return job.task
+        if len(group.queue) >= self.max_queued:
+            self._forget(group.queue.popleft())
+            group.counters["dropped"] += 1
+        group.queue.append(job)
+        return None
+
+    def _start(self, job: _Job, group: _Category):
+        job.task = asyncio.create_task(job.factory())
+        job.task.add_done_callback(lambda task, job=job: self._finished(job))
+        group.running.add(job)
+        group.counters["started"] += 1
+        group.peak = max(group.peak, len(group.running))
+        self.peak_live = max(self.peak_live, self.live())
+
+    def _finished(self, job: _Job):
+        group = self.categories[job.category]
+        group.running.discard(job)
+        task = job.task
+        if task.cancelled():
+            group.counters["cancelled"] += 1
+        elif task.exception() is not None:
+            group.counters["failed"] += 1
+            error = task.exception()
+            print(f"Background task {job.category} ({job.key or job.owner}) failed: {error}")
+            traceback.print_exception(type(error), error, error.__traceback__)
+        else:
+            group.counters["completed"] += 1
+
+        if job.rerun is not None and not job.cancelled:
+            job.factory, job.rerun, job.task = job.rerun, None, None
+            group.queue.appendleft(job)  # it already waited its turn once
+        else:
+            self._forget(job)
+        while group.queue and len(group.running) < group.limit:
+            waiting = group.queue.popleft()
+            if not waiting.cancelled:
+                self._start(waiting, group)
+
+    def _forget(self, job: _Job):
+        if job.key is not None and self.keyed.get((job.category, job.key)) is job:
+            del self.keyed[(job.category, job.key)]
+        if job.owner is not None:
+            jobs = self.owners.get(job.owner)
+            if jobs is not None:
+                jobs.discard(job)
+                if not jobs:
+                    del self.owners[job.owner]
+
+    def cancel_owner(self, owner) -> int:
+        """Cancels every queued and running task of owner (a disconnected player). Returns how many."""
+        jobs = self.owners.pop(owner, ())
+        for job in jobs:
+            job.cancelled = True
+            job.rerun = None
+            if job.task is not None:
+                job.task.cancel()  # _finished counts it
+            else:
+                group = self.categories[job.category]
+                group.queue.remove(job)
+                group.counters["cancelled"] += 1
+                if job.key is not None and self.keyed.get((job.category, job.key)) is job:
+                    del self.keyed[(job.category, job.key)]
+        return len(jobs)
+
+    def cancel_all(self):
+        for group in self.categories.values():
+            for job in group.queue:
+                job.cancelled = True
+            group.queue.clear()
+            for job in list(group.running):
+                job.rerun = None
+                job.task.cancel()
+        self.keyed.clear()
+        self.owners.clear()
+
+    def live(self) -> int:
+        return sum(len(group.running) for group in self.categories.values())
+
+    def stats(self) -> dict:
+        rooms = {}
+        for group in self.categories.values():
+            for job in group.running:
+                rooms[job.room] = rooms.get(job.room, 0) + 1
+        return {
+            "live": self.live(),
+            "peak_live": self.peak_live,
+            "queued": sum(len(group.queue) for group in self.categories.values()),
+            "owners": len(self.owners),
+            "live_by_room": rooms,
+            "categories": {
+                name: {"limit": group.limit, "running": len(group.running), "queued": len(group.queue),
+                       "peak": group.peak, **group.counters}
+                for name, group in self.categories.items()
+            },
+        }
+
+
+task_supervisor = TaskSupervisor()
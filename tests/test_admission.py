@@ -0,0 +1,86 @@
+import asyncio
+
+from admission import AdmissionController
+
+
+def test_admits_up_to_the_room_cap():
+    admission = AdmissionController(max_players=10, max_per_room=2)
+    assert admission.try_admit("a") and admission.try_admit("a")
+    assert not admission.try_admit("a")
+    assert admission.try_admit("b")
+    admission.release("a")
+    assert admission.try_admit("a")
+    assert admission.stats()["rooms"] == {"a": 2, "b": 1}
+
+
+def test_process_cap_applies_across_rooms():
+    admission = AdmissionController(max_players=2, max_per_room=2)
+    assert admission.try_admit("a") and admission.try_admit("b")
+    assert not admission.try_admit("c")
+
+
+def test_connect_rate_per_ip():
+    admission = AdmissionController(connect_rate=0.001, connect_burst=2)
+    assert admission.allow_connect("1.2.3.4") and admission.allow_connect("1.2.3.4")
+    assert not admission.allow_connect("1.2.3.4")
+    assert admission.allow_connect("5.6.7.8")
+    assert admission.counters["rejected_rate"] == 1
+
+
+def test_queued_client_gets_the_released_slot_in_order():
+    async def scenario():
+        admission = AdmissionController(max_players=1, max_per_room=1, queue_timeout=5)
+        assert await admission.admit()
+        positions = []
+
+        async def on_wait(position):
+            positions.append(position)
+
+        first = asyncio.ensure_future(admission.admit(on_wait=on_wait))
+        second = asyncio.ensure_future(admission.admit())
+        await asyncio.sleep(0)
+        assert not admission.try_admit()  # nobody jumps the queue
+        admission.release()
+        assert await first
+        assert not second.done()
+        admission.release()
+        assert await second
+        return admission, positions
+
+    admission, positions = asyncio.run(scenario())
+    assert positions == [1]
+    assert admission.players == 1
+    assert admission.counters["admitted_from_queue"] == 2
+
+
+def test_full_queue_and_timeout_turn_clients_away():
+    async def scenario():
+        admission = AdmissionController(max_players=1, max_per_room=1, queue_size=1, queue_timeout=0.05)
+        assert await admission.admit()
+        waiting = asyncio.ensure_future(admission.admit())
+        await asyncio.sleep(0)
+        assert not await admission.admit()  # queue full
+        assert not await waiting             # timed out
+        return admission
+
+    admission = asyncio.run(scenario())
+    assert admission.counters["rejected_full"] == 1
+    assert admission.counters["queue_timeouts"] == 1
+    assert admission.stats()["waiting"] == 0
+
+
+def test_abandoned_wait_leaves_the_queue():
+    async def scenario():
+        admission = AdmissionController(max_players=1, max_per_room=1, queue_timeout=5)
+        assert await admission.admit()
+        waiting = asyncio.ensure_future(admission.admit())
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        admission.release()
+        return admission
+
+    admission = asyncio.run(scenario())
+    assert admission.players == 0
+    assert admission.counters["queue_abandoned"] == 1
+    assert not admission.waiting
@@ -0,0 +1,119 @@
+import random
+
+from food_field import FoodField
+
+
+def make_field(capacity=100, target=50, rate=10.0, seed=1):
+    return FoodField(capacity, target, rate, 1000, 1000, random.Random(seed), cell_size=100)
+
+
+def live_ids(field):
+    return {food_id for food_id in range(field.capacity) if field.alive[food_id]}
+
+
+def test_reset_fills_to_target_with_lowest_ids():
+    field = make_field()
+    field.reset()
+    assert field.count == 50
+    assert live_ids(field) == set(range(50))
+
+
+def test_removed_ids_are_reused():
+    field = make_field()
+    field.reset()
+    assert field.remove(7)
+    assert not field.remove(7)
+    assert field.count == 49
+    assert field.spawn(1) == [7]
+
+
+def test_spawn_never_exceeds_capacity():
+    field = make_field(capacity=10, target=10)
+    field.reset()
+    assert field.spawn(5) == []
+    assert field.count == 10
+
+
+def test_replenish_respects_rate_and_target():
+    field = make_field(rate=10.0)
+    field.reset()
+    for food_id in range(20):
+        field.remove(food_id)
+    assert len(field.replenish(0.25)) == 2   # 2.5 pellets owed, the half carries over
+    assert len(field.replenish(0.25)) == 3
+    assert len(field.replenish(100)) == 15  # never above the target
+    assert field.replenish(100) == []
+
+
+def test_collect_near_matches_a_full_scan():
+    field = make_field(capacity=2000, target=2000, seed=5)
+    field.reset()
+    rng = random.Random(9)
+    for _ in range(200):
+        x, y, radius = rng.uniform(-50, 1050), rng.uniform(-50, 1050), rng.choice((10, 50, 150))
+        expected = sorted(food_id for food_id in live_ids(field)
+                          if (x - field.xs[food_id]) ** 2 + (y - field.ys[food_id]) ** 2 < radius * radius)
+        assert field.collect_near(x, y, radius) == expected
+        assert not any(field.alive[food_id] for food_id in expected)
+
+
+def test_changes_since_reports_removed_and_spawned():
+    field = make_field()
+    field.stamp = 1
+    field.reset()
+    field.stamp = 5
+    field.remove(3)
+    spawned = field.spawn(1)
+    assert spawned == [3]
+    field.remove(4)
+    removed, flat = field.changes_since(4)
+    assert removed == [4]
+    assert flat == [3, field.xs[3], field.ys[3]]
+    assert field.changes_since(5) == ([], [])
+    assert field.changes_since(1) is None  # reset at stamp 1: full list needed
+
+
+def test_encode_spawns_and_to_list_agree():
+    field = make_field()
+    field.reset()
+    flat = field.encode_spawns([0, 1])
+    listed = field.to_list()[:2]
+    assert flat == [listed[0]["id"], listed[0]["x"], listed[0]["y"], listed[1]["id"], listed[1]["x"], listed[1]["y"]]
+
+
+def rebuilt(field):
+    """The free list, count and cell grid a full rebuild would give."""
+    cells = {}
+    for food_id in live_ids(field):
+        cells.setdefault(field._cell(food_id), set()).add(food_id)
+    return sorted(f for f in range(field.capacity) if not field.alive[f]), field.capacity - len(field.free), cells
+
+
+def test_place_updates_only_the_given_slots():
+    field = make_field()
+    field.reset()
+    field.remove(10)
+    field.remove(20)
+    field.place([10, 5, 5, 30, 999, 999, 5000, 1, 1])  # spawn, move a live pellet, ignore an id out of range
+    assert field.alive[10] and not field.alive[20]
+    assert (field.xs[30], field.ys[30]) == (999, 999)
+    assert field.count == 49
+    free, count, cells = rebuilt(field)
+    assert sorted(field.free) == free
+    assert field.count == count
+    assert field.cells == cells
+    assert 30 in field.collect_near(999, 999, 1)
+
+
+def test_place_with_reset_replaces_the_field():
+    field = make_field()
+    field.reset()
+    field.stamp = 3
+    field.place([4, 1, 1, 7, 2, 2], reset=True)
+    assert live_ids(field) == {4, 7}
+    assert field.count == 2
+    assert field.reset_stamp == 3
+    free, _, cells = rebuilt(field)
+    assert sorted(field.free) == free
+    assert field.cells == cells
+    assert field.spawn(1) == [0]
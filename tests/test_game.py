@@ -0,0 +1,87 @@
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tools"))
+import memdb  # noqa: E402
+
+memdb.install()
+import main  # noqa: E402
+
+
+@pytest.fixture
+def game():
+    main.clients.clear()
+    main.simulation.rerank()
+    yield main
+    main.task_supervisor.cancel_all()
+    main.clients.clear()
+    main.simulation.rerank()
+
+
+def add_user(username):
+    main.users_collection.insert_one({"username": username, "total_score_lifetime": 0, "games_played": 0,
+                                      "players_eaten_lifetime": 0, "unlocked_achievements": []})
+    main.playerStats_collection.insert_one(
+        {"username": username, "gamesWon": 0, "deaths": 0, "kills": 0, "pellets": 0})
+
+
+async def settle():
+    await main.tick_scheduler.drain()
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+def test_leaving_does_not_cancel_a_running_score_achievement_check(game, monkeypatch):
+    check = main.check_in_game_score_achievements
+    gate = asyncio.Event()
+
+    async def slow_check(*args):
+        await gate.wait()  # still talking to the database when the player leaves
+        await check(*args)
+
+    monkeypatch.setattr(main, "check_in_game_score_achievements", slow_check)
+
+    async def scenario():
+        add_user("leaver")
+        game.simulation.add_player("leaver-id", "leaver")
+        game.simulation.set_power("leaver-id", 40)
+        game.check_pickup_achievements("leaver-id")
+        deferred = asyncio.ensure_future(main.tick_scheduler.drain())
+        await asyncio.sleep(0)
+        assert main.task_supervisor.live() == 1
+        await game.finalize_player("leaver-id")
+        gate.set()
+        await deferred
+        await settle()
+
+    asyncio.run(scenario())
+    user = main.users_collection.find_one({"username": "leaver"})
+    assert "score_30" in user["unlocked_achievements"]
+
+
+def test_achievement_check_waits_for_a_stats_flush_still_writing(game, monkeypatch):
+    bulk_write = main.users_collection.bulk_write
+
+    def slow_bulk_write(*args, **kwargs):
+        time.sleep(0.1)  # longer than a tick's budget
+        return bulk_write(*args, **kwargs)
+
+    monkeypatch.setattr(main.users_collection, "bulk_write", slow_bulk_write)
+
+    async def scenario():
+        add_user("hunter")
+        game.simulation.add_player("hunter-id", "hunter")
+        game.simulation.add_player("prey-id")
+        game.handle_kill("hunter-id", "prey-id")
+        for _ in range(3):
+            await main.tick_scheduler.run(time.monotonic())
+        await settle()
+
+    asyncio.run(scenario())
+    user = main.users_collection.find_one({"username": "hunter"})
+    assert user["players_eaten_lifetime"] == 1
+    assert "eaten_1" in user["unlocked_achievements"]
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from ingest import InputIngestor
+
+
+def offer(ingestor, text):
+    ingestor._offer(text)
+    return ingestor.latest
+
+
+@pytest.fixture
+def ingestor():
+    return InputIngestor(None, rate=1000, burst=1000, width=1000, height=500)
+
+
+def test_valid_input_is_kept(ingestor):
+    data = offer(ingestor, json.dumps({"x": 10, "y": "20.5", "seq": 3}))
+    assert data == {"x": 10.0, "y": 20.5, "seq": 3}
+    assert ingestor.accepted == 1
+
+
+@pytest.mark.parametrize("text", [
+    '{"x": NaN, "y": 1}',
+    '{"x": 1, "y": Infinity}',
+    '{"x": -Infinity, "y": 1}',
+    '{"x": "nan", "y": 1}',
+    '{"x": 1, "y": 1, "seq": 1e999}',
+    '{"x": 1}',
+    '[1, 2]',
+    'not json',
+])
+def test_malformed_input_is_dropped(ingestor, text):
+    assert offer(ingestor, text) is None
+    assert ingestor.malformed == 1
+    assert ingestor.accepted == 0
+
+
+def test_positions_are_clamped_to_the_world(ingestor):
+    data = offer(ingestor, json.dumps({"x": -50, "y": 1e300}))
+    assert (data["x"], data["y"]) == (0.0, 500.0)
+
+
+def test_newer_input_replaces_unapplied_one(ingestor):
+    offer(ingestor, json.dumps({"x": 1, "y": 1}))
+    data = offer(ingestor, json.dumps({"x": 2, "y": 2}))
+    assert data["x"] == 2.0
+    assert ingestor.coalesced == 1
+
+
+def test_rate_limit_drops_excess_messages():
+    ingestor = InputIngestor(None, rate=0.001, burst=2)
+    for _ in range(5):
+        ingestor._offer(json.dumps({"x": 1, "y": 1}))
+    assert ingestor.accepted == 2
+    assert ingestor.rate_limited == 3
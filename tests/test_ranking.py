@@ -0,0 +1,67 @@
+import random
+
+from ranking import Ranking
+
+
+def test_top_is_ordered_by_power_then_join_order():
+    ranking = Ranking(k=3)
+    for player_id, power in [("a", 1), ("b", 5), ("c", 5), ("d", 2)]:
+        ranking.update(player_id, power)
+    assert ranking.top() == [("b", 5), ("c", 5), ("d", 2)]
+
+
+def test_power_change_keeps_join_order_for_ties():
+    ranking = Ranking(k=3)
+    ranking.update("a", 1)
+    ranking.update("b", 1)
+    ranking.update("a", 3)
+    ranking.update("a", 1)
+    assert ranking.top() == [("a", 1), ("b", 1)]
+
+
+def test_version_only_changes_with_the_top_k():
+    ranking = Ranking(k=2)
+    ranking.update("a", 10)
+    ranking.update("b", 9)
+    version = ranking.version
+    ranking.update("c", 1)
+    ranking.update("c", 2)
+    ranking.update("a", 10)  # unchanged power
+    ranking.remove("c")
+    ranking.remove("missing")
+    assert ranking.version == version
+
+    ranking.update("c", 20)  # overtakes into the top
+    assert ranking.version > version
+    version = ranking.version
+    ranking.remove("a")
+    assert ranking.version > version
+    assert ranking.top() == [("c", 20), ("b", 9)]
+
+
+def test_matches_a_full_sort_after_random_changes():
+    rng = random.Random(5)
+    ranking = Ranking(k=10)
+    powers = {}
+    joined = []
+    for _ in range(2000):
+        player_id = f"p{rng.randrange(60)}"
+        if player_id in powers and rng.random() < 0.1:
+            ranking.remove(player_id)
+            del powers[player_id]
+            joined.remove(player_id)
+            continue
+        if player_id not in powers:
+            joined.append(player_id)
+        powers[player_id] = rng.randint(1, 30)
+        ranking.update(player_id, powers[player_id])
+    expected = sorted(powers, key=lambda player_id: (-powers[player_id], joined.index(player_id)))[:10]
+    assert ranking.top() == [(player_id, powers[player_id]) for player_id in expected]
+
+
+def test_clear_empties_and_bumps_version():
+    ranking = Ranking()
+    ranking.update("a", 1)
+    version = ranking.version
+    ranking.clear()
+    assert ranking.top() == [] and ranking.version > version
@@ -0,0 +1,83 @@
+import asyncio
+import json
+
+from rate_limit import RateLimits, RateLimitMiddleware, SlidingWindowLimiter
+
+
+class Clock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_allows_up_to_the_limit_then_reports_retry_after():
+    clock = Clock()
+    limiter = SlidingWindowLimiter(3, 60, clock=clock)
+    assert [limiter.hit("a") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.hit("a") == 60.0 + 60 * (1 - 2 / 3)
+    assert limiter.hit("b") == 0.0
+
+
+def test_previous_window_slides_out():
+    clock = Clock()
+    limiter = SlidingWindowLimiter(4, 60, clock=clock)
+    for _ in range(4):
+        limiter.hit("a")
+    clock.now = 60 + 15  # previous window still weighs 3/4: 3 + 0 of 4 used
+    assert limiter.hit("a") == 0.0
+    assert limiter.hit("a")
+    clock.now = 60 + 45  # weighs 1/4 now: 1 + 1
+    assert limiter.hit("a") == 0.0
+    clock.now = 300  # long idle: nothing carries over
+    assert [limiter.hit("a") for _ in range(4)] == [0.0] * 4
+
+
+def test_check_counts_nothing():
+    limiter = SlidingWindowLimiter(1, 60, clock=Clock())
+    assert limiter.check("a") == 0.0
+    assert limiter.check("a") == 0.0
+    assert limiter.hit("a") == 0.0
+    assert limiter.check("a") > 0
+
+
+def test_least_recently_used_keys_are_evicted():
+    limiter = SlidingWindowLimiter(1, 60, max_keys=2, clock=Clock())
+    limiter.hit("a")
+    limiter.hit("b")
+    limiter.hit("a")
+    limiter.hit("c")
+    assert list(limiter.entries) == ["a", "c"]
+    assert limiter.evicted == 1
+
+
+def request(app, username, ip="1.1.1.1"):
+    scope = {"type": "http", "method": "POST", "path": "/api/login", "headers": [(b"x-real-ip", ip.encode())],
+             "client": (ip, 1234)}
+    body = json.dumps({"username": username}).encode()
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return sent[0]["status"]
+
+
+def test_request_rejected_by_one_limit_uses_none_of_the_others():
+    async def ok(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+
+    limits = RateLimits({("POST", "/api/login"): {"ip": (3, 60), "username": (1, 60)}})
+    app = RateLimitMiddleware(ok, limits)
+    assert request(app, "victim") == 200
+    assert [request(app, "victim") for _ in range(5)] == [429] * 5
+    # The username limit turned those away; the IP budget is still there
+    assert request(app, "other") == 200
+    assert request(app, "third") == 200
+    assert request(app, "fourth") == 429
+    assert limits.counters["POST /api/login"] == {"allowed": 3, "limited": 6}
@@ -0,0 +1,55 @@
+from resume import ResumeRegistry
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_only_redeems_after_a_detach_and_only_once():
+    registry = ResumeRegistry(grace=20, clock=Clock())
+    token = registry.issue("p1")
+    assert registry.take(token) is None  # still connected
+    registry.detach("p1")
+    assert registry.take(token) == "p1"
+    assert registry.take(token) is None
+    assert registry.counters == {"detached": 1, "resumed": 1, "expired": 0, "rejected": 2}
+
+
+def test_issue_replaces_the_previous_token():
+    registry = ResumeRegistry(grace=20, clock=Clock())
+    old = registry.issue("p1")
+    new = registry.issue("p1")
+    assert old != new
+    registry.detach("p1")
+    assert registry.take(old) is None
+    assert registry.take(new) == "p1"
+
+
+def test_grace_period_expires():
+    clock = Clock()
+    registry = ResumeRegistry(grace=20, clock=clock)
+    token = registry.issue("p1")
+    registry.issue("p2")
+    registry.detach("p1")
+    clock.now = 19
+    assert registry.expired() == []
+    clock.now = 21
+    assert registry.take(token) is None
+    assert registry.expired() == ["p1"]
+    assert registry.expired() == []
+    assert registry.stats()["waiting"] == 0
+
+
+def test_discard_forgets_the_player():
+    registry = ResumeRegistry(grace=20, clock=Clock())
+    token = registry.issue("p1")
+    registry.detach("p1")
+    registry.discard("p1")
+    assert registry.take(token) is None
+    assert registry.stats()["players"] == 0 and not registry.detached
+    registry.detach("p1")  # unknown player: nothing to redeem
+    assert not registry.detached
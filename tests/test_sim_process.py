@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+from sim_process import SimulationProcess
+
+
+async def frames_until(process, predicate, limit=60):
+    for _ in range(limit):
+        frames = await asyncio.wait_for(process.next_frames(), 5)
+        if predicate(frames):
+            return frames
+    raise AssertionError("condition not met")
+
+
+def run(scenario):
+    async def wrapper():
+        process = SimulationProcess(1000, 1000, 50, 20, 10)
+        process.start(1)
+        try:
+            return await scenario(process)
+        finally:
+            process.stop()
+    return asyncio.run(wrapper())
+
+
+def test_slot_is_reused_only_after_the_process_confirms_the_leave():
+    async def scenario(process):
+        freed = []
+        process.join("a")
+        process.leave("a", on_freed=lambda: freed.append("a"))
+        assert freed == [] and process.stats()["leaving"] == 1
+        with pytest.raises(IndexError):
+            process.join("b")  # what admission now prevents: nothing is free until the confirmation
+        await frames_until(process, lambda frames: any(frame["left"] for frame in frames))
+        assert freed == ["a"]
+        process.join("b")
+        assert process.slot_of == {"b": 0}
+
+    run(scenario)
+
+
+def position(process, frame):
+    players = process.read_players(frame["bank"], frame["tick"])
+    return None if players is None else players[0][1:3]
+
+
+def test_moves_show_up_in_the_newest_bank_only_while_it_holds_that_tick():
+    async def scenario(process):
+        process.join("a")
+        await frames_until(process, lambda frames: True)
+        process.move("a", 123.0, 456.0)
+        frames = await frames_until(process, lambda frames: position(process, frames[-1]) == (123.0, 456.0))
+        newest = frames[-1]
+        await frames_until(process, lambda frames: frames[-1]["tick"] >= newest["tick"] + 2)
+        assert position(process, newest) is None  # the bank was reused
+
+    run(scenario)
+
+
+def test_leave_when_not_running_frees_right_away():
+    process = SimulationProcess(1000, 1000, 50, 20, 10)
+    freed = []
+    process.leave("nobody", on_freed=lambda: freed.append(True))
+    assert freed == [True]
@@ -0,0 +1,162 @@
+import copy
+import random
+
+import pytest
+
+from food_field import FoodField
+from simulation import Simulation, COLLISION_DISTANCE, RESPAWN_DELAY, INVULNERABILITY_SECONDS
+
+WIDTH = HEIGHT = 2000
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def random_players(rng, n):
+    """Players packed closely enough that many overlap, with plenty of power ties."""
+    players = {}
+    for i in range(n):
+        players[f"p{i}"] = {
+            "x": rng.uniform(0, 600), "y": rng.uniform(0, 600), "power": rng.randint(1, 4), "username": None,
+            "is_respawning": rng.random() < 0.1, "isInvulnerable": rng.random() < 0.1, "detached": rng.random() < 0.05,
+        }
+    return players
+
+
+def pairwise_collisions(players, rng):
+    """The O(n^2) scan the server used before the grid: every pair in player order."""
+    ids = list(players)
+    processed = set()
+    events = []
+    for p1_id in ids:
+        if p1_id in processed:
+            continue
+        for p2_id in ids:
+            if p1_id == p2_id or p2_id in processed:
+                continue
+            p1, p2 = players[p1_id], players[p2_id]
+            if any(p.get("is_respawning") or p.get("isInvulnerable") or p.get("detached") for p in (p1, p2)):
+                continue
+            if ((p1["x"] - p2["x"]) ** 2 + (p1["y"] - p2["y"]) ** 2) ** 0.5 < COLLISION_DISTANCE:
+                processed.add(p1_id)
+                processed.add(p2_id)
+                if p1["power"] > p2["power"]:
+                    winner_id, loser_id = p1_id, p2_id
+                elif p2["power"] > p1["power"]:
+                    winner_id, loser_id = p2_id, p1_id
+                else:
+                    winner_id = rng.choice([p1_id, p2_id])
+                    loser_id = p2_id if winner_id == p1_id else p1_id
+                players[winner_id]["power"] += players[loser_id]["power"] if players[loser_id]["power"] > 1 else 1
+                players[loser_id]["power"] = 1
+                players[loser_id]["is_respawning"] = True
+                events.append((winner_id, loser_id))
+                break
+    return events
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_grid_collisions_match_the_pairwise_scan(seed):
+    players = random_players(random.Random(seed), 120)
+    expected_players = copy.deepcopy(players)
+    expected = pairwise_collisions(expected_players, random.Random(seed))
+
+    simulation = Simulation(WIDTH, HEIGHT, rng=random.Random(seed), clock=Clock(), players=players)
+    assert simulation.resolve_collisions() == expected
+    for player_id, player in players.items():
+        assert player["power"] == expected_players[player_id]["power"]
+        assert player["is_respawning"] == expected_players[player_id]["is_respawning"]
+
+
+def run_game(seed):
+    clock = Clock()
+    rng = random.Random(seed)
+    simulation = Simulation(WIDTH, HEIGHT, FoodField(500, 300, 20, WIDTH, HEIGHT, rng), rng=rng, clock=clock)
+    simulation.food.reset()
+    for i in range(30):
+        simulation.add_player(f"p{i}")
+    moves = random.Random(seed + 1000)
+    for _ in range(900):
+        clock.now += 1 / 30
+        simulation.update_timers()
+        simulation.food.replenish(1 / 30)
+        for player_id, player in simulation.players.items():
+            player["x"] = min(WIDTH, max(0, player["x"] + moves.uniform(-40, 40)))
+            player["y"] = min(HEIGHT, max(0, player["y"] + moves.uniform(-40, 40)))
+            simulation.collect_food(player_id)
+        simulation.resolve_collisions()
+    return ({pid: (p["x"], p["y"], p["power"], p["is_respawning"]) for pid, p in simulation.players.items()},
+            simulation.food.to_list())
+
+
+def test_same_seed_same_game():
+    assert run_game(3) == run_game(3)
+    assert run_game(3) != run_game(4)
+
+
+def test_respawn_and_invulnerability_timers():
+    clock = Clock()
+    simulation = Simulation(WIDTH, HEIGHT, rng=random.Random(1), clock=clock)
+    big = simulation.add_player("big")
+    small = simulation.add_player("small")
+    simulation.set_power("big", 5)
+    small["x"] = big["x"] + 10
+    assert simulation.resolve_collisions() == []  # both just joined: invulnerable
+
+    clock.now = INVULNERABILITY_SECONDS
+    simulation.update_timers()
+    assert not big["isInvulnerable"] and not small["isInvulnerable"]
+    assert simulation.resolve_collisions() == [("big", "small")]
+    assert (big["power"], small["power"], big["round_kills"]) == (6, 1, 1)
+    assert small["is_respawning"]
+
+    clock.now += RESPAWN_DELAY - 0.1
+    assert simulation.update_timers() == []
+    clock.now += 0.2
+    assert simulation.update_timers() == ["small"]
+    assert not small["is_respawning"] and small["isInvulnerable"]
+
+
+def test_collect_food_adds_power_and_ranks():
+    simulation = Simulation(WIDTH, HEIGHT, FoodField(10, 0, 0, WIDTH, HEIGHT, random.Random(1)), rng=random.Random(1),
+                            clock=Clock())
+    simulation.food.place([0, 100, 100, 1, 110, 100, 2, 900, 900])
+    simulation.add_player("a")["x"] = 100
+    simulation.players["a"]["y"] = 100
+    simulation.add_player("b")
+    assert simulation.collect_food("a") == [0, 1]
+    assert simulation.players["a"]["power"] == 3
+    assert [entry["id"] for entry in simulation.leaderboard()] == ["a", "b"]
+
+
+def test_minimap_counts_players_per_cell():
+    simulation = Simulation(WIDTH, HEIGHT, rng=random.Random(1), clock=Clock())
+    for player_id, (x, y) in {"a": (10, 10), "b": (20, 20), "c": (1990, 1990)}.items():
+        player = simulation.add_player(player_id)
+        player["x"], player["y"] = x, y
+    minimap = simulation.build_minimap(columns=2, rows=2, markers=2)
+    assert minimap["cells"] == [0, 2, 2, 3, 1, 1]
+    assert len(minimap["top"]) == 6
+
+
+def test_detached_players_leave_the_leaderboard_and_minimap_until_they_resume():
+    simulation = Simulation(WIDTH, HEIGHT, rng=random.Random(1), clock=Clock())
+    for player_id, (x, y, power) in {"away": (10, 10, 9), "here": (1990, 1990, 2)}.items():
+        player = simulation.add_player(player_id)
+        player["x"], player["y"] = x, y
+        simulation.set_power(player_id, power)
+    simulation.detach("away")
+    simulation.set_power("away", 1)  # e.g. a round reset while away
+    assert [entry["id"] for entry in simulation.leaderboard()] == ["here"]
+    minimap = simulation.build_minimap(columns=2, rows=2, markers=2)
+    assert minimap["cells"] == [3, 1, 2]
+    assert minimap["top"] == [1990, 1990, 2]
+
+    simulation.attach("away")
+    assert [entry["id"] for entry in simulation.leaderboard()] == ["here", "away"]
+    assert simulation.build_minimap(columns=2, rows=2, markers=2)["cells"] == [0, 1, 1, 3, 1, 2]
@@ -0,0 +1,177 @@
+import asyncio
+
+from task_supervisor import TaskSupervisor
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_category_limit_queues_the_rest():
+    async def scenario():
+        supervisor = TaskSupervisor(limits={"work": 2})
+        gate = asyncio.Event()
+        finished = []
+
+        def job(n):
+            async def run():
+                await gate.wait()
+                finished.append(n)
+            return run
+
+        started = [supervisor.spawn("work", job(n)) for n in range(5)]
+        assert [task is not None for task in started] == [True, True, False, False, False]
+        assert supervisor.stats()["categories"]["work"]["queued"] == 3
+        gate.set()
+        await settle()
+        return supervisor, finished
+
+    supervisor, finished = asyncio.run(scenario())
+    assert finished == [0, 1, 2, 3, 4]
+    work = supervisor.stats()["categories"]["work"]
+    assert (work["peak"], work["completed"], supervisor.live()) == (2, 5, 0)
+
+
+def test_keyed_spawns_coalesce_into_one_rerun_with_the_newest_arguments():
+    async def scenario():
+        supervisor = TaskSupervisor()
+        gate = asyncio.Event()
+        calls = []
+
+        def check(n):
+            async def run():
+                calls.append(n)
+                await gate.wait()
+            return run
+
+        for n in range(50):
+            supervisor.spawn("achievements", check(n), key="alice")
+        await settle()
+        gate.set()
+        await settle()
+        return supervisor, calls
+
+    supervisor, calls = asyncio.run(scenario())
+    assert calls == [0, 49]
+    assert supervisor.stats()["categories"]["achievements"]["coalesced"] == 49
+    assert not supervisor.keyed
+
+
+def test_cancel_owner_drops_queued_and_running_tasks():
+    async def scenario():
+        supervisor = TaskSupervisor(limits={"messages": 1})
+        ran = []
+
+        def send(n):
+            async def run():
+                ran.append(n)
+                await asyncio.sleep(10)
+            return run
+
+        supervisor.spawn("messages", send(1), owner="p1")
+        supervisor.spawn("messages", send(2), owner="p1")
+        supervisor.spawn("messages", send(3), owner="p2")
+        await settle()
+        assert supervisor.cancel_owner("p1") == 2
+        await settle()
+        running = [job.owner for job in supervisor.categories["messages"].running]
+        supervisor.cancel_all()
+        await settle()
+        return supervisor, ran, running
+
+    supervisor, ran, running = asyncio.run(scenario())
+    assert ran == [1, 3]
+    assert running == ["p2"]
+    assert supervisor.stats()["categories"]["messages"]["cancelled"] == 3
+    assert supervisor.live() == 0 and not supervisor.owners
+
+
+def test_failures_are_counted_and_logged(capsys):
+    async def scenario():
+        supervisor = TaskSupervisor()
+
+        async def broken():
+            raise RuntimeError("boom")
+
+        supervisor.spawn("work", broken)
+        await settle()
+        return supervisor
+
+    supervisor = asyncio.run(scenario())
+    assert supervisor.stats()["categories"]["work"]["failed"] == 1
+    assert "boom" in capsys.readouterr().out
+
+
+def test_full_queue_drops_the_oldest_waiting_job():
+    async def scenario():
+        supervisor = TaskSupervisor(limits={"work": 1}, max_queued=2)
+        gate = asyncio.Event()
+        ran = []
+
+        def job(n):
+            async def run():
+                ran.append(n)
+                await gate.wait()
+            return run
+
+        for n in range(4):
+            supervisor.spawn("work", job(n))
+        gate.set()
+        await settle()
+        return supervisor, ran
+
+    supervisor, ran = asyncio.run(scenario())
+    assert ran == [0, 2, 3]
+    assert supervisor.stats()["categories"]["work"]["dropped"] == 1
+
+
+def test_cancelled_queued_jobs_leave_the_queue_right_away():
+    async def scenario():
+        supervisor = TaskSupervisor(limits={"messages": 1}, max_queued=2)
+        gate = asyncio.Event()
+        ran = []
+
+        def send(n):
+            async def run():
+                ran.append(n)
+                await gate.wait()
+            return run
+
+        supervisor.spawn("messages", send(0), owner="p0")
+        supervisor.spawn("messages", send(1), owner="gone")
+        supervisor.spawn("messages", send(2), owner="gone")
+        supervisor.cancel_owner("gone")
+        assert supervisor.stats()["queued"] == 0
+        supervisor.spawn("messages", send(3), owner="p3")
+        supervisor.spawn("messages", send(4), owner="p4")  # fits: nothing dead takes up the queue
+        gate.set()
+        await settle()
+        return supervisor, ran
+
+    supervisor, ran = asyncio.run(scenario())
+    assert ran == [0, 3, 4]
+    assert supervisor.stats()["categories"]["messages"]["dropped"] == 0
+
+
+def test_spawns_of_another_owner_are_not_coalesced_into_a_cancelled_job():
+    async def scenario():
+        supervisor = TaskSupervisor(limits={"work": 1})
+        gate = asyncio.Event()
+        ran = []
+
+        def job(n):
+            async def run():
+                ran.append(n)
+                await gate.wait()
+            return run
+
+        supervisor.spawn("work", job("blocker"))
+        supervisor.spawn("work", job("old"), owner="old-socket", key="alice")
+        supervisor.spawn("work", job("new"), owner="new-socket", key="alice")
+        supervisor.cancel_owner("old-socket")
+        gate.set()
+        await settle()
+        return ran
+
+    assert asyncio.run(scenario()) == ["blocker", "new"]
@@ -0,0 +1,162 @@
+import asyncio
+import contextvars
+import time
+
+from tick_scheduler import TickScheduler, FORCED_PER_TICK
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def costly(clock, log, name, seconds):
+    def job():
+        clock.now += seconds
+        log.append(name)
+    return job
+
+
+def test_jobs_run_by_priority_then_age_within_the_budget():
+    clock = Clock()
+    scheduler = TickScheduler(budget=0.010, starvation=10, clock=clock)
+    log = []
+    scheduler.defer("achievements", costly(clock, log, "a1", 0.001))
+    scheduler.defer("scores", costly(clock, log, "s1", 0.001))
+    scheduler.defer("stats", costly(clock, log, "st", 0.001))
+    scheduler.defer("achievements", costly(clock, log, "a2", 0.001))
+    asyncio.run(scheduler.run(clock.now))
+    assert log == ["st", "s1", "a1", "a2"]
+    assert scheduler.stats()["queued"] == 0
+
+
+def test_work_that_does_not_fit_waits_for_a_later_tick():
+    clock = Clock()
+    scheduler = TickScheduler(budget=0.010, starvation=10, clock=clock)
+    log = []
+    for n in range(5):
+        scheduler.defer("stats", costly(clock, log, n, 0.004))
+    asyncio.run(scheduler.run(clock.now))
+    assert log == [0, 1]  # the third would not fit in what is left
+    assert scheduler.counters["carried_over"] == 1
+    asyncio.run(scheduler.run(clock.now))
+    assert log == [0, 1, 2, 3]
+
+
+def test_starved_jobs_are_forced_a_few_per_tick():
+    clock = Clock()
+    scheduler = TickScheduler(budget=0.010, starvation=2, clock=clock)
+    log = []
+    for n in range(4):
+        scheduler.defer("achievements", costly(clock, log, n, 0.004))
+    asyncio.run(scheduler.run(clock.now))
+    assert log == [0, 1]
+    clock.now += 3
+    asyncio.run(scheduler.run(clock.now - 1))  # the tick's own work used the whole budget
+    assert log == [0, 1, 2, 3]  # over budget, but waiting past the starvation limit
+    assert scheduler.stats()["categories"]["achievements"]["forced"] == FORCED_PER_TICK
+
+
+def test_keyed_jobs_coalesce_and_run_with_the_newest_function():
+    clock = Clock()
+    scheduler = TickScheduler(clock=clock)
+    log = []
+    scheduler.defer("stats", lambda: log.append("old"), key="flush")
+    scheduler.defer("stats", lambda: log.append("new"), key="flush")
+    asyncio.run(scheduler.drain())
+    assert log == ["new"]
+    assert scheduler.stats()["categories"]["stats"]["coalesced"] == 1
+
+
+def test_full_queue_drops_the_least_urgent_newest_job():
+    clock = Clock()
+    scheduler = TickScheduler(max_queued=2, clock=clock)
+    log = []
+    scheduler.defer("stats", lambda: log.append("stats"))
+    scheduler.defer("achievements", lambda: log.append("old achievement"))
+    scheduler.defer("achievements", lambda: log.append("new achievement"))
+    asyncio.run(scheduler.drain())
+    assert log == ["stats", "new achievement"]
+    assert scheduler.stats()["categories"]["achievements"]["dropped"] == 1
+
+
+def test_awaitables_overrunning_the_budget_keep_running_in_the_background(capsys):
+    async def scenario():
+        scheduler = TickScheduler(budget=0.01)
+        done = asyncio.Event()
+
+        async def slow():
+            await done.wait()
+
+        async def broken():
+            raise RuntimeError("boom")
+
+        scheduler.defer("stats", slow)
+        scheduler.defer("scores", broken)
+        await scheduler.run(time.monotonic())
+        assert len(scheduler.background) == 1
+        done.set()
+        await scheduler.run(time.monotonic())
+        await asyncio.sleep(0)
+        return scheduler
+
+    scheduler = asyncio.run(scenario())
+    assert not scheduler.background
+    assert scheduler.stats()["categories"]["stats"]["overran"] == 1
+    assert scheduler.stats()["categories"]["scores"]["failed"] == 1
+    assert "boom" in capsys.readouterr().out
+
+
+def test_full_queue_never_drops_stats_or_scores(capsys):
+    clock = Clock()
+    scheduler = TickScheduler(max_queued=2, clock=clock)
+    log = []
+    scheduler.defer("achievements", lambda: log.append("achievement"))
+    for n in range(3):
+        scheduler.defer("scores", lambda n=n: log.append(f"score {n}"))
+    asyncio.run(scheduler.drain())
+    assert log == ["score 0", "score 1", "score 2"]
+    assert scheduler.stats()["categories"]["scores"]["dropped"] == 0
+    assert "dropped achievements" in capsys.readouterr().out
+
+
+def test_drain_waits_for_jobs_that_overran():
+    async def scenario():
+        scheduler = TickScheduler(budget=0.001)
+        written = []
+
+        async def slow_write():
+            await asyncio.sleep(0.05)
+            written.append(True)
+
+        scheduler.defer("stats", slow_write)
+        await scheduler.run(time.monotonic())
+        assert scheduler.background
+        await scheduler.drain()
+        return scheduler, written
+
+    scheduler, written = asyncio.run(scenario())
+    assert written == [True] and not scheduler.background
+
+
+def test_jobs_run_in_the_context_they_were_deferred_from():
+    operation = contextvars.ContextVar("operation", default="tick")
+
+    async def scenario():
+        scheduler = TickScheduler()
+        seen = []
+
+        async def write():
+            seen.append(operation.get())
+
+        operation.set("input")
+        scheduler.defer("stats", write)
+        scheduler.defer("achievements", lambda: seen.append(operation.get()))
+        operation.set("tick")
+        await scheduler.drain()
+        return seen
+
+    assert asyncio.run(scenario()) == ["input", "input"]
@@ -0,0 +1,242 @@
+"""
+Time budget for every game tick.
+
+broadcast_loop does the tick's game-critical work first (simulation,
+snapshot broadcast) and then hands the rest of the tick's budget to
+TickScheduler.run. Work that can wait (stats writes, achievement checks,
+score and leaderboard updates) is queued with defer() instead of being
+done where it comes up. run() takes jobs by priority, oldest first, while
+the budget lasts: a job only starts if its category's measured cost still
+fits, and whatever does not fit waits for a later tick.
+
+A job is a callable, run in a copy of the context it was deferred from
+(so its database work is still charged to the operation that queued it,
+see db_profiler.py); if it returns an awaitable, run() waits for it no
+longer than the remaining budget and leaves it running in the background
+past that. Jobs waiting longer than STARVATION_SECONDS run even without
+budget (at most FORCED_PER_TICK per tick), so a long overload delays
+deferred work rather than starving it. Only with MAX_QUEUED jobs waiting
+is one dropped (and logged): the least urgent, newest job of a category
+that can be redone later, i.e. an achievement check that the player's
+next pickup or kill queues again. Stats writes and scores are never
+dropped; there is at most one queued flush and one score job per player
+who left. Starvation and drops are counted per category and served at
+/api/admin/scheduler.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import time
+import traceback
+
+from link_rate import TICK_HZ
+
+# Part of each 1/TICK_HZ frame that game work plus deferred jobs may use; the rest is
+# left for the snapshot sends and HTTP requests that run while the loop sleeps
+TICK_BUDGET_SECONDS = float(os.getenv("TICK_BUDGET_MS", str(round(750 / TICK_HZ, 1)))) / 1000
+STARVATION_SECONDS = float(os.getenv("TICK_STARVATION_MS", "2000")) / 1000
+FORCED_PER_TICK = 2
+MAX_QUEUED = int(os.getenv("TICK_QUEUE_SIZE", "5000"))
+EWMA_WEIGHT = 0.2
+
+# Lower runs first
+PRIORITIES = {
+    "stats": 0,               # batched stats writes; achievement checks wait for one still writing
+    "scores": 1,              # total score and leaderboard of a player who left
+    "achievements": 2,
+    "score_achievements": 2,
+}
+DEFAULT_PRIORITY = 3
+# Losing one of these loses data for good, so they are queued even past MAX_QUEUED
+NEVER_DROPPED = {"stats", "scores"}
+
+
+class _Job:
+    __slots__ = ("category", "function", "key", "queued_at", "context")
+
+    def __init__(self, category, function, key, queued_at):
+        self.category = category
+        self.function = function
+        self.key = key
+        self.queued_at = queued_at
+        self.context = contextvars.copy_context()
+
+
+class _Category:
+    def __init__(self, priority: int):
+        self.priority = priority
+        self.queued = 0
+        self.cost = 0.0  # smoothed seconds a job takes inside the budget
+        self.max_wait = 0.0
+        self.counters = {"deferred": 0, "coalesced": 0, "run": 0, "forced": 0, "overran": 0, "failed": 0,
+                         "dropped": 0, "carried": 0}
+
+
+class TickScheduler:
+    def __init__(self, budget: float = TICK_BUDGET_SECONDS, starvation: float = STARVATION_SECONDS,
+                 max_queued: int = MAX_QUEUED, clock=time.monotonic):
+        self.budget = budget
+        self.starvation = starvation
+        self.max_queued = max_queued
+        self.clock = clock
+        self.heap = []    # (priority, sequence, job)
+        self.keyed = {}   # (category, key) -> queued job
+        self.categories = {}
+        self.background = set()  # jobs that outlived their tick
+        self._sequence = itertools.count()
+        self.counters = {"ticks": 0, "over_budget": 0, "starved": 0, "carried_over": 0}
+        self.last_idle = 0.0  # budget left unused by the last tick
+
+    def _category(self, name: str) -> _Category:
+        category = self.categories.get(name)
+        if category is None:
+            category = self.categories[name] = _Category(PRIORITIES.get(name, DEFAULT_PRIORITY))
+        return category
+
+    def defer(self, category: str, function, key=None):
+        """
+        Queues function() for the leftover budget of a coming tick. With a
+        key, a job already queued for the same (category, key) is replaced
+        by this one instead of queuing a second.
+        """
+        group = self._category(category)
+        group.counters["deferred"] += 1
+        if key is not None:
+            existing = self.keyed.get((category, key))
+            if existing is not None:
+                existing.function = function  # keeps its place in the queue, runs with the newest arguments
+                existing.context = contextvars.copy_context()
+                group.counters["coalesced"] += 1
+                return
+        if len(self.heap) >= self.max_queued:
+            self._drop_one()
+        job = _Job(category, function, key, self.clock())
+        if key is not None:
+            self.keyed[(category, key)] = job
+        group.queued += 1
+        heapq.heappush(self.heap, (group.priority, next(self._sequence), job))
+
+    def _drop_one(self):
+        droppable = [entry for entry in self.heap if entry[2].category not in NEVER_DROPPED]
+        if not droppable:
+            return  # all stats and scores: over the cap rather than losing any
+        entry = max(droppable)  # least urgent, newest
+        self.heap.remove(entry)
+        heapq.heapify(self.heap)
+        job = entry[2]
+        self._forget(job)
+        self.categories[job.category].counters["dropped"] += 1
+        print(f"Deferred job queue full ({self.max_queued}), dropped {job.category} ({job.key}).")
+
+    def _forget(self, job: _Job):
+        self.categories[job.category].queued -= 1
+        if job.key is not None and self.keyed.get((job.category, job.key)) is job:
+            del self.keyed[(job.category, job.key)]
+
+    async def run(self, tick_started: float):
+        """Runs queued jobs in what is left of the budget of the tick that started at tick_started."""
+        self.counters["ticks"] += 1
+        deadline = tick_started + self.budget
+        if self.clock() >= deadline:
+            self.counters["over_budget"] += 1  # the critical work alone used it all
+        if self.heap:
+            await asyncio.sleep(0)  # let this tick's snapshot sends start first
+        forced = 0
+        ran = 0
+        while self.heap:
+            _, _, job = self.heap[0]
+            group = self.categories[job.category]
+            now = self.clock()
+            if now + group.cost > deadline:
+                if now - job.queued_at < self.starvation or forced >= FORCED_PER_TICK:
+                    break
+                forced += 1
+                group.counters["forced"] += 1
+            heapq.heappop(self.heap)
+            self._forget(job)
+            group.max_wait = max(group.max_wait, now - job.queued_at)
+            await self._run_job(job, group, deadline)
+            ran += 1
+        self.last_idle = max(0.0, deadline - self.clock())
+        if self.heap:
+            self.counters["carried_over"] += 1
+            if not ran:
+                self.counters["starved"] += 1  # work was waiting and none of it got a turn
+            for group in self.categories.values():
+                if group.queued:
+                    group.counters["carried"] += 1
+
+    async def _run_job(self, job: _Job, group: _Category, deadline: float):
+        started = self.clock()
+        try:
+            result = job.context.run(job.function)
+            if result is not None and hasattr(result, "__await__"):
+                if asyncio.iscoroutine(result):
+                    task = asyncio.get_running_loop().create_task(result, context=job.context)
+                else:
+                    task = asyncio.ensure_future(result)  # e.g. a task TaskSupervisor.spawn started
+                timeout = None if deadline == float("inf") else max(0.0, deadline - self.clock())
+                done, _ = await asyncio.wait({task}, timeout=timeout)
+                if task in done:
+                    self._finished(job, task)
+                else:
+                    group.counters["overran"] += 1  # keeps running; the next tick waits for nothing
+                    self.background.add(task)
+                    task.add_done_callback(lambda task, job=job: self._finished(job, task))
+        except Exception as e:
+            self._failed(job, e)
+        group.counters["run"] += 1
+        cost = self.clock() - started
+        group.cost = cost if group.counters["run"] == 1 else group.cost + EWMA_WEIGHT * (cost - group.cost)
+
+    def _finished(self, job: _Job, task):
+        self.background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self._failed(job, task.exception())
+
+    def _failed(self, job: _Job, error: Exception):
+        self.categories[job.category].counters["failed"] += 1
+        print(f"Deferred job {job.category} ({job.key}) failed: {error}")
+        traceback.print_exception(type(error), error, error.__traceback__)
+
+    async def drain(self):
+        """Runs everything still queued regardless of budget and waits for jobs that overran (shutdown)."""
+        while self.heap or self.background:
+            while self.heap:
+                _, _, job = heapq.heappop(self.heap)
+                self._forget(job)
+                await self._run_job(job, self.categories[job.category], float("inf"))
+            if self.background:
+                # e.g. a stats flush still writing in its thread; may queue more jobs
+                await asyncio.gather(*self.background, return_exceptions=True)
+
+    def oldest_wait(self) -> dict:
+        """Seconds the oldest queued job of each category has waited."""
+        now = self.clock()
+        oldest = {}
+        for _, _, job in self.heap:
+            oldest[job.category] = max(oldest.get(job.category, 0.0), now - job.queued_at)
+        return oldest
+
+    def stats(self) -> dict:
+        oldest = self.oldest_wait()
+        return {
+            "budget_ms": round(self.budget * 1000, 2),
+            "starvation_ms": round(self.starvation * 1000, 2),
+            "queued": len(self.heap),
+            "background": len(self.background),
+            "last_idle_ms": round(self.last_idle * 1000, 3),
+            **self.counters,
+            "categories": {
+                name: {"priority": group.priority, "queued": group.queued,
+                       "oldest_wait_ms": round(oldest.get(name, 0.0) * 1000, 2),
+                       "max_wait_ms": round(group.max_wait * 1000, 2), "avg_cost_ms": round(group.cost * 1000, 3),
+                       **group.counters}
+                for name, group in self.categories.items()
+            },
+        }
+
+
+tick_scheduler = TickScheduler()
@@ -0,0 +1,131 @@
+"""
+Minimal in-process ASGI client: drives the app's WebSocket endpoints
+directly through the ASGI interface, with no sockets or network involved.
+"""
+import asyncio
+from itertools import count
+
+_client_ports = count(20000)
+
+
+class ASGIWebSocket:
+    """
+    A WebSocket connection to an ASGI app. Server messages are handed to
+    on_message(data) synchronously as they are sent, so a caller that only
+    counts bytes never has to buffer frames.
+    """
+
+    def __init__(self, app, path: str, headers=None, client_host: str = "127.0.0.1",
+                 on_message=None, query_string: bytes = b""):
+        self.app = app
+        self.path = path
+        self.headers = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+        self.client = (client_host, next(_client_ports))
+        self.query_string = query_string
+        self.on_message = on_message or (lambda data: None)
+        self.accepted = asyncio.Event()
+        self.closed = asyncio.Event()
+        self.close_code = None
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self._inbox = asyncio.Queue()
+        self._task = None
+
+    async def connect(self, timeout: float = 5.0) -> bool:
+        """Opens the connection; returns False if the app closed it instead of accepting."""
+        scope = {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "scheme": "ws",
+            "http_version": "1.1",
+            "path": self.path,
+            "raw_path": self.path.encode(),
+            "root_path": "",
+            "query_string": self.query_string,
+            "headers": [(b"host", b"localhost")] + self.headers,
+            "client": self.client,
+            "server": ("localhost", 80),
+            "subprotocols": [],
+            "state": {},
+        }
+        self._inbox.put_nowait({"type": "websocket.connect"})
+        self._task = asyncio.create_task(self.app(scope, self._receive, self._send))
+        waiters = [asyncio.create_task(self.accepted.wait()), asyncio.create_task(self.closed.wait())]
+        done, pending = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        for waiter in pending:
+            waiter.cancel()
+        return self.accepted.is_set() and not self.closed.is_set()
+
+    async def _receive(self):
+        return await self._inbox.get()
+
+    async def _send(self, message):
+        kind = message["type"]
+        if kind == "websocket.accept":
+            self.accepted.set()
+        elif kind == "websocket.send":
+            data = message.get("text")
+            if data is None:
+                data = message.get("bytes", b"")
+            self.bytes_received += len(data)
+            self.on_message(data)
+        elif kind == "websocket.close":
+            self.close_code = message.get("code", 1000)
+            self.closed.set()
+
+    def send_text(self, text: str):
+        self.bytes_sent += len(text)
+        self._inbox.put_nowait({"type": "websocket.receive", "text": text})
+
+    async def close(self, code: int = 1000, timeout: float = 5.0):
+        self._inbox.put_nowait({"type": "websocket.disconnect", "code": code})
+        self.closed.set()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout)
+            except (asyncio.TimeoutError, Exception):
+                self._task.cancel()
+
+
+async def http_request(app, method: str, path: str, headers=None, body: bytes = b"",
+                       client_host: str = "127.0.0.1"):
+    """Sends one HTTP request through the ASGI app. Returns (status, headers, body)."""
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": query.encode(),
+        "headers": [(b"host", b"localhost")] + [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+        "client": (client_host, next(_client_ports)),
+        "server": ("localhost", 80),
+        "state": {},
+    }
+    request_messages = [{"type": "http.request", "body": body, "more_body": False}]
+    response_done = asyncio.Event()
+    response = {"status": None, "headers": [], "body": []}
+
+    async def receive():
+        if request_messages:
+            return request_messages.pop(0)
+        # Report the disconnect only once the response has been sent
+        await response_done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = [(k.decode(), v.decode()) for k, v in message.get("headers", [])]
+        elif message["type"] == "http.response.body":
+            response["body"].append(message.get("body", b""))
+            if not message.get("more_body", False):
+                response_done.set()
+
+    await app(scope, receive, send)
+    response_done.set()
+    return response["status"], response["headers"], b"".join(response["body"])
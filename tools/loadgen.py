@@ -0,0 +1,302 @@
+"""
+Headless load generator for /ws/game.
+
+Starts N bot players inside the same process as the app (no network, no
+MongoDB: collections are replaced with tools.memdb) and ramps the player
+count in steps. Bots behave like game.js: they send a position at 20 Hz
+and wander around the world. For every step the tool reports server tick
+duration, broadcast frame size, end-to-end update latency percentiles,
+inbound/outbound bytes per second and whether frames started slipping.
+
+    python -m tools.loadgen --players 10,25,50,100 --duration 5 --output load.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import time
+
+# Run from the repository root so main.py finds public/ and game/
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+os.environ.setdefault("SECRET_KEY", "loadgen-secret")
+
+from tools import memdb  # noqa: E402
+from tools.asgi import ASGIWebSocket  # noqa: E402
+
+SEND_INTERVAL = 0.05  # game.js sends a position every 50 ms
+BOT_SPEED = 400       # px/s, same as playerSpeed in game.js
+TICK_TARGET = 1 / 30  # broadcast_loop target period
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(values, scale=1.0):
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) * scale,
+        "p50": percentile(values, 50) * scale,
+        "p95": percentile(values, 95) * scale,
+        "p99": percentile(values, 99) * scale,
+        "max": max(values) * scale,
+    }
+
+
+class StepStats:
+    """Samples collected during one measurement window."""
+
+    def __init__(self):
+        self.tick_durations = []
+        self.tick_starts = []
+        self.frame_sizes = []
+        self.latencies = []
+        self.started = time.perf_counter()
+
+
+class Bot:
+    def __init__(self, app, world, session_cookie=None, observer=False, rng=None, client_host="127.0.0.1"):
+        self.world = world
+        self.observer = observer
+        self.rng = rng or random.Random()
+        self.player_id = None
+        self.stats = None
+        self.pending = {}  # (x, y) sent -> send time, only tracked by observers
+        self.x = self.rng.uniform(0, world[0])
+        self.y = self.rng.uniform(0, world[1])
+        self.heading = self.rng.uniform(0, 2 * math.pi)
+        headers = {"cookie": f"session_token={session_cookie}"} if session_cookie else {}
+        self.ws = ASGIWebSocket(app, "/ws/game", headers=headers, client_host=client_host,
+                                on_message=self._on_message)
+        self.task = None
+
+    def _on_message(self, data):
+        # Only observers decode frames; the others just count bytes so bot CPU stays small
+        if self.player_id is not None and not self.observer:
+            return
+        message = json.loads(data)
+        kind = message.get("type")
+        if kind == "id":
+            self.player_id = message["id"]
+        elif kind == "players" and self.stats is not None:
+            now = time.perf_counter()
+            self.stats.frame_sizes.append(len(data))
+            me = message["players"].get(self.player_id)
+            if me is not None:
+                sent = self.pending.pop((me["x"], me["y"]), None)
+                if sent is not None:
+                    self.stats.latencies.append(now - sent)
+                    # Anything older than the acknowledged position was coalesced away
+                    self.pending = {k: t for k, t in self.pending.items() if t > sent}
+
+    async def run(self):
+        if not await self.ws.connect():
+            return
+        last = time.perf_counter()
+        while not self.ws.closed.is_set():
+            await asyncio.sleep(SEND_INTERVAL)
+            now = time.perf_counter()
+            dt = now - last
+            last = now
+            # Wander: drift the heading and bounce off the world edges
+            self.heading += self.rng.uniform(-0.5, 0.5)
+            self.x += math.cos(self.heading) * BOT_SPEED * dt
+            self.y += math.sin(self.heading) * BOT_SPEED * dt
+            if not 0 <= self.x <= self.world[0] or not 0 <= self.y <= self.world[1]:
+                self.heading += math.pi
+                self.x = min(max(self.x, 0), self.world[0])
+                self.y = min(max(self.y, 0), self.world[1])
+            # Random fractional part makes every sent position unique for latency matching
+            x = round(self.x, 3) + self.rng.random() / 1000
+            y = round(self.y, 3)
+            if self.observer and self.stats is not None:
+                self.pending[(x, y)] = time.perf_counter()
+            self.ws.send_text(json.dumps({"x": x, "y": y}))
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+        await self.ws.close()
+
+
+def create_session(main, username):
+    """Registers a user directly in the in-memory db and returns a valid session token."""
+    from auth import create_access_token, hash_token
+    main.users_collection.insert_one({
+        "username": username, "salt": "", "hashed_password": "",
+        "total_score_lifetime": 0, "games_played": 0, "players_eaten_lifetime": 0,
+        "unlocked_achievements": [],
+    })
+    main.playerStats_collection.insert_one(
+        {"username": username, "gamesWon": 0, "deaths": 0, "kills": 0, "pellets": 0})
+    token = create_access_token(data={"sub": username})
+    main.sessions_collection.update_one(
+        {"username": username}, {"$set": {"token_hash": hash_token(token)}}, upsert=True)
+    return token
+
+
+def instrument_ticks(main, holder):
+    """
+    Times every server tick, start to finish: simulation step, timers,
+    broadcast and deferred work. broadcast_loop ends each tick with
+    tick_scheduler.run(tick start), so wrapping that sees both ends.
+    """
+    scheduler = main.tick_scheduler
+    original = scheduler.run
+
+    async def timed_run(tick_started):
+        try:
+            await original(tick_started)
+        finally:
+            stats = holder.get("stats")
+            if stats is not None:
+                stats.tick_starts.append(tick_started)
+                stats.tick_durations.append(time.monotonic() - tick_started)
+
+    scheduler.run = timed_run
+
+
+async def run_load(args):
+    memdb.install()
+    import main
+
+    rng = random.Random(args.seed)
+    holder = {}
+    instrument_ticks(main, holder)
+    world = (main.worldWidth, main.worldHeight)
+    # The load test measures the game loop, not admission control: room for every bot
+    main.admission.max_players = main.admission.max_per_room = max(args.players)
+
+    bots = []
+    results = []
+    slip_point = None
+    for target in args.players:
+        while len(bots) < target:
+            index = len(bots)
+            cookie = None
+            if rng.random() < args.logged_in:
+                cookie = create_session(main, f"bot{index}")
+            bot = Bot(main.app, world, session_cookie=cookie,
+                      observer=index < args.observers, rng=random.Random(rng.random()),
+                      client_host=f"10.{index >> 16 & 255}.{index >> 8 & 255}.{index & 255}")  # one IP per bot
+            bot.start()
+            bots.append(bot)
+            await asyncio.sleep(0)
+
+        await asyncio.sleep(args.warmup)
+
+        stats = StepStats()
+        holder["stats"] = stats
+        for bot in bots:
+            bot.stats = stats
+            bot.pending.clear()
+        sent_before = sum(bot.ws.bytes_sent for bot in bots)
+        received_before = sum(bot.ws.bytes_received for bot in bots)
+
+        await asyncio.sleep(args.duration)
+
+        elapsed = time.perf_counter() - stats.started
+        holder["stats"] = None
+        for bot in bots:
+            bot.stats = None
+
+        inbound = sum(bot.ws.bytes_sent for bot in bots) - sent_before
+        outbound = sum(bot.ws.bytes_received for bot in bots) - received_before
+        intervals = [b - a for a, b in zip(stats.tick_starts, stats.tick_starts[1:])]
+        slipped = sum(1 for i in intervals if i > TICK_TARGET * args.slip_factor)
+        slip_ratio = slipped / len(intervals) if intervals else 1.0
+        connected = sum(1 for bot in bots if bot.ws.accepted.is_set() and not bot.ws.closed.is_set())
+
+        step = {
+            "players": target,
+            "connected": connected,
+            "ticks": len(stats.tick_durations),
+            "tick_rate_hz": len(stats.tick_durations) / elapsed,
+            "tick_duration_ms": summarize(stats.tick_durations, 1000),
+            "tick_interval_ms": summarize(intervals, 1000),
+            "frame_bytes": summarize(stats.frame_sizes),
+            "latency_ms": summarize(stats.latencies, 1000),
+            "inbound_bytes_per_s": inbound / elapsed,
+            "outbound_bytes_per_s": outbound / elapsed,
+            "slipped_frames": slipped,
+            "slip_ratio": slip_ratio,
+        }
+        results.append(step)
+        print(f"[loadgen] {target} players: tick p95 {step['tick_duration_ms'].get('p95', 0):.2f} ms, "
+              f"{step['tick_rate_hz']:.1f} Hz, slip {slip_ratio:.1%}", file=sys.stderr)
+
+        if slip_ratio > args.slip_threshold:
+            slip_point = target
+            if not args.keep_going:
+                break
+
+    for bot in bots:
+        await bot.stop()
+    main.stop_broadcast_loop()
+
+    return {
+        "tool": "loadgen",
+        "timestamp": time.time(),
+        "config": {
+            "players": args.players,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "logged_in": args.logged_in,
+            "observers": args.observers,
+            "slip_factor": args.slip_factor,
+            "slip_threshold": args.slip_threshold,
+            "seed": args.seed,
+        },
+        "steps": results,
+        "slip_point": slip_point,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Headless /ws/game load generator")
+    parser.add_argument("--players", default="10,25,50,100",
+                        type=lambda s: [int(n) for n in s.split(",")],
+                        help="comma separated player counts to ramp through")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds measured per step")
+    parser.add_argument("--warmup", type=float, default=1.0, help="seconds to settle after adding bots")
+    parser.add_argument("--logged-in", type=float, default=0.0,
+                        help="fraction of bots that connect with a session (0-1)")
+    parser.add_argument("--observers", type=int, default=4,
+                        help="bots that decode frames for latency and frame size")
+    parser.add_argument("--slip-factor", type=float, default=1.5,
+                        help="a tick interval above factor * 33ms counts as a slipped frame")
+    parser.add_argument("--slip-threshold", type=float, default=0.05,
+                        help="fraction of slipped frames at which a step is reported as the slip point")
+    parser.add_argument("--keep-going", action="store_true", help="keep ramping after the slip point")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = asyncio.run(run_load(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""
+In-memory stand-in for the pymongo collections used by the app.
+
+Only the subset of the query/update language the server actually uses is
+implemented. install() registers a fake `database` module so main.py and
+auth.py can be imported without a running MongoDB, which is what the
+load generator and benchmarks rely on.
+"""
+import copy
+import sys
+import types
+from itertools import count
+
+_object_ids = count(1)
+
+
+def _get_path(doc, path):
+    value = doc
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def _set_path(doc, path, value):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        doc = doc.setdefault(part, {})
+    doc[parts[-1]] = value
+
+
+def _matches(doc, query):
+    for key, cond in query.items():
+        if key == "$or":
+            if not any(_matches(doc, sub) for sub in cond):
+                return False
+            continue
+        if key == "$and":
+            if not all(_matches(doc, sub) for sub in cond):
+                return False
+            continue
+        value = _get_path(doc, key)
+        if isinstance(cond, dict) and any(k.startswith("$") for k in cond):
+            for op, arg in cond.items():
+                if op == "$in" and value not in arg:
+                    return False
+                if op == "$nin" and value in arg:
+                    return False
+                if op == "$ne" and value == arg:
+                    return False
+                if op == "$gt" and not (value is not None and value > arg):
+                    return False
+                if op == "$gte" and not (value is not None and value >= arg):
+                    return False
+                if op == "$lt" and not (value is not None and value < arg):
+                    return False
+                if op == "$lte" and not (value is not None and value <= arg):
+                    return False
+                if op == "$exists" and (value is not None) != bool(arg):
+                    return False
+        elif value != cond:
+            return False
+    return True
+
+
+def _project(doc, projection):
+    if not projection:
+        return copy.deepcopy(doc)
+    include = {k for k, v in projection.items() if v and k != "_id"}
+    if include:
+        result = {k: copy.deepcopy(doc[k]) for k in include if k in doc}
+    else:
+        result = {k: copy.deepcopy(v) for k, v in doc.items() if projection.get(k, 1)}
+    if projection.get("_id", 1) and "_id" in doc:
+        result["_id"] = doc["_id"]
+    else:
+        result.pop("_id", None)
+    return result
+
+
+def _apply_update(doc, update):
+    for op, fields in update.items():
+        for path, arg in fields.items():
+            if op == "$set":
+                _set_path(doc, path, copy.deepcopy(arg))
+            elif op == "$setOnInsert":
+                pass  # handled on insert
+            elif op == "$inc":
+                _set_path(doc, path, (_get_path(doc, path) or 0) + arg)
+            elif op == "$max":
+                current = _get_path(doc, path)
+                if current is None or arg > current:
+                    _set_path(doc, path, arg)
+            elif op == "$addToSet":
+                items = arg["$each"] if isinstance(arg, dict) and "$each" in arg else [arg]
+                current = _get_path(doc, path) or []
+                for item in items:
+                    if item not in current:
+                        current.append(item)
+                _set_path(doc, path, current)
+            elif op == "$push":
+                current = _get_path(doc, path) or []
+                current.append(copy.deepcopy(arg))
+                _set_path(doc, path, current)
+            else:
+                raise NotImplementedError(f"memdb does not support update operator {op}")
+
+
+class UpdateResult:
+    def __init__(self, matched_count, modified_count, upserted_id=None):
+        self.matched_count = matched_count
+        self.modified_count = modified_count
+        self.upserted_id = upserted_id
+
+
+class InsertOneResult:
+    def __init__(self, inserted_id):
+        self.inserted_id = inserted_id
+
+
+class DeleteResult:
+    def __init__(self, deleted_count):
+        self.deleted_count = deleted_count
+
+
+class MemoryCursor:
+    def __init__(self, docs):
+        self._docs = docs
+
+    def sort(self, key, direction=1):
+        keys = key if isinstance(key, list) else [(key, direction)]
+        for field, direction in reversed(keys):
+            self._docs.sort(key=lambda d: (_get_path(d, field) is not None, _get_path(d, field)),
+                            reverse=direction < 0)
+        return self
+
+    def skip(self, n):
+        self._docs = self._docs[n:]
+        return self
+
+    def limit(self, n):
+        if n:
+            self._docs = self._docs[:n]
+        return self
+
+    def __iter__(self):
+        return iter(self._docs)
+
+
+class MemoryCollection:
+    def __init__(self, name):
+        self.name = name
+        self.docs = []
+        self.indexes = []
+
+    def _find_docs(self, query):
+        return [doc for doc in self.docs if _matches(doc, query or {})]
+
+    def find_one(self, query=None, projection=None):
+        for doc in self.docs:
+            if _matches(doc, query or {}):
+                return _project(doc, projection)
+        return None
+
+    def find(self, query=None, projection=None):
+        return MemoryCursor([_project(doc, projection) for doc in self._find_docs(query)])
+
+    def count_documents(self, query):
+        return len(self._find_docs(query))
+
+    def insert_one(self, doc):
+        doc.setdefault("_id", next(_object_ids))
+        self.docs.append(copy.deepcopy(doc))
+        return InsertOneResult(doc["_id"])
+
+    def insert_many(self, docs):
+        for doc in docs:
+            self.insert_one(doc)
+
+    def _upsert(self, query, update):
+        doc = {k: v for k, v in query.items() if not k.startswith("$") and not isinstance(v, dict)}
+        for path, value in update.get("$setOnInsert", {}).items():
+            _set_path(doc, path, copy.deepcopy(value))
+        _apply_update(doc, update)
+        return self.insert_one(doc).inserted_id
+
+    def update_one(self, query, update, upsert=False):
+        for doc in self.docs:
+            if _matches(doc, query):
+                _apply_update(doc, update)
+                return UpdateResult(1, 1)
+        if upsert:
+            return UpdateResult(0, 0, self._upsert(query, update))
+        return UpdateResult(0, 0)
+
+    def update_many(self, query, update, upsert=False):
+        matched = self._find_docs(query)
+        for doc in matched:
+            _apply_update(doc, update)
+        if not matched and upsert:
+            return UpdateResult(0, 0, self._upsert(query, update))
+        return UpdateResult(len(matched), len(matched))
+
+    def bulk_write(self, requests, ordered=True):
+        # pymongo's UpdateOne keeps its arguments in these attributes
+        for request in requests:
+            self.update_one(request._filter, request._doc, upsert=bool(request._upsert))
+
+    def delete_one(self, query):
+        for i, doc in enumerate(self.docs):
+            if _matches(doc, query):
+                del self.docs[i]
+                return DeleteResult(1)
+        return DeleteResult(0)
+
+    def delete_many(self, query):
+        before = len(self.docs)
+        self.docs = [doc for doc in self.docs if not _matches(doc, query)]
+        return DeleteResult(before - len(self.docs))
+
+    def create_index(self, keys, **kwargs):
+        self.indexes.append((keys, kwargs))
+        return kwargs.get("name", str(keys))
+
+
+class MemoryDatabase:
+    def __init__(self):
+        self._collections = {}
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def __getitem__(self, name):
+        if name not in self._collections:
+            self._collections[name] = MemoryCollection(name)
+        return self._collections[name]
+
+
+def install() -> types.ModuleType:
+    """Registers an in-memory `database` module; call before importing main."""
+    if "database" in sys.modules and getattr(sys.modules["database"], "IN_MEMORY", False):
+        return sys.modules["database"]
+    db = MemoryDatabase()
+    module = types.ModuleType("database")
+    module.IN_MEMORY = True
+    module.db = db
+    module.users_collection = db.users
+    module.sessions_collection = db.sessions
+    module.leaderboard_stats_collection = db.leaderboard_stats
+    module.skin_collection = db.skin
+    module.playerStats_collection = db.stats
+    module.round_results_collection = db.round_results
+    module.leaderboard_buckets_collection = db.leaderboard_buckets
+    module.ping = lambda timeout=None: True
+    module.close = lambda: None
+    sys.modules["database"] = module
+    return module
@@ -0,0 +1,224 @@
+"""
+Replays a match recording through the game simulation without sockets.
+
+Every recorded input goes through the same code the live server runs
+(collect_food, resolve_collisions) and every recorded tick is rebuilt and
+encoded as a "players" snapshot. At each tick the simulated state is
+compared with the recorded one and then resynced to it, so timer-driven
+state (respawns, invulnerability, round resets) and random tie-breaks
+cannot make the replay drift. MongoDB is replaced with tools.memdb.
+
+    python -m tools.replay match-20250101-120000.mcrec --loops 3 --output replay.json
+    python -m tools.replay match.mcrec --profile replay.prof
+"""
+import argparse
+import asyncio
+import cProfile
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+os.environ.setdefault("SECRET_KEY", "replay-secret")
+
+from food_field import FoodField  # noqa: E402
+from link_rate import ClientLink  # noqa: E402
+from match_recorder import (read_frames, KIND_JOIN, KIND_LEAVE, KIND_INPUTS, KIND_TICK, KIND_FOOD,  # noqa: E402
+                            KIND_FOOD_RESET, FLAG_RESPAWNING, FLAG_INVULNERABLE)
+from tools import memdb  # noqa: E402
+from tools.bench import NullSocket  # noqa: E402
+
+SUBSYSTEMS = ("pickups", "collisions", "snapshot_build", "snapshot_encode", "deferred")
+
+
+class Replay:
+    def __init__(self, main, frames):
+        self.main = main
+        self.frames = frames
+        self.ids = {}  # slot -> player id
+        self.seconds = dict.fromkeys(SUBSYSTEMS, 0.0)
+        self.calls = dict.fromkeys(SUBSYSTEMS, 0)
+        self.inputs = 0
+        self.ticks = 0
+        self.peak_players = 0
+        self.snapshot_bytes = 0
+        self.diverged_ticks = 0
+        self.diverged_players = 0
+
+    def _timed(self, name, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        self.seconds[name] += time.perf_counter() - start
+        self.calls[name] += 1
+        return result
+
+    def join(self, frame):
+        main = self.main
+        self.ids[frame["slot"]] = frame["id"]
+        main.clients[frame["id"]] = {
+            "ws": NullSocket(),
+            "link": ClientLink(),
+            "x": frame["x"],
+            "y": frame["y"],
+            "power": frame["power"],
+            "username": frame["username"],
+            "is_respawning": False,
+            "isInvulnerable": False,
+        }
+        main.simulation.ranking.update(frame["id"], frame["power"])
+        # Collisions and achievement checks read these documents, same as in the live game
+        username = frame["username"]
+        if main.playerStats_collection.find_one({"username": username}) is None:
+            main.playerStats_collection.insert_one(
+                {"username": username, "gamesWon": 0, "deaths": 0, "kills": 0, "pellets": 0})
+        if username and main.users_collection.find_one({"username": username}) is None:
+            main.users_collection.insert_one({
+                "username": username, "total_score_lifetime": 0, "games_played": 0,
+                "players_eaten_lifetime": 0, "unlocked_achievements": [],
+            })
+        self.peak_players = max(self.peak_players, len(main.clients))
+
+    def apply_inputs(self, frame):
+        clients = self.main.clients
+        for slot, seq, x, y in zip(frame["slots"], frame["seqs"], frame["xs"], frame["ys"]):
+            player_id = self.ids.get(slot)
+            if player_id not in clients:
+                continue
+            clients[player_id]["x"] = x
+            clients[player_id]["y"] = y
+            clients[player_id]["input_seq"] = seq
+            self._timed("pickups", self.main.collect_food, player_id)
+            self._timed("collisions", self.main.resolve_collisions)
+            self.inputs += 1
+
+    def tick(self, frame):
+        main = self.main
+        clients = main.clients
+        main.snapshot_tick = frame["tick"]
+        main.time_remaining = frame["time_remaining"]
+        state = self._timed("snapshot_build", main.build_state, list(clients.items()))
+        self.snapshot_bytes += len(self._timed("snapshot_encode", main.encode_message, state))
+        self.ticks += 1
+
+        diverged = 0
+        for slot, x, y, power, flags in zip(frame["slots"], frame["xs"], frame["ys"], frame["powers"],
+                                            frame["flags"]):
+            info = clients.get(self.ids.get(slot))
+            if info is None:
+                continue
+            if info["x"] != x or info["y"] != y or info["power"] != power:
+                diverged += 1
+            info["x"] = x
+            info["y"] = y
+            main.simulation.set_power(self.ids[slot], power)
+            info["is_respawning"] = bool(flags & FLAG_RESPAWNING)
+            info["isInvulnerable"] = bool(flags & FLAG_INVULNERABLE)
+        if diverged:
+            self.diverged_ticks += 1
+            self.diverged_players += diverged
+
+    async def run(self):
+        main = self.main
+        for kind, frame in self.frames:
+            if kind == KIND_INPUTS:
+                self.apply_inputs(frame)
+            elif kind == KIND_TICK:
+                started = time.monotonic()
+                self.tick(frame)
+                # Deferred stats writes and achievement checks get what the tick leaves of its budget, as live
+                deferred = time.perf_counter()
+                await main.tick_scheduler.run(started)
+                self.seconds["deferred"] += time.perf_counter() - deferred
+                self.calls["deferred"] += 1
+                await asyncio.sleep(0)  # let "eaten" sends and started checks run, as between live ticks
+            elif kind == KIND_JOIN:
+                self.join(frame)
+            elif kind == KIND_LEAVE:
+                main.simulation.remove_player(self.ids.pop(frame["slot"], None))
+            elif kind in (KIND_FOOD, KIND_FOOD_RESET):
+                main.simulation.food.place(frame["food"], reset=kind == KIND_FOOD_RESET)
+
+    def report(self, wall_seconds):
+        return {
+            "wall_seconds": wall_seconds,
+            "ticks": self.ticks,
+            "ticks_per_second": self.ticks / wall_seconds if wall_seconds else None,
+            "inputs": self.inputs,
+            "peak_players": self.peak_players,
+            "mean_snapshot_bytes": self.snapshot_bytes / self.ticks if self.ticks else 0,
+            "subsystems": {
+                name: {
+                    "calls": self.calls[name],
+                    "total_ms": self.seconds[name] * 1000,
+                    "mean_us": self.seconds[name] / self.calls[name] * 1e6 if self.calls[name] else 0.0,
+                }
+                for name in SUBSYSTEMS
+            },
+            # Ticks where the simulation did not reproduce the recorded state before resyncing
+            "diverged_ticks": self.diverged_ticks,
+            "diverged_players": self.diverged_players,
+        }
+
+
+async def replay(args) -> dict:
+    memdb.install()
+    import main
+
+    frames = list(read_frames(args.recording))
+
+    reports = []
+    for _ in range(args.loops):
+        # main builds its Simulation with an unseeded rng; every loop starts from the same seed instead
+        main.simulation.rng = random.Random(args.seed)
+        main.simulation.food = FoodField(args.food_capacity, 0, 0, main.worldWidth, main.worldHeight,
+                                         random.Random(args.seed))
+        main.clients.clear()
+        main.simulation.rerank()
+        run = Replay(main, frames)
+        start = time.perf_counter()
+        await run.run()
+        await main.tick_scheduler.drain()  # whatever the last ticks had no budget for
+        reports.append(run.report(time.perf_counter() - start))
+        print(f"[replay] {run.ticks} ticks, {run.inputs} inputs in {reports[-1]['wall_seconds']:.2f} s "
+              f"({reports[-1]['ticks_per_second']:.0f} ticks/s)", file=sys.stderr)
+
+    # Supervised background tasks (achievement checks, "eaten" sends) still running would keep the loop alive
+    for task in asyncio.all_tasks():
+        if task is not asyncio.current_task():
+            task.cancel()
+    main.clients.clear()
+    return {"recording": args.recording, "frames": len(frames), "seed": args.seed, "loops": reports}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a match recording without sockets")
+    parser.add_argument("recording")
+    parser.add_argument("--loops", type=int, default=1, help="replay the recording this many times")
+    parser.add_argument("--seed", type=int, default=0, help="seed for collision tie-breaks")
+    parser.add_argument("--food-capacity", type=int, default=int(os.getenv("FOOD_CAPACITY", "2000")),
+                        help="must be at least the capacity the match was recorded with")
+    parser.add_argument("--profile", help="write cProfile stats here (open with pstats or snakeviz)")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        profiler = cProfile.Profile()
+        report = profiler.runcall(asyncio.run, replay(args))
+        profiler.dump_stats(args.profile)
+    else:
+        report = asyncio.run(replay(args))
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
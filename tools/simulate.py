@@ -0,0 +1,232 @@
+"""
+Headless, deterministic game simulation runner.
+
+Steps simulation.Simulation with thousands of bot players for a fixed
+number of ticks as fast as the CPU allows: no sockets, no event loop and
+no database. The clock is simulated (it advances exactly one tick period
+per tick) and every random choice comes from --seed, so two runs with the
+same arguments end in the same state (compare the reported checksum).
+
+Each tick runs the same steps as the live server: respawn/invulnerability
+timers, pellet respawns, one input per bot at --input-hz followed by a
+pickup, collision passes, a "players" snapshot at --snapshot-hz and the
+minimap grid at 2 Hz.
+
+    python -m tools.simulate --players 2000 --pellets 8000 --ticks 300 --seed 1
+    python -m tools.simulate --players 10000 --pellets 10000 --collisions tick --output sim.json
+"""
+import argparse
+import cProfile
+import hashlib
+import json
+import math
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from food_field import FoodField  # noqa: E402
+from messaging import encode_message  # noqa: E402
+from simulation import Simulation, WORLD_WIDTH, WORLD_HEIGHT  # noqa: E402
+
+BOT_SPEED = 400  # px/s, same as playerSpeed in game.js
+SUBSYSTEMS = ("timers", "food_respawn", "bots", "pickups", "collisions", "snapshot_build", "snapshot_encode",
+              "minimap")
+MINIMAP_HZ = 2
+
+
+class SimulatedClock:
+    """Clock injected into the Simulation; only moves when the runner advances it."""
+
+    def __init__(self, start: float = 0.0):
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+class Runner:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.clock = SimulatedClock()
+        food = FoodField(args.pellets, args.pellets, args.food_respawn, args.width, args.height,
+                         random.Random(self.rng.random()))
+        self.sim = Simulation(args.width, args.height, food, rng=random.Random(self.rng.random()), clock=self.clock)
+        self.seconds = dict.fromkeys(SUBSYSTEMS, 0.0)
+        self.counts = {"inputs": 0, "pellets_eaten": 0, "kills": 0, "respawns": 0, "snapshots": 0,
+                       "snapshot_bytes": 0, "minimaps": 0, "minimap_bytes": 0}
+        self.headings = {}
+
+        bot_rng = random.Random(self.rng.random())
+        for i in range(args.players):
+            player_id = f"bot-{i}"
+            player = self.sim.add_player(player_id, f"bot{i}")
+            player["ws"] = None  # build_state only includes connected players
+            player["x"], player["y"] = self.sim.spawn_point()
+            # Bots start mid-round, otherwise nobody could collide during the first 10 simulated seconds
+            player["isInvulnerable"] = False
+            player.pop("invulnerable_until", None)
+            self.headings[player_id] = bot_rng.uniform(0, 2 * math.pi)
+        self.bot_rng = bot_rng
+        food.reset()
+
+    def _timed(self, name, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        self.seconds[name] += time.perf_counter() - start
+        return result
+
+    def move_bots(self, tick: int) -> list:
+        """Moves the bots that send an input this tick (game.js sends every 50 ms) and returns their ids."""
+        args = self.args
+        dt = 1 / args.input_hz
+        rng = self.bot_rng
+        players = self.sim.players
+        moved = []
+        for i, (player_id, player) in enumerate(players.items()):
+            # Spread inputs over ticks: bot i sends when its share of input_hz crosses a whole number
+            if (tick * args.input_hz + i) // args.tick_rate == ((tick - 1) * args.input_hz + i) // args.tick_rate:
+                continue
+            if player["is_respawning"]:
+                continue  # eaten players wait for the respawn message, like the client
+            heading = self.headings[player_id] + rng.uniform(-0.5, 0.5)
+            x = player["x"] + math.cos(heading) * BOT_SPEED * dt
+            y = player["y"] + math.sin(heading) * BOT_SPEED * dt
+            if not 0 <= x <= args.width or not 0 <= y <= args.height:
+                heading += math.pi  # turn around at the edge of the world
+                x = min(max(x, 0), args.width)
+                y = min(max(y, 0), args.height)
+            self.headings[player_id] = heading
+            player["x"] = x
+            player["y"] = y
+            moved.append(player_id)
+        return moved
+
+    def step(self, tick: int):
+        args = self.args
+        sim = self.sim
+        self.counts["respawns"] += len(self._timed("timers", sim.update_timers))
+        self._timed("food_respawn", sim.food.replenish, 1 / args.tick_rate)
+
+        moved = self._timed("bots", self.move_bots, tick)
+        self.counts["inputs"] += len(moved)
+        for player_id in moved:
+            self.counts["pellets_eaten"] += len(self._timed("pickups", sim.collect_food, player_id))
+            if args.collisions == "input":
+                # What the live server does: a full pass after every input
+                self.counts["kills"] += len(self._timed("collisions", sim.resolve_collisions))
+        if args.collisions == "tick":
+            self.counts["kills"] += len(self._timed("collisions", sim.resolve_collisions))
+
+        if args.snapshot_hz and tick % max(1, args.tick_rate // args.snapshot_hz) == 0:
+            state = self._timed("snapshot_build", sim.build_state, list(sim.players.items()), tick,
+                                (args.ticks - tick) / args.tick_rate, round(self.clock() * 1000))
+            self.counts["snapshot_bytes"] += len(self._timed("snapshot_encode", encode_message, state))
+            self.counts["snapshots"] += 1
+        if tick % max(1, args.tick_rate // MINIMAP_HZ) == 0:
+            minimap = self._timed("minimap", lambda: encode_message(sim.build_minimap()))
+            self.counts["minimap_bytes"] += len(minimap)
+            self.counts["minimaps"] += 1
+
+    def run(self) -> dict:
+        args = self.args
+        tick_seconds = []
+        start = time.perf_counter()
+        for tick in range(1, args.ticks + 1):
+            tick_start = time.perf_counter()
+            self.step(tick)
+            tick_seconds.append(time.perf_counter() - tick_start)
+            self.clock.advance(1 / args.tick_rate)
+        wall = time.perf_counter() - start
+        return self.report(wall, tick_seconds)
+
+    def checksum(self) -> str:
+        """Hash of the final game state; equal for runs with the same arguments."""
+        digest = hashlib.sha256()
+        for player_id, player in self.sim.players.items():
+            digest.update(f"{player_id}:{player['x']!r}:{player['y']!r}:{player['power']};".encode())
+        digest.update(bytes(self.sim.food.alive))
+        return digest.hexdigest()[:16]
+
+    def report(self, wall: float, tick_seconds: list) -> dict:
+        args = self.args
+        ticks = len(tick_seconds)
+        ordered = sorted(tick_seconds)
+        return {
+            "config": {key: value for key, value in vars(args).items() if key not in ("output", "profile")},
+            "ticks": ticks,
+            "wall_seconds": wall,
+            "ticks_per_second": ticks / wall if wall else None,
+            # Above 1 the simulation keeps up with a live server at --tick-rate
+            "realtime_factor": ticks / wall / args.tick_rate if wall else None,
+            "tick_ms": {
+                "mean": wall / ticks * 1000,
+                "p50": ordered[ticks // 2] * 1000,
+                "p99": ordered[min(ticks - 1, int(ticks * 0.99))] * 1000,
+                "max": ordered[-1] * 1000,
+            },
+            "subsystems": {
+                name: {
+                    "total_ms": self.seconds[name] * 1000,
+                    "per_tick_us": self.seconds[name] / ticks * 1e6,
+                    "share": self.seconds[name] / wall if wall else 0.0,
+                }
+                for name in SUBSYSTEMS
+            },
+            "counts": self.counts,
+            "max_power": max((p["power"] for p in self.sim.players.values()), default=0),
+            "pellets_alive": self.sim.food.count,
+            "checksum": self.checksum(),
+        }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Headless deterministic game simulation")
+    parser.add_argument("--players", type=int, default=1000)
+    parser.add_argument("--pellets", type=int, default=int(os.getenv("FOOD_TARGET", "1000")),
+                        help="pellet capacity, kept full by the respawn rate")
+    parser.add_argument("--food-respawn", type=float, default=float(os.getenv("FOOD_RESPAWN_PER_SECOND", "5")),
+                        help="pellets respawned per second")
+    parser.add_argument("--ticks", type=int, default=300)
+    parser.add_argument("--tick-rate", type=int, default=30, help="simulated ticks per second")
+    parser.add_argument("--input-hz", type=int, default=20, help="position updates per bot per second")
+    parser.add_argument("--snapshot-hz", type=int, default=15, help="0 disables snapshot building")
+    parser.add_argument("--collisions", choices=("input", "tick"), default="tick",
+                        help="input: a pass after every input like the live server; tick: one pass per tick")
+    parser.add_argument("--width", type=int, default=WORLD_WIDTH)
+    parser.add_argument("--height", type=int, default=WORLD_HEIGHT)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--profile", help="write cProfile stats here")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    runner = Runner(args)
+    if args.profile:
+        profiler = cProfile.Profile()
+        report = profiler.runcall(runner.run)
+        profiler.dump_stats(args.profile)
+    else:
+        report = runner.run()
+    print(f"[simulate] {report['ticks']} ticks with {args.players} players, {args.pellets} pellets: "
+          f"{report['ticks_per_second']:.1f} ticks/s ({report['realtime_factor']:.2f}x real time)", file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Startup-time benchmark: import main, run the lifespan startup and serve a
+first request, each run in a fresh interpreter.
+
+MONGO_URL points at a port nothing listens on, so this also checks that
+startup never waits for the database. Exits 1 if the median time from
+the start of the import to the first response is over the budget, or if
+a module that should be deferred (Pillow, Jinja2, passlib) was loaded on
+the way.
+
+    python -m tools.startup --runs 5 --budget-ms 1500
+    python -m tools.startup --importtime 15   # slowest imports, from python -X importtime
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Only needed by the endpoints that use them, so startup must not import them
+DEFERRED_MODULES = ("PIL", "jinja2", "passlib")
+
+CHILD = r"""
+import time
+started = time.perf_counter()
+import asyncio, json, os, sys
+sys.path.insert(0, os.getcwd())
+import main
+imported = time.perf_counter()
+from tools.asgi import http_request
+
+async def first_request():
+    async with main.app.router.lifespan_context(main.app):
+        lifespan_done = time.perf_counter()
+        status, _, _ = await http_request(main.app, "GET", "/healthz")
+        responded = time.perf_counter()
+        print(json.dumps({
+            "import_ms": (imported - started) * 1000,
+            "lifespan_ms": (lifespan_done - imported) * 1000,
+            "first_request_ms": (responded - lifespan_done) * 1000,
+            "total_ms": (responded - started) * 1000,
+            "status": status,
+            "deferred_loaded": [m for m in %(deferred)r if m in sys.modules],
+        }), flush=True)
+
+asyncio.run(first_request())
+"""
+
+
+def child_env():
+    env = dict(os.environ)
+    env.setdefault("SECRET_KEY", "startup-secret")
+    env["MONGO_URL"] = "mongodb://127.0.0.1:9/?serverSelectionTimeoutMS=200"  # nothing listens there
+    env["MONGO_READY_TIMEOUT"] = "0.2"
+    return env
+
+
+def run_once() -> dict:
+    result = subprocess.run([sys.executable, "-c", CHILD % {"deferred": DEFERRED_MODULES}],
+                            cwd=ROOT, env=child_env(), capture_output=True, text=True, timeout=120)
+    for line in result.stdout.splitlines():
+        if line.startswith("{"):
+            return json.loads(line)
+    raise RuntimeError(f"startup run failed:\n{result.stderr}")
+
+
+def slowest_imports(top: int) -> list:
+    """Runs `python -X importtime -c "import main"` and returns the top cumulative import times."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                            cwd=ROOT, env=child_env(), capture_output=True, text=True, timeout=120)
+    rows = []
+    for line in result.stderr.splitlines():
+        fields = line[len("import time:"):].split("|")
+        if not line.startswith("import time:") or not fields[0].strip().isdigit():
+            continue  # header line
+        rows.append({"module": fields[2].strip(), "cumulative_ms": int(fields[1]) / 1000,
+                     "self_ms": int(fields[0]) / 1000})
+    rows.sort(key=lambda row: row["cumulative_ms"], reverse=True)
+    return rows[:top]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import-to-first-request startup benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("STARTUP_BUDGET_MS", "1500")),
+                        help="fail if the median import-to-first-request time is above this")
+    parser.add_argument("--importtime", type=int, metavar="N", help="also list the N slowest imports")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    runs = [run_once() for _ in range(args.runs)]
+    report = {"budget_ms": args.budget_ms, "runs": runs}
+    for key in ("import_ms", "lifespan_ms", "first_request_ms", "total_ms"):
+        report["median_" + key] = statistics.median(run[key] for run in runs)
+    deferred_loaded = sorted({m for run in runs for m in run["deferred_loaded"]})
+    report["deferred_loaded"] = deferred_loaded
+    if args.importtime:
+        report["slowest_imports"] = slowest_imports(args.importtime)
+
+    failures = []
+    if report["median_total_ms"] > args.budget_ms:
+        failures.append(f"median import-to-first-request {report['median_total_ms']:.0f} ms "
+                        f"is over the {args.budget_ms:.0f} ms budget")
+    if deferred_loaded:
+        failures.append(f"modules that should load lazily were imported at startup: {', '.join(deferred_loaded)}")
+    if any(run["status"] != 200 for run in runs):
+        failures.append("first request did not return 200")
+    report["ok"] = not failures
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    print(f"[startup] median {report['median_total_ms']:.0f} ms (import {report['median_import_ms']:.0f} ms), "
+          f"budget {args.budget_ms:.0f} ms", file=sys.stderr)
+    for failure in failures:
+        print(f"[startup] FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+"""
+Lightweight per-request tracing.
+
+A sampled request (TRACE_SAMPLE_RATE, changeable at runtime through
+/api/admin/traces/sample) gets a Trace in a context variable. Code marks
+spans with `with span(name):`, the @traced decorator, or by adding them
+directly (the MongoDB command listener does that for every DB call). When
+the request is answered, the spans are summed into a Server-Timing header
+and the finished trace goes into a ring buffer served at /api/admin/traces.
+
+Unsampled requests have no Trace, so every hook is a single context
+variable lookup that returns None.
+
+The ASGI layers form a chain (outermost first): TracingMiddleware, which
+also covers the rate limiter, then the log_requests_and_responses
+middleware, then RequestResponseLogger, then the router, the route, and the
+handler. SpanMiddleware markers between them let each middleware's own
+time be split out from what runs inside it.
+"""
+import contextvars
+import functools
+import inspect
+import os
+import random
+import time
+from collections import deque
+
+from fastapi.routing import APIRoute
+from pymongo import monitoring
+
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "200"))
+
+# (span, the span nested directly inside it): Server-Timing reports the outer one's own time
+LAYERS = (
+    ("request", "mw_log_requests", "rate_limit"),
+    ("mw_log_requests", "mw_request_logger", "log_requests_middleware"),
+    ("mw_request_logger", "router", "request_logger_middleware"),
+    ("router", "route", "routing"),
+)
+
+_current = contextvars.ContextVar("trace", default=None)
+
+
+class Trace:
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.wall_time = time.time()
+        self.start = time.perf_counter()
+        self.spans = []  # [name, start, end]; end is None while the span is open
+        self.status = None
+
+    def open(self, name: str) -> list:
+        entry = [name, time.perf_counter(), None]
+        self.spans.append(entry)
+        return entry
+
+    def add(self, name: str, duration: float):
+        """Records a span that already finished (e.g. from a driver event that reports its own duration)."""
+        end = time.perf_counter()
+        self.spans.append([name, end - duration, end])
+
+    def _first(self, name: str, now: float):
+        for entry in self.spans:
+            if entry[0] == name:
+                return entry[1], entry[2] if entry[2] is not None else now
+        return None
+
+    def breakdown(self) -> dict:
+        """Name -> milliseconds: middleware and routing self time, dependencies, handler, encoding and totals."""
+        now = time.perf_counter()
+        result = {}
+        for outer, inner, label in LAYERS:
+            outer_span = self._first(outer, now)
+            if outer_span is None:
+                continue
+            inner_span = self._first(inner, now)
+            inner_time = inner_span[1] - inner_span[0] if inner_span else 0.0
+            result[label] = (outer_span[1] - outer_span[0] - inner_time) * 1000
+        route = self._first("route", now)
+        handler = self._first("handler", now)
+        if route and handler:
+            result["dependencies"] = (handler[0] - route[0]) * 1000  # body parsing and Depends()
+            result["handler"] = (handler[1] - handler[0]) * 1000
+            result["encode"] = (route[1] - handler[1]) * 1000  # response model validation and JSON
+        # Everything else is summed per name (DB calls, bcrypt, session lookups...)
+        structural = {"request", "mw_log_requests", "mw_request_logger", "router", "route", "handler"}
+        for name, start, end in self.spans:
+            if name not in structural:
+                result[name] = result.get(name, 0.0) + ((end if end is not None else now) - start) * 1000
+        result["total"] = (now - self.start) * 1000
+        return result
+
+    def server_timing(self) -> str:
+        counts = {}
+        for name, _, _ in self.spans:
+            counts[name] = counts.get(name, 0) + 1
+        parts = []
+        for name, ms in self.breakdown().items():
+            metric = name.replace(".", "_").replace(":", "_")
+            if counts.get(name, 0) > 1:
+                parts.append(f'{metric};dur={ms:.2f};desc="{counts[name]} calls"')
+            else:
+                parts.append(f"{metric};dur={ms:.2f}")
+        return ", ".join(parts)
+
+    def to_dict(self) -> dict:
+        return {
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "time": self.wall_time,
+            "timings_ms": {name: round(ms, 3) for name, ms in self.breakdown().items()},
+            "spans": [
+                {"name": name, "start_ms": round((start - self.start) * 1000, 3),
+                 "duration_ms": round(((end if end is not None else start) - start) * 1000, 3)}
+                for name, start, end in self.spans
+            ],
+        }
+
+
+class TraceBuffer:
+    def __init__(self, size: int = TRACE_BUFFER_SIZE, sample_rate: float = TRACE_SAMPLE_RATE):
+        self.traces = deque(maxlen=size)
+        self.sample_rate = sample_rate
+        self.sampled = 0
+
+    def sample(self) -> bool:
+        rate = self.sample_rate
+        return rate > 0 and (rate >= 1 or random.random() < rate)
+
+    def add(self, trace: Trace):
+        self.sampled += 1
+        self.traces.append(trace.to_dict())
+
+    def dump(self, limit: int = 50, path: str = None, min_ms: float = 0.0) -> list:
+        """Newest first, optionally only one path or only requests slower than min_ms."""
+        result = []
+        for trace in reversed(self.traces):
+            if path and trace["path"] != path:
+                continue
+            if trace["timings_ms"]["total"] < min_ms:
+                continue
+            result.append(trace)
+            if len(result) >= limit:
+                break
+        return result
+
+    def stats(self) -> dict:
+        return {"sample_rate": self.sample_rate, "sampled": self.sampled, "buffered": len(self.traces),
+                "buffer_size": self.traces.maxlen}
+
+
+trace_buffer = TraceBuffer()
+
+
+def current():
+    return _current.get()
+
+
+class _Span:
+    __slots__ = ("trace", "name", "entry")
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.entry = self.trace.open(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        self.entry[2] = time.perf_counter()
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return None
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name: str):
+    """Context manager timing a block as a span of the current request; free when not tracing."""
+    trace = _current.get()
+    if trace is None:
+        return _NO_SPAN
+    return _Span(trace, name)
+
+
+def traced(name: str):
+    """Decorator form of span() for sync and async functions (keeps the signature for FastAPI)."""
+    def decorate(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class TracingMiddleware:
+    """Outermost layer: samples the request, adds Server-Timing and stores the trace."""
+
+    def __init__(self, app, buffer: TraceBuffer = trace_buffer):
+        self.app = app
+        self.buffer = buffer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.buffer.sample():
+            return await self.app(scope, receive, send)
+        trace = Trace(scope["method"], scope["path"])
+        token = _current.set(trace)
+        root = trace.open("request")
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                trace.status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", trace.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            root[2] = time.perf_counter()
+            _current.reset(token)
+            self.buffer.add(trace)
+
+
+class SpanMiddleware:
+    """Marks everything inside it as one span; placed between middlewares to time each of them."""
+
+    def __init__(self, app, name: str):
+        self.app = app
+        self.name = name
+
+    async def __call__(self, scope, receive, send):
+        trace = _current.get()
+        if trace is None:
+            return await self.app(scope, receive, send)
+        entry = trace.open(self.name)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            entry[2] = time.perf_counter()
+
+
+class TracedRoute(APIRoute):
+    """APIRoute that times the whole route ("route") and the endpoint function alone ("handler")."""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, traced("handler")(endpoint), **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def traced_handler(request):
+            with span("route"):
+                return await handler(request)
+
+        return traced_handler
+
+
+class TraceCommandListener(monitoring.CommandListener):
+    """pymongo command listener adding a "db:collection.command" span per command of a traced request."""
+
+    def __init__(self):
+        self._collections = {}
+
+    def started(self, event):
+        if _current.get() is None:
+            return
+        collection = event.command.get(event.command_name)
+        self._collections[event.request_id] = collection if isinstance(collection, str) else ""
+
+    def succeeded(self, event):
+        collection = self._collections.pop(event.request_id, None)
+        trace = _current.get()
+        if trace is None or collection is None:
+            return
+        name = f"db:{collection}.{event.command_name}" if collection else f"db:{event.command_name}"
+        trace.add(name, event.duration_micros / 1e6)
+
+    def failed(self, event):
+        self.succeeded(event)